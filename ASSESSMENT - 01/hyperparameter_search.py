@@ -0,0 +1,246 @@
+import argparse
+import itertools
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+from sklearn.preprocessing import OneHotEncoder, LabelEncoder
+from sklearn.metrics import accuracy_score, log_loss
+import xgboost as xgb
+
+import repo_paths
+from data_access import read_table
+from sparse_encoding import encode_sparse
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Search space from APPENDIX.md: learning rate 0.01 - 1, max depth 1 - 5, 50 - 500 estimators
+LEARNING_RATES = [0.01, 0.03, 0.1, 0.3, 1.0]
+MAX_DEPTHS = [1, 2, 3, 4, 5]
+N_ESTIMATORS = [50, 100, 200, 500]
+
+# The notebook's hand-picked model, always evaluated as the reference row
+BASELINE = {"learning_rate": 0.1, "max_depth": 3, "n_estimators": 100}
+
+
+def prepare_data(dining_file):
+    # Same splits, features and encoding as Predict_Fav_Dish.ipynb; the Oct-2024 test split is the holdout
+    dining_df = read_table(dining_file)
+    dining_df['order_time'] = pd.to_datetime(dining_df['order_time'])
+
+    features_df = dining_df[dining_df['order_time'] < '2024-01-01']
+    train_df = dining_df[(dining_df['order_time'] >= '2024-01-01') & (dining_df['order_time'] < '2024-10-01')]
+    test_df = dining_df[dining_df['order_time'] >= '2024-10-01']
+
+    customer_features = features_df.groupby('customer_id').agg(
+        total_orders_per_customer=('transaction_id', 'count'),
+        avg_spend_per_customer=('price_for_1', 'mean'),
+        total_qty_per_customer=('Qty', 'sum')
+    ).reset_index()
+    cuisine_features = features_df.groupby('Preferred Cusine').agg(
+        avg_price_per_cuisine=('price_for_1', 'mean'),
+        total_orders_per_cuisine=('transaction_id', 'count')
+    ).reset_index()
+
+    frames = []
+    for df in (train_df, test_df):
+        df = df.merge(customer_features, on='customer_id', how='left')
+        df = df.merge(cuisine_features, on='Preferred Cusine', how='left')
+        frames.append(df.drop(columns=['transaction_id', 'customer_id', 'price_for_1', 'order_time', 'Qty']))
+    train_df, test_df = frames
+
+    # One-hot block kept as CSR and stacked with the numeric columns without densifying
+    encoder = OneHotEncoder(handle_unknown='ignore', sparse_output=True)
+    categorical_cols = ['Preferred Cusine']
+    encoder.fit(train_df[categorical_cols])
+
+    label_encoder = LabelEncoder()
+    y_train = label_encoder.fit_transform(train_df['dish'])
+    y_test = label_encoder.transform(test_df['dish'])
+
+    for df in (train_df, test_df):
+        for col in ['check_in_date', 'check_out_date']:
+            df[col] = pd.to_numeric(df[col])
+    X_train = encode_sparse(encoder, train_df.drop(columns=['dish']), categorical_cols)
+    X_test = encode_sparse(encoder, test_df.drop(columns=['dish']), categorical_cols)
+    return X_train, y_train, X_test, y_test, len(label_encoder.classes_)
+
+
+def candidate_configs(learning_rates=LEARNING_RATES, max_depths=MAX_DEPTHS, n_estimators=N_ESTIMATORS):
+    configs = [{"learning_rate": lr, "max_depth": depth, "n_estimators": n}
+               for lr, depth, n in itertools.product(learning_rates, max_depths, n_estimators)]
+    if BASELINE not in configs:
+        configs.append(dict(BASELINE))
+    return configs
+
+
+# Per-worker state, set once by the pool initializer
+_data = None
+_settings = None
+
+
+def init_worker(data, settings):
+    global _data, _settings
+    X_train, y_train, X_test, y_test, n_classes = data
+    _data = (xgb.DMatrix(X_train, label=y_train, nthread=settings["threads_per_worker"]),
+             xgb.DMatrix(X_test, label=y_test, nthread=settings["threads_per_worker"]), y_test, n_classes)
+    _settings = settings
+
+
+def rung_schedule(min_rounds, eta, max_rounds):
+    # Round counts at which live configs are compared: min_rounds, min_rounds * eta, ... up to max_rounds
+    if min_rounds < 1 or eta < 2:
+        raise ValueError(f"need min_rounds >= 1 and eta >= 2, got min_rounds={min_rounds}, eta={eta}")
+    rungs = [min_rounds]
+    while rungs[-1] < max_rounds:
+        rungs.append(min(rungs[-1] * eta, max_rounds))
+    return rungs
+
+
+def train_to(state, rounds):
+    # Continue one config's booster up to `rounds` boosting rounds (or its own n_estimators / early stop)
+    dtrain, dtest, y_test, n_classes = _data
+    config = state["config"]
+    params = {"objective": "multi:softprob", "num_class": n_classes, "eval_metric": "mlogloss",
+              "tree_method": "hist", "nthread": _settings["threads_per_worker"],
+              "learning_rate": config["learning_rate"], "max_depth": config["max_depth"]}
+    booster = None
+    if state["booster"] is not None:
+        booster = xgb.Booster(params)
+        booster.load_model(state["booster"])
+    done = len(state["history"])
+    target = min(rounds, config["n_estimators"])
+
+    evals_result = {}
+    start = time.perf_counter()
+    booster = xgb.train(params, dtrain, num_boost_round=target - done, evals=[(dtest, "holdout")],
+                        early_stopping_rounds=_settings["early_stopping_rounds"], xgb_model=booster,
+                        evals_result=evals_result, verbose_eval=False)
+    state["fit_seconds"] += time.perf_counter() - start
+    state["history"] += evals_result["holdout"]["mlogloss"]
+    state["booster"] = booster.save_raw("ubj")
+
+    history = state["history"]
+    best = int(np.argmin(history))
+    state["finished"] = (len(history) >= config["n_estimators"]
+                         or len(history) - best - 1 >= _settings["early_stopping_rounds"])
+    # Best holdout loss so far, the iteration the result is scored at (configs still share the round budget)
+    state["rung_logloss"] = min(history)
+    if state["finished"]:
+        state["result"] = score(state, booster, best)
+    return state
+
+
+def score(state, booster, best):
+    dtrain, dtest, y_test, n_classes = _data
+    y_pred_proba = booster.predict(dtest, iteration_range=(0, best + 1))
+    top3 = np.argsort(-y_pred_proba, axis=1)[:, :3]
+    result = dict(state["config"])
+    result.update({
+        "accuracy": accuracy_score(y_test, y_pred_proba.argmax(axis=1)),
+        "log_loss": log_loss(y_test, y_pred_proba, labels=np.arange(n_classes)),
+        "top3_hit_rate": float((top3 == np.asarray(y_test)[:, None]).any(axis=1).mean()),
+        "fit_seconds": state["fit_seconds"],
+        "model_kb": len(state["booster"]) / 1024,
+        "rounds_used": len(state["history"]),
+        "best_iteration": best,
+        "pruned": state["pruned"]
+    })
+    return result
+
+
+def finish_pruned(state):
+    state["pruned"] = True
+    booster = xgb.Booster()
+    booster.load_model(state["booster"])
+    state["result"] = score(state, booster, int(np.argmin(state["history"])))
+    return state
+
+
+def run_search(data, configs, workers, settings):
+    # Successive halving: every live config is trained to the same number of rounds, then only the best
+    # 1 / eta of those with rounds left (by best holdout log loss within that budget) continue to the next rung.
+    # Configs are always compared at equal rounds, so the outcome does not depend on the order they run in.
+    states = [{"config": config, "booster": None, "history": [], "fit_seconds": 0.0, "finished": False,
+               "pruned": False, "result": None} for config in configs]
+    rungs = rung_schedule(settings["min_rounds"], settings["eta"], max(c["n_estimators"] for c in configs))
+    results = []
+    with ProcessPoolExecutor(max_workers=workers, initializer=init_worker, initargs=(data, settings)) as pool:
+        live = states
+        for rung in rungs:
+            live = list(pool.map(train_to, live, [rung] * len(live)))
+            for state in live:
+                if state["finished"]:
+                    results.append(state["result"])
+            live = [state for state in live if not state["finished"]]
+            keep = int(np.ceil(len(live) / settings["eta"]))
+            ranked = sorted(live, key=lambda state: state["rung_logloss"])
+            survivors = [state for i, state in enumerate(ranked)
+                         if i < keep or all(state["config"][k] == v for k, v in BASELINE.items())]
+            pruned = [state for state in ranked if not any(state is kept for kept in survivors)]
+            results += [state["result"] for state in pool.map(finish_pruned, pruned)]
+            print(f"rung {rung:>4} rounds: {len(results)}/{len(configs)} done, {len(pruned)} pruned, "
+                  f"{len(survivors)} continue" + (f" (best log loss {ranked[0]['rung_logloss']:.4f})" if ranked else ""))
+            live = survivors
+            if not live:
+                break
+    return results
+
+
+def leaderboard(results):
+    board = pd.DataFrame(results)
+    board["baseline"] = [all(r[k] == v for k, v in BASELINE.items()) for r in results]
+    # Pruned configs compete too: one that peaked early can still have the best scored log loss
+    return board.sort_values("log_loss").reset_index(drop=True)
+
+
+def main():
+    cpus = os.cpu_count() or 1
+    parser = argparse.ArgumentParser(description="Parallel time-split hyperparameter search for the dish classifier")
+    parser.add_argument("--dining-file", default=os.path.join(BASE_DIR, "dining_info.xlsx"))
+    parser.add_argument("--threads-per-worker", type=int, default=min(2, cpus),
+                        help="xgboost threads per worker process; workers x threads never exceeds the cores")
+    parser.add_argument("--workers", type=int, help="worker processes (default: cores // threads-per-worker)")
+    parser.add_argument("--learning-rates", type=float, nargs="+", default=LEARNING_RATES)
+    parser.add_argument("--max-depths", type=int, nargs="+", default=MAX_DEPTHS)
+    parser.add_argument("--n-estimators", type=int, nargs="+", default=N_ESTIMATORS)
+    parser.add_argument("--early-stopping-rounds", type=int, default=20)
+    parser.add_argument("--min-rounds", type=int, default=25,
+                        help="boosting rounds at the first successive-halving rung")
+    parser.add_argument("--eta", type=int, default=2,
+                        help="rounds grow by this factor per rung and only the best 1 / eta configs continue")
+    parser.add_argument("--output", default=os.path.join(BASE_DIR, "hyperparameter_leaderboard.csv"))
+    args = parser.parse_args()
+    if args.min_rounds < 1 or args.eta < 2:
+        parser.error("--min-rounds must be at least 1 and --eta at least 2")
+
+    threads = max(1, min(args.threads_per_worker, cpus))
+    workers = args.workers or max(1, cpus // threads)
+    settings = {"threads_per_worker": threads, "early_stopping_rounds": args.early_stopping_rounds,
+                "min_rounds": args.min_rounds, "eta": args.eta}
+
+    data = prepare_data(args.dining_file)
+    configs = candidate_configs(args.learning_rates, args.max_depths, args.n_estimators)
+    print(f"{len(configs)} configs, {workers} workers x {threads} threads, "
+          f"{data[0].shape[0]} training rows, {data[2].shape[0]} holdout rows")
+
+    start = time.perf_counter()
+    results = run_search(data, configs, workers, settings)
+    elapsed = time.perf_counter() - start
+
+    board = leaderboard(results)
+    board.to_csv(args.output, index=False)
+    columns = ["learning_rate", "max_depth", "n_estimators", "rounds_used", "accuracy", "log_loss",
+               "top3_hit_rate", "fit_seconds", "model_kb", "pruned", "baseline"]
+    print(f"\nSearch finished in {elapsed:.1f}s ({board['pruned'].sum()} of {len(board)} configs pruned)")
+    print(board[columns].head(10).to_string(index=False, float_format=lambda v: f"{v:.4f}"))
+    baseline = board[board["baseline"]]
+    if len(baseline):
+        print("\nNotebook baseline:")
+        print(baseline[columns].to_string(index=False, float_format=lambda v: f"{v:.4f}"))
+    print(f"\nLeaderboard written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -2,24 +2,66 @@ import streamlit as st
 from datetime import date
 import pandas as pd
 import random  
-import joblib
-import xgboost
-import numpy as np
-import smtplib
-from email.mime.text import MIMEText
-from email.mime.multipart import MIMEMultipart
-from sklearn.preprocessing import OneHotEncoder
 from pymongo import MongoClient
+from feature_store import get_feature_store
+from model_registry import get_model_registry
+from recommender import prepare_bookings, recommend
+from prediction_cache import PredictionCache
+from email_outbox import enqueue_email, OutboxWorker
+from guest_profiles import PROFILE_FILE, GuestProfileStore
+import os
 
 # Connect to MongoDB
 client = MongoClient("mongodb://localhost:27017/")
+email_outbox = client["hotel_guests"]["email_outbox"]
+dining_info = client["hotel_guests"]["dining_info"]
+
+# Feature tables are loaded once per process and reloaded when the xlsx files change
+@st.cache_resource
+def load_feature_store():
+    return get_feature_store()
+
+feature_store = load_feature_store()
+
+# Live guest profiles (built by guest_profiles.py) replace the customer xlsx snapshots when available
+@st.cache_resource
+def load_profile_store():
+    if not os.path.exists(PROFILE_FILE):
+        return None
+    store = GuestProfileStore.load(PROFILE_FILE)
+    store.maybe_sync(dining_info)
+    feature_store.attach_profiles(store)
+    return store
+
+profile_store = load_profile_store()
+
+# Model bundle (booster + manifest) is loaded, validated and warmed up once, then hot swapped when a new one lands
+@st.cache_resource
+def load_model_registry():
+    return get_model_registry()
+
+model_registry = load_model_registry()
+
+# Predictions for repeated feature rows (mostly new guests) are served from memory
+@st.cache_resource
+def load_prediction_cache():
+    return PredictionCache(max_size=50000, ttl_seconds=3600)
+
+prediction_cache = load_prediction_cache()
+
+# Background workers that send queued emails over pooled SMTP connections
+@st.cache_resource
+def start_outbox_worker():
+    worker = OutboxWorker(email_outbox, threads=2)
+    worker.start()
+    return worker
+
+outbox_worker = start_outbox_worker()
 
 def generate_coupon():
     return "HOTEL" + str(random.randint(1000, 9999))
 
 def send_email(name, email, checkin_date, checkout_date, preferred_cuisine,coupon_code):
-    sender_email = "ex@gmail.com"  # Replace with your email
-    sender_password = "password"  # Replace with your email password
     subject = "Hotel Booking Confirmation"
     body = f"""
     Dear {name},
@@ -34,23 +76,13 @@ def send_email(name, email, checkin_date, checkout_date, preferred_cuisine,coupo
     
     Thank you for choosing our service!
     """
-    
-    msg = MIMEMultipart()
-    msg['From'] = sender_email
-    msg['To'] = email
-    
-    msg['Subject'] = subject
-    msg.attach(MIMEText(body, 'plain'))
-    
+
+    # Queue the email in the outbox; the outbox worker sends it in the background
     try:
-        server = smtplib.SMTP('smtp.gmail.com', 587)
-        server.starttls()
-        server.login(sender_email, sender_password)
-        server.sendmail(sender_email, email, msg.as_string())
-        server.quit()
+        enqueue_email(email_outbox, email, subject, body)
         st.success("🎉 Check your Mail for Coupon Code for Discounts and Booking Confirmation")
     except Exception as e:
-        st.error(f"⚠️ Email could not be sent: {str(e)}")
+        st.error(f"⚠️ Email could not be queued: {str(e)}")
 
 # Title
 st.title("🏨 Hotel Booking Form")
@@ -90,88 +122,20 @@ if st.button("Submit Booking"):
             'email': email
         }
 
-        new_df = pd.DataFrame([new_data])
-        new_df['check_in_date'] = pd.to_datetime(new_df['check_in_date'])
-        new_df['check_out_date'] = pd.to_datetime(new_df['check_out_date'])
-        new_df['check_in_day'] = new_df['check_in_date'].dt.dayofweek
-        new_df['check_out_day'] = new_df['check_out_date'].dt.dayofweek
-        new_df['check_in_month'] = new_df['check_in_date'].dt.month
-        new_df['check_out_month'] = new_df['check_out_date'].dt.month
-        new_df['stay_duration'] = (new_df['check_out_date'] - new_df['check_in_date']).dt.days
+        new_df = prepare_bookings(pd.DataFrame([new_data]))
 
         # Store in MongoDB about the information of New Bookings
         db = client["hotel_guests"]
         new_bookings_collection = db["new_bookings"]
         new_bookings_collection.insert_one(new_df.iloc[0].to_dict())
 
-        # Load feature datasets
-        data_files = {
-            "age_features": "age_features.xlsx",
-            "cuisine_features": "cuisine_features.xlsx",
-            "customer_features": "customer_features.xlsx",
-            "customer_behaviour_features": "customer_behaviour_features.xlsx",
-            "customer_recency_features": "customer_recency_features.xlsx",
-            "loyalty_features": "loyalty_features.xlsx",
-            "stayed_features": "stayed_features.xlsx"
-        }
-        
-        data_frames = {key: pd.read_excel(value) for key, value in data_files.items()}
-
-        # Merge Features
-        for df_name, df in data_frames.items():
-            if 'customer_id' in df.columns:
-                new_df = new_df.merge(df, on="customer_id", how="left")
-            elif 'Preferred Cusine' in df.columns:
-                new_df = new_df.merge(df, on="Preferred Cusine", how="left")
-            elif 'age' in df.columns:
-                new_df = new_df.merge(df, on="age", how="left")
-            elif 'number_of_stayers' in df.columns:
-                new_df = new_df.merge(df, on="number_of_stayers", how="left")
-
-        # Drop unnecessary columns
-        new_df.drop(['customer_id', 'check_in_date', 'check_out_date'], axis=1, inplace=True)
-
-        # Load encoder
-        encoder = joblib.load('encoder.pkl')
-
-        # Ensure categorical columns exist before encoding
-        categorical_cols = list(encoder.feature_names_in_)  
-        for col in categorical_cols:
-            if col not in new_df.columns:
-                new_df[col] = "Unknown"
-
-        # Remove extra columns that were not seen during encoder training
-        new_df = new_df[categorical_cols]
-
-        # Perform encoding
-        encoded_test = encoder.transform(new_df)
-        encoded_test_df = pd.DataFrame(encoded_test, columns=encoder.get_feature_names_out())
-
-        # Merge encoded features with the rest of the dataframe
-        new_df = pd.concat([new_df.drop(columns=categorical_cols), encoded_test_df], axis=1)
-
-        # Load expected feature names from `features.xlsx`
-        expected_features = list(pd.read_excel('features.xlsx')[0])
-        
-        # Ensure all expected features exist and fill missing ones with 0
-        for feature in expected_features:
-            if feature not in new_df.columns:
-                new_df[feature] = 0
-
-        # Reorder columns to match model input
-        new_df = new_df[expected_features]
-
-        # Load model and make predictions
-        model = joblib.load('xgb_model_dining.pkl')
-        y_pred_prob = model.predict_proba(new_df)
-
-        # Load label encoder
-        label_encoder = joblib.load('label_encoder.pkl')
-        dish_names = label_encoder.classes_
-
-        # Get top 3 predictions
-        top_3_indices = np.argsort(-y_pred_prob, axis=1)[:, :3]
-        top_3_dishes = dish_names[top_3_indices]
+        # Pick up new dining transactions and register the guest (O(1) per update)
+        if profile_store is not None:
+            profile_store.maybe_sync(dining_info)
+            profile_store.record_booking(int(customer_id))
+
+        # Get top 3 dishes: feature store lookups and encoding straight into the model input row
+        top_3_dishes, _ = recommend(new_df, feature_store, model_registry.get(), 3, cache=prediction_cache)
 
         # Generate Coupon Code
         coupon_code = generate_coupon()
@@ -190,3 +154,7 @@ if st.button("Submit Booking"):
             st.write(f"**Special Requests:** {special_requests}")
     else:
         st.warning("⚠️ Please enter your name, Customer ID, and Email to proceed!")
+
+# Active model version
+model_status = model_registry.status()
+st.caption(f"Model version {model_status['version']} ({model_status['source']}, loaded in {model_status['load_seconds']:.2f}s)")
@@ -0,0 +1,94 @@
+import argparse
+import time
+from datetime import datetime, timedelta
+import pandas as pd
+from pymongo import MongoClient, UpdateOne
+from feature_store import get_feature_store
+from model_registry import get_model_registry
+from recommender import recommend
+
+BOOKING_FIELDS = ['customer_id', 'Preferred Cusine', 'age', 'check_in_date', 'check_out_date',
+                  'booked_through_points', 'number_of_stayers']
+
+
+def load_upcoming_bookings(collection, start, end=None):
+    # Every booking checking in on/after `start` (and before `end` if given)
+    query = {'check_in_date': {'$gte': start}}
+    if end is not None:
+        query['check_in_date']['$lt'] = end
+    projection = {field: 1 for field in BOOKING_FIELDS}
+    return pd.DataFrame(list(collection.find(query, projection)))
+
+
+def write_recommendations(collection, bookings_df, dishes, scores, model_version, batch_size=1000):
+    # Upsert one recommendation document per booking, in bulk
+    collection.create_index('booking_id', unique=True)
+    scored_at = datetime.now()
+    operations = []
+    for booking_id, customer_id, check_in, row_dishes, row_scores in zip(
+            bookings_df['_id'], bookings_df['customer_id'], bookings_df['check_in_date'], dishes, scores):
+        operations.append(UpdateOne(
+            {'booking_id': booking_id},
+            {'$set': {
+                'booking_id': booking_id,
+                'customer_id': int(customer_id),
+                'check_in_date': pd.Timestamp(check_in).to_pydatetime(),
+                'recommended_dishes': [str(d) for d in row_dishes],
+                'scores': [float(s) for s in row_scores],
+                'model_version': model_version,
+                'scored_at': scored_at
+            }},
+            upsert=True
+        ))
+        if len(operations) >= batch_size:
+            collection.bulk_write(operations, ordered=False)
+            operations = []
+    if operations:
+        collection.bulk_write(operations, ordered=False)
+
+
+def run_batch(db, start, end=None, k=3, feature_store=None, model_registry=None):
+    feature_store = feature_store or get_feature_store()
+    artifacts = (model_registry or get_model_registry()).get()
+
+    t0 = time.perf_counter()
+    bookings_df = load_upcoming_bookings(db["new_bookings"], start, end)
+    if bookings_df.empty:
+        return {'bookings': 0}
+    t1 = time.perf_counter()
+    # One vectorized feature pass and one predict_proba call for all bookings
+    dishes, scores = recommend(bookings_df, feature_store, artifacts, k)
+    t2 = time.perf_counter()
+    write_recommendations(db["dish_recommendations"], bookings_df, dishes, scores, artifacts.version)
+    t3 = time.perf_counter()
+
+    return {
+        'bookings': len(bookings_df),
+        'model_version': artifacts.version,
+        'read_seconds': t1 - t0,
+        'score_seconds': t2 - t1,
+        'write_seconds': t3 - t2
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Score top-k dish recommendations for upcoming arrivals")
+    parser.add_argument("--mongo-uri", default="mongodb://localhost:27017/")
+    parser.add_argument("--date", help="Only score arrivals on this day (YYYY-MM-DD), default: all upcoming")
+    parser.add_argument("--top-k", type=int, default=3)
+    args = parser.parse_args()
+
+    if args.date:
+        start = datetime.strptime(args.date, "%Y-%m-%d")
+        end = start + timedelta(days=1)
+    else:
+        start = datetime.combine(datetime.now().date(), datetime.min.time())
+        end = None
+
+    db = MongoClient(args.mongo_uri)["hotel_guests"]
+    summary = run_batch(db, start, end, k=args.top_k)
+    print(summary)
+
+
+if __name__ == "__main__":
+    main()
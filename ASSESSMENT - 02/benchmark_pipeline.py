@@ -0,0 +1,266 @@
+import argparse
+import json
+import os
+import resource
+import smtplib
+import socket
+import threading
+import time
+import tracemalloc
+from collections import defaultdict
+import joblib
+import numpy as np
+import pandas as pd
+from feature_store import FEATURE_FILES, get_feature_store
+from model_registry import get_model_registry
+from feature_transformer import get_transformer
+from recommender import prepare_bookings, top_k_dishes
+from email_outbox import enqueue_email, build_message, SMTPConnectionPool
+from benchmark_transformer import random_bookings
+
+# Stage-by-stage latency of the booking submit pipeline, run headlessly against
+# mongomock (or a real Mongo via --mongo-uri) and a local SMTP sink.
+#   legacy:  the original per-submit steps (xlsx reads, merges, DataFrame encoding, joblib loads, SMTP per email)
+#   current: feature store + compiled transformer + model registry + email outbox
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+class SMTPSink:
+    # Minimal local SMTP server that accepts and discards every message
+
+    def __init__(self, host="127.0.0.1", port=0):
+        self.server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.server.bind((host, port))
+        self.server.listen(16)
+        self.host, self.port = self.server.getsockname()
+        self.messages = 0
+        threading.Thread(target=self.accept_loop, daemon=True).start()
+
+    def accept_loop(self):
+        while True:
+            try:
+                conn, _ = self.server.accept()
+            except OSError:
+                return
+            threading.Thread(target=self.handle, args=(conn,), daemon=True).start()
+
+    def handle(self, conn):
+        f = conn.makefile("rb")
+        conn.sendall(b"220 sink ready\r\n")
+        in_data = False
+        for line in f:
+            if in_data:
+                if line in (b".\r\n", b".\n"):
+                    in_data = False
+                    self.messages += 1
+                    conn.sendall(b"250 OK\r\n")
+                continue
+            command = line[:4].upper()
+            if command == b"DATA":
+                in_data = True
+                conn.sendall(b"354 End data with <CR><LF>.<CR><LF>\r\n")
+            elif command == b"QUIT":
+                conn.sendall(b"221 Bye\r\n")
+                break
+            else:
+                conn.sendall(b"250 OK\r\n")
+        conn.close()
+
+    def close(self):
+        self.server.close()
+
+
+def mongo_collection(mongo_uri):
+    if mongo_uri:
+        from pymongo import MongoClient
+        client = MongoClient(mongo_uri)
+    else:
+        import mongomock
+        client = mongomock.MongoClient()
+    db = client["hotel_guests_benchmark"]
+    db["new_bookings"].drop()
+    db["email_outbox"].drop()
+    return db
+
+
+class StageTimer:
+    def __init__(self):
+        self.samples = defaultdict(list)
+
+    def run(self, stage, fn, *args):
+        start = time.perf_counter()
+        result = fn(*args)
+        self.samples[stage].append(time.perf_counter() - start)
+        return result
+
+
+def email_body(booking, coupon_code):
+    return f"""
+    Your hotel booking has been confirmed!
+
+    Check-in Date: {booking['check_in_date']}
+    Check-out Date: {booking['check_out_date']}
+    Preferred Cuisine: {booking['Preferred Cusine']}
+
+    🎉Use this coupon code for discounts on your meals: {coupon_code}
+    """
+
+
+def legacy_submit(booking, db, sink, timer):
+    new_df = prepare_bookings(pd.DataFrame([booking]))
+    timer.run("insert_one", lambda: db["new_bookings"].insert_one(new_df.iloc[0].to_dict()))
+
+    data_frames = timer.run("excel_reads", lambda: {
+        key: pd.read_excel(os.path.join(BASE_DIR, value)) for key, value in FEATURE_FILES.items()})
+
+    def merge():
+        df = new_df
+        for other in data_frames.values():
+            for key in ["customer_id", "Preferred Cusine", "age", "number_of_stayers"]:
+                if key in other.columns:
+                    df = df.merge(other, on=key, how="left")
+                    break
+        return df.drop(['customer_id', 'check_in_date', 'check_out_date'], axis=1)
+    merged = timer.run("merges", merge)
+
+    def load_model():
+        model = joblib.load(os.path.join(BASE_DIR, 'xgb_model_dining.pkl'))
+        encoder = joblib.load(os.path.join(BASE_DIR, 'encoder.pkl'))
+        label_encoder = joblib.load(os.path.join(BASE_DIR, 'label_encoder.pkl'))
+        return model, encoder, label_encoder
+    model, encoder, label_encoder = timer.run("model_load", load_model)
+
+    def encode():
+        categorical_cols = list(encoder.feature_names_in_)
+        df = merged.copy()
+        for col in categorical_cols:
+            if col not in df.columns:
+                df[col] = "Unknown"
+        encoded = pd.DataFrame(encoder.transform(df[categorical_cols]), columns=encoder.get_feature_names_out())
+        return pd.concat([df.drop(columns=categorical_cols), encoded], axis=1)
+    encoded_df = timer.run("encoding", encode)
+
+    def align():
+        expected_features = list(pd.read_excel(os.path.join(BASE_DIR, 'features.xlsx'))[0])
+        df = encoded_df
+        for feature in expected_features:
+            if feature not in df.columns:
+                df[feature] = 0
+        return df[expected_features]
+    model_input = timer.run("column_alignment", align)
+
+    y_pred_prob = timer.run("predict_proba", model.predict_proba, model_input)
+    timer.run("top3", lambda: label_encoder.classes_[np.argsort(-y_pred_prob, axis=1)[:, :3]])
+
+    def send():
+        # One connection per email, as in the original send_email (no TLS/login against the sink)
+        doc = {"sender": "hotel@example.com", "to": "guest@example.com",
+               "subject": "Hotel Booking Confirmation", "body": email_body(booking, "HOTEL1234")}
+        server = smtplib.SMTP(sink.host, sink.port)
+        server.sendmail(doc["sender"], doc["to"], build_message(doc))
+        server.quit()
+    timer.run("email", send)
+
+
+def current_submit(booking, db, sink, timer, feature_store, model_registry, smtp_pool):
+    new_df = prepare_bookings(pd.DataFrame([booking]))
+    timer.run("insert_one", lambda: db["new_bookings"].insert_one(new_df.iloc[0].to_dict()))
+
+    artifacts = timer.run("model_load", model_registry.get)
+    transformer = get_transformer(artifacts, feature_store)
+    X = timer.run("feature_lookup+encoding", transformer.transform, booking)
+    y_pred_prob = timer.run("predict_proba", transformer.predict_proba, X)
+    timer.run("top3", top_k_dishes, y_pred_prob, artifacts.dish_names, 3)
+
+    timer.run("email_enqueue", enqueue_email, db["email_outbox"], "guest@example.com",
+              "Hotel Booking Confirmation", email_body(booking, "HOTEL1234"), "hotel@example.com")
+    # Background side: what the outbox worker pays per message over a pooled connection
+    doc = db["email_outbox"].find_one_and_update({"status": "pending"}, {"$set": {"status": "sent"}})
+    timer.run("email_send_pooled", smtp_pool.send, doc["sender"], doc["to"], build_message(doc))
+
+
+def percentiles(samples):
+    ms = np.array(samples) * 1000
+    return {"p50": float(np.percentile(ms, 50)), "p95": float(np.percentile(ms, 95)),
+            "p99": float(np.percentile(ms, 99)), "mean": float(ms.mean()), "count": len(ms)}
+
+
+def run(pipeline, n, args, sink):
+    db = mongo_collection(args.mongo_uri)
+    bookings = random_bookings(n, seed=n)
+    timer = StageTimer()
+
+    if pipeline == "current":
+        feature_store = get_feature_store()
+        model_registry = get_model_registry()
+        smtp_pool = SMTPConnectionPool({"host": sink.host, "port": sink.port, "user": "", "password": "",
+                                        "use_tls": False}, size=1)
+        submit = lambda booking: current_submit(booking, db, sink, timer, feature_store, model_registry, smtp_pool)
+    else:
+        submit = lambda booking: legacy_submit(booking, db, sink, timer)
+
+    if args.trace_memory:
+        tracemalloc.start()
+    start = time.perf_counter()
+    for booking in bookings:
+        submit(booking)
+    elapsed = time.perf_counter() - start
+    peak_traced = tracemalloc.get_traced_memory()[1] if args.trace_memory else None
+    if args.trace_memory:
+        tracemalloc.stop()
+    if pipeline == "current":
+        smtp_pool.close()
+
+    return {
+        "pipeline": pipeline,
+        "bookings": n,
+        "total_seconds": elapsed,
+        "submits_per_second": n / elapsed,
+        "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        "peak_traced_mb": peak_traced / 2 ** 20 if peak_traced is not None else None,
+        "stages": {stage: percentiles(samples) for stage, samples in timer.samples.items()}
+    }
+
+
+def print_result(result):
+    print(f"\n== {result['pipeline']} pipeline, {result['bookings']} bookings: "
+          f"{result['total_seconds']:.2f}s ({result['submits_per_second']:.1f} submits/s), "
+          f"peak RSS {result['peak_rss_mb']:.0f} MB"
+          + (f", peak traced {result['peak_traced_mb']:.1f} MB" if result['peak_traced_mb'] is not None else ""))
+    print(f"{'stage':<26}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+    for stage, p in result["stages"].items():
+        print(f"{stage:<26}{p['p50']:>10.3f}{p['p95']:>10.3f}{p['p99']:>10.3f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Stage-by-stage latency benchmark for the booking submit pipeline")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1, 100, 10000])
+    parser.add_argument("--pipelines", nargs="+", default=["legacy", "current"], choices=["legacy", "current"])
+    parser.add_argument("--legacy-max", type=int, default=100,
+                        help="largest run for the legacy pipeline (it re-reads 8 xlsx files per booking)")
+    parser.add_argument("--mongo-uri", help="use a real MongoDB instead of mongomock")
+    parser.add_argument("--trace-memory", action="store_true", help="also report tracemalloc peak (slower)")
+    parser.add_argument("--output", help="write results as JSON")
+    args = parser.parse_args()
+
+    sink = SMTPSink()
+    results = []
+    for pipeline in args.pipelines:
+        for n in args.sizes:
+            if pipeline == "legacy" and n > args.legacy_max:
+                print(f"\n(skipping legacy pipeline at {n} bookings, above --legacy-max {args.legacy_max})")
+                continue
+            result = run(pipeline, n, args, sink)
+            print_result(result)
+            results.append(result)
+    sink.close()
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
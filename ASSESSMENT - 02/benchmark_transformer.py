@@ -0,0 +1,69 @@
+import random
+import time
+from datetime import date, timedelta
+import numpy as np
+import pandas as pd
+from feature_store import get_feature_store
+from model_registry import get_model_registry
+from recommender import prepare_bookings, build_feature_matrix
+from feature_transformer import get_transformer
+
+# Per-row latency of the DataFrame path (merge/encode/concat/reorder + predict_proba)
+# against the compiled transformer + booster in-place predict
+
+
+def random_bookings(n, seed=0):
+    rng = random.Random(seed)
+    bookings = []
+    for _ in range(n):
+        check_in = date(2025, 1, 1) + timedelta(days=rng.randint(0, 364))
+        bookings.append({
+            'customer_id': rng.choice([rng.randint(1, 3600), rng.randint(10001, 99999)]),
+            'Preferred Cusine': rng.choice(["South Indian", "North Indian", "Multi"]),
+            'age': rng.randint(18, 120),
+            'check_in_date': check_in,
+            'check_out_date': check_in + timedelta(days=rng.randint(0, 10)),
+            'booked_through_points': rng.randint(0, 1),
+            'number_of_stayers': rng.randint(1, 3)
+        })
+    return bookings
+
+
+def dataframe_path(bookings, feature_store, artifacts):
+    features = build_feature_matrix(prepare_bookings(pd.DataFrame(bookings)), feature_store, artifacts)
+    return artifacts.model.predict_proba(features)
+
+
+def transformer_path(bookings, feature_store, artifacts):
+    transformer = get_transformer(artifacts, feature_store)
+    return transformer.predict_proba(transformer.transform(bookings))
+
+
+def time_per_row(fn, batches, feature_store, artifacts):
+    timings = []
+    for batch in batches:
+        start = time.perf_counter()
+        fn(batch, feature_store, artifacts)
+        timings.append((time.perf_counter() - start) / len(batch))
+    return np.array(timings) * 1e6
+
+
+def main():
+    feature_store = get_feature_store()
+    artifacts = get_model_registry().get()
+
+    bookings = random_bookings(2000)
+    reference = dataframe_path(bookings, feature_store, artifacts)
+    compiled = transformer_path(bookings, feature_store, artifacts)
+    print(f"Max probability difference between paths: {np.abs(reference - compiled).max():.2e}")
+
+    for batch_size, repeats in [(1, 200), (100, 20), (2000, 5)]:
+        batches = [bookings[i * batch_size % len(bookings):][:batch_size] for i in range(repeats)]
+        old = time_per_row(dataframe_path, batches, feature_store, artifacts)
+        new = time_per_row(transformer_path, batches, feature_store, artifacts)
+        print(f"batch={batch_size:>5}  dataframe path: p50 {np.median(old):9.1f} us/row   "
+              f"transformer: p50 {np.median(new):8.1f} us/row   speedup x{np.median(old) / np.median(new):.1f}")
+
+
+if __name__ == "__main__":
+    main()
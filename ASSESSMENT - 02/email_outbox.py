@@ -0,0 +1,210 @@
+import argparse
+import os
+import queue
+import smtplib
+import threading
+import time
+from collections import deque
+from datetime import datetime, timedelta
+from email.mime.text import MIMEText
+from email.mime.multipart import MIMEMultipart
+import numpy as np
+from pymongo import MongoClient, ReturnDocument
+
+# SMTP settings (override with environment variables, e.g. a local SMTP sink for testing)
+SMTP_SETTINGS = {
+    "host": os.environ.get("SMTP_HOST", "smtp.gmail.com"),
+    "port": int(os.environ.get("SMTP_PORT", "587")),
+    "user": os.environ.get("SMTP_USER", "ex@gmail.com"),  # Replace with your email
+    "password": os.environ.get("SMTP_PASSWORD", "password"),  # Replace with your email password
+    "use_tls": os.environ.get("SMTP_USE_TLS", "1") == "1"
+}
+
+MAX_ATTEMPTS = 5
+BACKOFF_SECONDS = 2
+CLAIM_TIMEOUT = timedelta(minutes=5)
+
+
+def enqueue_email(collection, to, subject, body, sender=None):
+    # Booking path: store the message and return immediately
+    now = datetime.now()
+    result = collection.insert_one({
+        "to": to,
+        "sender": sender or SMTP_SETTINGS["user"],
+        "subject": subject,
+        "body": body,
+        "status": "pending",
+        "attempts": 0,
+        "created_at": now,
+        "next_attempt_at": now
+    })
+    return result.inserted_id
+
+
+def build_message(doc):
+    msg = MIMEMultipart()
+    msg['From'] = doc["sender"]
+    msg['To'] = doc["to"]
+    msg['Subject'] = doc["subject"]
+    msg.attach(MIMEText(doc["body"], 'plain'))
+    return msg.as_string()
+
+
+class SMTPConnectionPool:
+    # A few logged-in SMTP connections shared by the workers instead of one login per email
+
+    def __init__(self, settings=None, size=2):
+        self.settings = dict(settings or SMTP_SETTINGS)
+        self.connections = queue.LifoQueue()
+        for _ in range(size):
+            self.connections.put(None)  # connections are opened lazily
+
+    def connect(self):
+        server = smtplib.SMTP(self.settings["host"], self.settings["port"], timeout=30)
+        if self.settings["use_tls"]:
+            server.starttls()
+        if self.settings["user"] and self.settings["password"]:
+            server.login(self.settings["user"], self.settings["password"])
+        return server
+
+    def send(self, sender, to, message):
+        server = self.connections.get()
+        try:
+            if server is None:
+                server = self.connect()
+            try:
+                server.sendmail(sender, to, message)
+            except smtplib.SMTPServerDisconnected:
+                # Server dropped an idle connection: reconnect once and retry
+                server = self.connect()
+                server.sendmail(sender, to, message)
+        except Exception:
+            self.close_connection(server)
+            server = None
+            raise
+        finally:
+            self.connections.put(server)
+
+    def close_connection(self, server):
+        if server is not None:
+            try:
+                server.quit()
+            except Exception:
+                pass
+
+    def close(self):
+        while not self.connections.empty():
+            self.close_connection(self.connections.get_nowait())
+
+
+class OutboxWorker:
+    # Drains the outbox with a small thread pool, retrying failed sends with exponential backoff
+
+    def __init__(self, collection, pool=None, threads=2, poll_interval=0.5,
+                 max_attempts=MAX_ATTEMPTS, backoff_seconds=BACKOFF_SECONDS):
+        self.collection = collection
+        self.pool = pool or SMTPConnectionPool(size=threads)
+        self.threads = threads
+        self.poll_interval = poll_interval
+        self.max_attempts = max_attempts
+        self.backoff_seconds = backoff_seconds
+        self.stop_event = threading.Event()
+        self.workers = []
+        self.send_latencies = deque(maxlen=1000)
+        self.sent = 0
+        self.failed = 0
+        self.collection.create_index([("status", 1), ("next_attempt_at", 1)])
+
+    def claim(self):
+        now = datetime.now()
+        return self.collection.find_one_and_update(
+            {"$or": [
+                {"status": "pending", "next_attempt_at": {"$lte": now}},
+                # A worker died mid-send: hand its message to someone else
+                {"status": "sending", "claimed_at": {"$lte": now - CLAIM_TIMEOUT}}
+            ]},
+            {"$set": {"status": "sending", "claimed_at": now}},
+            sort=[("next_attempt_at", 1)],
+            return_document=ReturnDocument.AFTER
+        )
+
+    def process(self, doc):
+        try:
+            self.pool.send(doc["sender"], doc["to"], build_message(doc))
+        except Exception as e:
+            attempts = doc["attempts"] + 1
+            if attempts >= self.max_attempts:
+                update = {"status": "failed", "attempts": attempts, "last_error": str(e)}
+                self.failed += 1
+            else:
+                delay = self.backoff_seconds * (2 ** (attempts - 1))
+                update = {"status": "pending", "attempts": attempts, "last_error": str(e),
+                          "next_attempt_at": datetime.now() + timedelta(seconds=delay)}
+            self.collection.update_one({"_id": doc["_id"]}, {"$set": update})
+            return False
+
+        sent_at = datetime.now()
+        self.collection.update_one({"_id": doc["_id"]}, {"$set": {
+            "status": "sent", "sent_at": sent_at, "attempts": doc["attempts"] + 1}})
+        self.send_latencies.append((sent_at - doc["created_at"]).total_seconds())
+        self.sent += 1
+        return True
+
+    def drain_once(self):
+        # Send everything that is due right now; returns the number of messages handled
+        handled = 0
+        while not self.stop_event.is_set():
+            doc = self.claim()
+            if doc is None:
+                break
+            self.process(doc)
+            handled += 1
+        return handled
+
+    def run(self):
+        while not self.stop_event.is_set():
+            if self.drain_once() == 0:
+                self.stop_event.wait(self.poll_interval)
+
+    def start(self):
+        for _ in range(self.threads):
+            worker = threading.Thread(target=self.run, daemon=True)
+            worker.start()
+            self.workers.append(worker)
+
+    def stop(self):
+        self.stop_event.set()
+        for worker in self.workers:
+            worker.join()
+        self.pool.close()
+
+    def stats(self):
+        latencies = np.array(self.send_latencies)
+        return {
+            "queue_depth": self.collection.count_documents({"status": {"$in": ["pending", "sending"]}}),
+            "sent": self.sent,
+            "failed": self.failed,
+            "send_latency_p50": float(np.percentile(latencies, 50)) if len(latencies) else 0.0,
+            "send_latency_p95": float(np.percentile(latencies, 95)) if len(latencies) else 0.0
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Send queued booking emails from the outbox")
+    parser.add_argument("--mongo-uri", default="mongodb://localhost:27017/")
+    parser.add_argument("--threads", type=int, default=2)
+    args = parser.parse_args()
+
+    collection = MongoClient(args.mongo_uri)["hotel_guests"]["email_outbox"]
+    worker = OutboxWorker(collection, threads=args.threads)
+    worker.start()
+    try:
+        while True:
+            time.sleep(30)
+            print(worker.stats())
+    except KeyboardInterrupt:
+        worker.stop()
+
+
+if __name__ == "__main__":
+    main()
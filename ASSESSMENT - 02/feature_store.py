@@ -0,0 +1,192 @@
+import os
+import threading
+import time
+import numpy as np
+import pandas as pd
+from guest_profiles import PROFILE_COLUMNS
+
+import repo_paths
+from data_access import read_table
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Feature tables used by the recommender (same files the booking form used to read on every submit)
+FEATURE_FILES = {
+    "age_features": "age_features.xlsx",
+    "cuisine_features": "cuisine_features.xlsx",
+    "customer_features": "customer_features.xlsx",
+    "customer_behaviour_features": "customer_behaviour_features.xlsx",
+    "customer_recency_features": "customer_recency_features.xlsx",
+    "loyalty_features": "loyalty_features.xlsx",
+    "stayed_features": "stayed_features.xlsx"
+}
+
+# Join keys, checked in the same order as the old merge loop
+KEY_COLUMNS = ["customer_id", "Preferred Cusine", "age", "number_of_stayers"]
+
+
+def find_key_column(df):
+    for key in KEY_COLUMNS:
+        if key in df.columns:
+            return key
+    return None
+
+
+def normalize_key(key, value):
+    # Keys coming from forms / Mongo can be strings or numpy scalars, the tables hold ints
+    if key == "Preferred Cusine":
+        return str(value)
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return value
+
+
+class FeatureTable:
+    # One feature table held column-wise: a key -> row position map plus one numpy array per column
+
+    def __init__(self, name, path, df):
+        self.name = name
+        self.path = path
+        self.mtime = os.path.getmtime(path)
+        self.key = find_key_column(df)
+        if self.key is None:
+            raise ValueError(f"{name}: none of the join keys {KEY_COLUMNS} found in {path}")
+
+        # Keep the first row per key, like a left merge against a deduplicated table
+        df = df.drop_duplicates(subset=self.key, keep="first").reset_index(drop=True)
+        keys = [normalize_key(self.key, k) for k in df[self.key].tolist()]
+        self.index = pd.Index(keys)
+        self.positions = {k: i for i, k in enumerate(keys)}
+
+        self.columns = {}
+        for col in df.columns:
+            if col == self.key:
+                continue
+            series = df[col]
+            if pd.api.types.is_numeric_dtype(series):
+                self.columns[col] = series.to_numpy(dtype=np.float64, na_value=np.nan)
+            else:
+                self.columns[col] = series.astype(object).where(series.notna(), np.nan).to_numpy(dtype=object)
+
+    def lookup(self, key_value):
+        pos = self.positions.get(normalize_key(self.key, key_value))
+        if pos is None:
+            return {col: np.nan for col in self.columns}
+        return {col: values[pos] for col, values in self.columns.items()}
+
+    def lookup_many(self, key_values):
+        keys = [normalize_key(self.key, k) for k in key_values]
+        pos = self.index.get_indexer(keys)
+        missing = pos < 0
+        safe_pos = np.where(missing, 0, pos)
+        out = {}
+        for col, values in self.columns.items():
+            if len(values) == 0:
+                taken = np.full(len(keys), np.nan, dtype=values.dtype)
+            else:
+                taken = values[safe_pos]
+            if missing.any():
+                taken = taken.copy()
+                taken[missing] = np.nan
+            out[col] = taken
+        return out
+
+
+class FeatureStore:
+    # Process-wide cache of the feature tables; reloads a table when its xlsx changes on disk
+
+    def __init__(self, files=None, base_dir=BASE_DIR, check_interval=1.0):
+        self.files = dict(files or FEATURE_FILES)
+        self.base_dir = base_dir
+        self.check_interval = check_interval
+        self.tables = {}
+        self.last_check = 0.0
+        self.reload_count = 0
+        self.profile_store = None
+        self.lock = threading.Lock()
+        self.refresh(force=True)
+
+    def path_for(self, file_name):
+        return file_name if os.path.isabs(file_name) else os.path.join(self.base_dir, file_name)
+
+    def load_table(self, name, file_name):
+        path = self.path_for(file_name)
+        return FeatureTable(name, path, read_table(path))
+
+    def refresh(self, force=False):
+        with self.lock:
+            self.last_check = time.monotonic()
+            tables = dict(self.tables)
+            changed = False
+            for name, file_name in self.files.items():
+                table = tables.get(name)
+                if force or table is None or os.path.getmtime(table.path) != table.mtime:
+                    tables[name] = self.load_table(name, file_name)
+                    changed = True
+            if changed:
+                # Swap the whole dict so readers never see a half reloaded store
+                self.tables = tables
+                self.reload_count += 1
+            return changed
+
+    def maybe_refresh(self):
+        if time.monotonic() - self.last_check >= self.check_interval:
+            try:
+                self.refresh()
+            except (OSError, ValueError):
+                # A file being rewritten mid-check: keep serving the cached copy and retry later
+                pass
+
+    def attach_profiles(self, profile_store):
+        # Serve the per-customer features from a live GuestProfileStore instead of the xlsx snapshots
+        with self.lock:
+            self.profile_store = profile_store
+            self.reload_count += 1
+
+    def active_tables(self):
+        # Tables still read from xlsx: customer tables fully covered by the profile store are skipped
+        if self.profile_store is None:
+            return list(self.tables.values())
+        return [table for table in self.tables.values()
+                if not (table.key == "customer_id" and set(table.columns) <= set(PROFILE_COLUMNS))]
+
+    @property
+    def version(self):
+        # Changes whenever any table is reloaded; used by caches that depend on the features
+        return self.reload_count
+
+    def features_for(self, booking):
+        # Same result as left-merging the booking row with every feature table
+        self.maybe_refresh()
+        features = {}
+        for table in self.active_tables():
+            if table.key in booking:
+                features.update(table.lookup(booking[table.key]))
+        if self.profile_store is not None and "customer_id" in booking:
+            features.update(self.profile_store.lookup(booking["customer_id"]))
+        return features
+
+    def features_for_frame(self, bookings_df):
+        # Vectorized version of features_for for many bookings at once
+        self.maybe_refresh()
+        columns = {}
+        for table in self.active_tables():
+            if table.key in bookings_df.columns:
+                columns.update(table.lookup_many(bookings_df[table.key].tolist()))
+        if self.profile_store is not None and "customer_id" in bookings_df.columns:
+            columns.update(self.profile_store.lookup_many(bookings_df["customer_id"].tolist()))
+        return pd.DataFrame(columns, index=bookings_df.index)
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_feature_store():
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = FeatureStore()
+    return _store
@@ -0,0 +1,205 @@
+import threading
+import numpy as np
+import pandas as pd
+import scipy.sparse as sp
+from feature_store import normalize_key
+from sparse_encoding import csr_from_parts, align_onehot_splits
+from guest_profiles import PROFILE_COLUMNS
+
+# Booking fields derived from the check-in/check-out dates (same as recommender.prepare_bookings)
+DATE_FIELDS = {
+    'check_in_day': lambda check_in, check_out: check_in.dayofweek,
+    'check_out_day': lambda check_in, check_out: check_out.dayofweek,
+    'check_in_month': lambda check_in, check_out: check_in.month,
+    'check_out_month': lambda check_in, check_out: check_out.month,
+    'stay_duration': lambda check_in, check_out: (check_out - check_in).days
+}
+
+
+def is_missing(value):
+    return value is None or (isinstance(value, float) and np.isnan(value))
+
+
+class FeatureTransformer:
+    # Booking dicts -> float32 model input rows, compiled once from the encoder, features.xlsx
+    # and the feature store tables. Replaces the DataFrame merge / encode / concat / reorder steps.
+
+    def __init__(self, artifacts, feature_store):
+        self.artifacts = artifacts
+        self.feature_store_version = feature_store.version
+        self.features = list(artifacts.expected_features)
+        self.n_features = len(self.features)
+        position = {name: i for i, name in enumerate(self.features)}
+
+        # Categorical column -> {category: model column}, plus the column used for missing values
+        self.categorical = {}
+        encoder = artifacts.encoder
+        names_out = list(encoder.get_feature_names_out())
+        offset = 0
+        for col, categories in zip(encoder.feature_names_in_, encoder.categories_):
+            mapping = {}
+            missing_col = -1
+            for category, name in zip(categories, names_out[offset:offset + len(categories)]):
+                target = position.get(name, -1)
+                if is_missing(category):
+                    missing_col = target
+                else:
+                    mapping[category] = target
+            offset += len(categories)
+            self.categorical[col] = (mapping, missing_col)
+
+        encoded = set(names_out)
+        self.numeric = {name: position[name] for name in self.features if name not in encoded}
+        self.numeric_targets = np.array(sorted(self.numeric.values()), dtype=np.int64)
+        self.numeric_slot = {target: i for i, target in enumerate(self.numeric_targets)}
+        self.onehot_targets = sorted(position[name] for name in names_out if name in position)
+
+        # Feature store columns, pre-mapped to model columns so lookups are pure array indexing
+        self.tables = []
+        for table in feature_store.active_tables():
+            numeric_cols = []
+            categorical_cols = []
+            for col, values in table.columns.items():
+                if col in self.numeric:
+                    numeric_cols.append((self.numeric[col], values.astype(np.float32)))
+                elif col in self.categorical:
+                    mapping, missing_col = self.categorical[col]
+                    codes = np.array([missing_col if is_missing(v) else mapping.get(v, -1) for v in values],
+                                     dtype=np.int64)
+                    categorical_cols.append((col, codes, missing_col))
+            self.tables.append((table, numeric_cols, categorical_cols))
+
+        # Live guest profiles (if attached) replace the customer tables skipped above
+        self.profile_store = feature_store.profile_store
+        self.profile_numeric = [(col, self.numeric[col]) for col in PROFILE_COLUMNS if col in self.numeric]
+        self.profile_categorical = [(col,) + self.categorical[col] for col in PROFILE_COLUMNS if col in self.categorical]
+
+        self.booster = artifacts.model.get_booster()
+        self.sparse_booster = None
+        self.objective = getattr(artifacts.model, 'objective', None)
+        try:
+            best_iteration = artifacts.model.best_iteration
+            self.iteration_range = (0, best_iteration + 1)
+        except AttributeError:
+            self.iteration_range = (0, 0)
+
+    def booking_columns(self, bookings):
+        # Accept a DataFrame, a single booking dict or a list of them
+        if isinstance(bookings, pd.DataFrame):
+            return {col: bookings[col].tolist() for col in bookings.columns}, len(bookings)
+        if isinstance(bookings, dict):
+            bookings = [bookings]
+        columns = {}
+        for booking in bookings:
+            for key in booking:
+                columns.setdefault(key, None)
+        return {key: [booking.get(key) for booking in bookings] for key in columns}, len(bookings)
+
+    def collect(self, bookings):
+        # Shared by the dense and sparse outputs: a small dense block for the numeric model columns
+        # (NaN = missing) plus (row, column) pairs for the one-hot hits
+        columns, n = self.booking_columns(bookings)
+        numeric = np.zeros((n, len(self.numeric_targets)), dtype=np.float32)
+        slot = self.numeric_slot
+        hit_rows, hit_cols = [], []
+        rows = np.arange(n)
+
+        def add_hits(targets):
+            targets = np.asarray(targets)
+            hit = targets >= 0
+            hit_rows.append(rows[hit])
+            hit_cols.append(targets[hit])
+
+        # Date derived fields
+        if 'check_in_date' in columns and 'check_out_date' in columns:
+            check_in = [pd.Timestamp(d) for d in columns['check_in_date']]
+            check_out = [pd.Timestamp(d) for d in columns['check_out_date']]
+            for field, derive in DATE_FIELDS.items():
+                if field in self.numeric and field not in columns:
+                    numeric[:, slot[self.numeric[field]]] = [derive(a, b) for a, b in zip(check_in, check_out)]
+
+        # Booking fields used directly by the model
+        filled = set()
+        for col, values in columns.items():
+            if col in self.numeric:
+                numeric[:, slot[self.numeric[col]]] = [np.nan if is_missing(v) else float(v) for v in values]
+                filled.add(col)
+            elif col in self.categorical:
+                mapping, missing_col = self.categorical[col]
+                add_hits([missing_col if is_missing(v) else mapping.get(v, -1) for v in values])
+                filled.add(col)
+
+        # Feature store lookups: one position per booking and table, then column gathers
+        for table, numeric_cols, categorical_cols in self.tables:
+            if table.key not in columns:
+                continue
+            positions = table.positions
+            pos = np.array([positions.get(normalize_key(table.key, v), -1) for v in columns[table.key]], dtype=np.int64)
+            found = pos >= 0
+            safe_pos = np.where(found, pos, 0)
+            for target, values in numeric_cols:
+                if self.features[target] in filled:
+                    continue
+                numeric[:, slot[target]] = np.where(found, values[safe_pos], np.nan) if len(values) else np.nan
+            for col, codes, missing_col in categorical_cols:
+                if col in filled:
+                    continue
+                add_hits(np.where(found, codes[safe_pos], missing_col) if len(codes) else np.full(n, missing_col))
+
+        if self.profile_store is not None and 'customer_id' in columns:
+            profiles = self.profile_store.lookup_many(columns['customer_id'])
+            for col, target in self.profile_numeric:
+                if col not in filled:
+                    numeric[:, slot[target]] = profiles[col]
+            for col, mapping, missing_col in self.profile_categorical:
+                if col in filled:
+                    continue
+                add_hits([missing_col if is_missing(v) else mapping.get(v, -1) for v in profiles[col]])
+
+        hit_rows = np.concatenate(hit_rows) if hit_rows else np.zeros(0, dtype=np.int64)
+        hit_cols = np.concatenate(hit_cols) if hit_cols else np.zeros(0, dtype=np.int64)
+        return n, numeric, hit_rows, hit_cols
+
+    def transform(self, bookings):
+        n, numeric, hit_rows, hit_cols = self.collect(bookings)
+        out = np.zeros((n, self.n_features), dtype=np.float32)
+        out[:, self.numeric_targets] = numeric
+        out[hit_rows, hit_cols] = 1.0
+        return out
+
+    def transform_sparse(self, bookings):
+        # CSR straight from the collected parts, never materializing the one-hot columns densely
+        n, numeric, hit_rows, hit_cols = self.collect(bookings)
+        return csr_from_parts(n, self.n_features, numeric, self.numeric_targets, hit_rows, hit_cols)
+
+    def sparse_input_booster(self):
+        # Absent CSR entries are "missing" to XGBoost; route missing one-hot values down the 0 branch
+        if self.sparse_booster is None:
+            self.sparse_booster = align_onehot_splits(self.booster, self.onehot_targets)
+        return self.sparse_booster
+
+    def predict_proba(self, X):
+        # In-place predict on the booster: no DMatrix construction, no sklearn wrapper overhead
+        booster = self.sparse_input_booster() if sp.issparse(X) else self.booster
+        if self.objective == 'multi:softmax':
+            margin = booster.inplace_predict(X, iteration_range=self.iteration_range, predict_type='margin')
+            margin = margin - margin.max(axis=1, keepdims=True)
+            probs = np.exp(margin)
+            return probs / probs.sum(axis=1, keepdims=True)
+        return booster.inplace_predict(X, iteration_range=self.iteration_range)
+
+
+_transformer = None
+_transformer_lock = threading.Lock()
+
+
+def get_transformer(artifacts, feature_store):
+    # Recompiled only when the model artifacts or the feature tables change
+    global _transformer
+    transformer = _transformer
+    if (transformer is None or transformer.artifacts is not artifacts
+            or transformer.feature_store_version != feature_store.version):
+        with _transformer_lock:
+            transformer = FeatureTransformer(artifacts, feature_store)
+            _transformer = transformer
+    return transformer
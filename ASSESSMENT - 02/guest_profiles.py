@@ -0,0 +1,364 @@
+import argparse
+import os
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+import numpy as np
+import pandas as pd
+
+import repo_paths
+from data_access import read_table
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+PROFILE_FILE = os.path.join(BASE_DIR, "guest_profiles.npz")
+DAY = 86400.0
+# Mongo sync re-reads documents whose _id was generated this long before the newest one applied: inserts
+# from other clients can commit out of _id order, and the ids already applied are skipped
+SYNC_LOOKBACK_SECONDS = 300
+
+# Features served per customer (same columns as the customer_*/loyalty xlsx snapshots)
+PROFILE_COLUMNS = [
+    "total_orders_per_customer", "avg_spend_per_customer", "total_qty_per_customer",
+    "fav_dish_per_customer", "most_preferred_cuisine",
+    "unique_dishes_ordered", "unique_cuisines_ordered", "most_common_dish", "most_common_cuisine",
+    "avg_days_between_orders", "last_order_days_ago",
+    "total_points_used", "discount_sensitive_orders"
+]
+
+# Per-customer counters, one numpy array per column (row i = customer in slot i)
+COUNTERS = {
+    "order_count": np.int64,
+    "spend_sum": np.float64,
+    "qty_sum": np.int64,
+    "order_time_sum": np.float64,  # seconds since epoch, summed over orders
+    "last_order_time": np.float64,
+    "points_sum": np.int64,
+    "points_orders": np.int64,
+    "booking_count": np.int64
+}
+
+
+def to_timestamp(value):
+    # Accepts datetimes, strings and the {"$date": ...} documents found in the Mongo dining_info export
+    if isinstance(value, dict) and "$date" in value:
+        value = value["$date"]
+    return pd.Timestamp(value).timestamp()
+
+
+class Vocabulary:
+    # Category name <-> count column; `order` ranks columns alphabetically so ties break like Series.mode()
+
+    def __init__(self, names=()):
+        self.names = []
+        self.ids = {}
+        self.order = np.zeros(0, dtype=np.int64)
+        for name in names:
+            self.id_for(name)
+
+    def id_for(self, name):
+        idx = self.ids.get(name)
+        if idx is None:
+            idx = len(self.names)
+            self.names.append(name)
+            self.ids[name] = idx
+            self.order = np.argsort(np.array(self.names, dtype=object), kind="stable")
+        return idx
+
+
+class GuestProfileStore:
+    # Compact, incrementally updated guest profiles in array-backed columns
+
+    def __init__(self, capacity=1024):
+        self.capacity = capacity
+        self.size = 0
+        self.rows = {}
+        self.customer_ids = np.zeros(capacity, dtype=np.int64)
+        self.counters = {name: np.zeros(capacity, dtype=dtype) for name, dtype in COUNTERS.items()}
+        self.dishes = Vocabulary()
+        self.cuisines = Vocabulary()
+        self.dish_counts = np.zeros((capacity, 16), dtype=np.int32)
+        self.cuisine_counts = np.zeros((capacity, 4), dtype=np.int32)
+        self.reference_time = None  # latest order seen; recency is measured from here like the notebook
+        self.watermark = None
+        self.id_watermark = None    # generation time (epoch seconds) of the newest Mongo _id applied
+        self.synced_ids = set()     # str(_id) applied within SYNC_LOOKBACK_SECONDS of id_watermark
+        self.last_sync = 0.0
+        self.updates = 0
+        self.lock = threading.Lock()
+
+    def grow(self):
+        self.capacity *= 2
+        self.customer_ids = np.resize(self.customer_ids, self.capacity)
+        for name, values in self.counters.items():
+            grown = np.zeros(self.capacity, dtype=values.dtype)
+            grown[:self.size] = values[:self.size]
+            self.counters[name] = grown
+        self.dish_counts = self.grow_rows(self.dish_counts)
+        self.cuisine_counts = self.grow_rows(self.cuisine_counts)
+
+    def grow_rows(self, counts):
+        grown = np.zeros((self.capacity, counts.shape[1]), dtype=counts.dtype)
+        grown[:self.size] = counts[:self.size]
+        return grown
+
+    def category_column(self, counts, vocabulary, name):
+        idx = vocabulary.id_for(name)
+        if idx >= counts.shape[1]:
+            wider = np.zeros((counts.shape[0], counts.shape[1] * 2), dtype=counts.dtype)
+            wider[:, :counts.shape[1]] = counts
+            counts = wider
+        return counts, idx
+
+    def row_for(self, customer_id):
+        customer_id = int(customer_id)
+        row = self.rows.get(customer_id)
+        if row is None:
+            if self.size == self.capacity:
+                self.grow()
+            row = self.size
+            self.size += 1
+            self.rows[customer_id] = row
+            self.customer_ids[row] = customer_id
+        return row
+
+    def record_transaction(self, customer_id, dish, cuisine, price, qty, order_time, booked_through_points=0):
+        order_ts = to_timestamp(order_time)
+        with self.lock:
+            row = self.row_for(customer_id)
+            c = self.counters
+            c["order_count"][row] += 1
+            c["spend_sum"][row] += float(price)
+            c["qty_sum"][row] += int(qty)
+            c["order_time_sum"][row] += order_ts
+            c["last_order_time"][row] = max(c["last_order_time"][row], order_ts)
+            c["points_sum"][row] += int(booked_through_points)
+            c["points_orders"][row] += int(booked_through_points) > 0
+
+            self.dish_counts, dish_idx = self.category_column(self.dish_counts, self.dishes, dish)
+            self.dish_counts[row, dish_idx] += 1
+            self.cuisine_counts, cuisine_idx = self.category_column(self.cuisine_counts, self.cuisines, cuisine)
+            self.cuisine_counts[row, cuisine_idx] += 1
+
+            if self.reference_time is None or order_ts > self.reference_time:
+                self.reference_time = order_ts
+            self.updates += 1
+
+    def record_transactions(self, transactions):
+        # DataFrame with the dining_info.xlsx columns
+        for t in transactions[["customer_id", "dish", "Preferred Cusine", "price_for_1", "Qty",
+                               "order_time", "booked_through_points"]].itertuples(index=False):
+            self.record_transaction(*t)
+        if len(transactions):
+            latest = pd.Timestamp(transactions["order_time"].max())
+            if self.watermark is None or latest > self.watermark:
+                self.watermark = latest
+
+    def record_booking(self, customer_id, booked_through_points=0):
+        # A booking creates the profile (so the guest is known) but adds no dining history
+        with self.lock:
+            row = self.row_for(customer_id)
+            self.counters["booking_count"][row] += 1
+            self.updates += 1
+
+    def modes(self, counts, vocabulary, rows):
+        if not vocabulary.names:
+            return np.full(len(rows), np.nan, dtype=object)
+        ordered = counts[rows][:, vocabulary.order]
+        names = np.array(vocabulary.names, dtype=object)[vocabulary.order]
+        return names[ordered.argmax(axis=1)]
+
+    def lookup_many(self, customer_ids):
+        # Column arrays for many customers; customers without dining history get NaN like the snapshots
+        with self.lock:
+            rows = np.array([self.rows.get(int(cid), -1) if not pd.isna(cid) else -1 for cid in customer_ids],
+                            dtype=np.int64)
+            c = self.counters
+            found = rows >= 0
+            safe = np.where(found, rows, 0)
+            orders = c["order_count"][safe]
+            known = found & (orders > 0)
+            n = np.where(known, orders, 1).astype(np.float64)
+            reference = self.reference_time or 0.0
+
+            numeric = {
+                "total_orders_per_customer": orders,
+                "avg_spend_per_customer": c["spend_sum"][safe] / n,
+                "total_qty_per_customer": c["qty_sum"][safe],
+                "unique_dishes_ordered": (self.dish_counts[safe] > 0).sum(axis=1),
+                "unique_cuisines_ordered": (self.cuisine_counts[safe] > 0).sum(axis=1),
+                "avg_days_between_orders": (reference - c["order_time_sum"][safe] / n) / DAY,
+                "last_order_days_ago": np.floor((reference - c["last_order_time"][safe]) / DAY),
+                "total_points_used": c["points_sum"][safe],
+                "discount_sensitive_orders": c["points_orders"][safe]
+            }
+            out = {name: np.where(known, values, np.nan).astype(np.float64) for name, values in numeric.items()}
+
+            favourite_dish = self.modes(self.dish_counts, self.dishes, safe)
+            favourite_cuisine = self.modes(self.cuisine_counts, self.cuisines, safe)
+            favourite_dish[~known] = np.nan
+            favourite_cuisine[~known] = np.nan
+            out["fav_dish_per_customer"] = favourite_dish
+            out["most_common_dish"] = favourite_dish.copy()
+            out["most_preferred_cuisine"] = favourite_cuisine
+            out["most_common_cuisine"] = favourite_cuisine.copy()
+            return out
+
+    def lookup(self, customer_id):
+        # Single guest: plain scalar reads, no array temporaries
+        with self.lock:
+            row = self.rows.get(int(customer_id), -1) if not pd.isna(customer_id) else -1
+            if row < 0 or self.counters["order_count"][row] == 0:
+                return {name: np.nan for name in PROFILE_COLUMNS}
+            c = self.counters
+            n = int(c["order_count"][row])
+            dish_row = self.dish_counts[row]
+            cuisine_row = self.cuisine_counts[row]
+            favourite_dish = self.modes(self.dish_counts, self.dishes, [row])[0]
+            favourite_cuisine = self.modes(self.cuisine_counts, self.cuisines, [row])[0]
+            return {
+                "total_orders_per_customer": float(n),
+                "avg_spend_per_customer": float(c["spend_sum"][row]) / n,
+                "total_qty_per_customer": float(c["qty_sum"][row]),
+                "fav_dish_per_customer": favourite_dish,
+                "most_preferred_cuisine": favourite_cuisine,
+                "unique_dishes_ordered": float(np.count_nonzero(dish_row)),
+                "unique_cuisines_ordered": float(np.count_nonzero(cuisine_row)),
+                "most_common_dish": favourite_dish,
+                "most_common_cuisine": favourite_cuisine,
+                "avg_days_between_orders": (self.reference_time - float(c["order_time_sum"][row]) / n) / DAY,
+                "last_order_days_ago": float(np.floor((self.reference_time - float(c["last_order_time"][row])) / DAY)),
+                "total_points_used": float(c["points_sum"][row]),
+                "discount_sensitive_orders": float(c["points_orders"][row])
+            }
+
+    def sync_from_mongo(self, collection):
+        # Apply dining documents inserted since the last sync. Tracked by _id (insertion order), not
+        # order_time, so late writes and orders sharing a timestamp are not missed. A store built from the
+        # xlsx has no _id yet: its first sync falls back to orders after the order_time watermark.
+        from bson import ObjectId
+        if self.id_watermark is not None:
+            since = datetime.fromtimestamp(self.id_watermark - SYNC_LOOKBACK_SECONDS, timezone.utc)
+            query = {"_id": {"$gte": ObjectId.from_datetime(since)}}
+        elif self.watermark is not None:
+            query = {"order_time": {"$gt": self.watermark.to_pydatetime()}}
+        else:
+            query = {}
+        documents = [d for d in collection.find(query) if str(d.get("_id")) not in self.synced_ids]
+        if not documents:
+            return 0
+        transactions = pd.DataFrame(documents)
+        transactions.columns = transactions.columns.str.strip()
+        transactions["order_time"] = transactions["order_time"].map(lambda v: pd.Timestamp(to_timestamp(v), unit="s"))
+        self.record_transactions(transactions)
+        generated = {str(d["_id"]): d["_id"].generation_time.timestamp()
+                     for d in documents if isinstance(d.get("_id"), ObjectId)}
+        if generated:
+            self.id_watermark = max(self.id_watermark or 0.0, max(generated.values()))
+            self.synced_ids.update(generated)
+            # Only ids inside the lookback window can be returned again
+            self.synced_ids = {i for i in self.synced_ids
+                               if ObjectId(i).generation_time.timestamp() >= self.id_watermark - SYNC_LOOKBACK_SECONDS}
+        return len(transactions)
+
+    def maybe_sync(self, collection, interval=60):
+        if time.monotonic() - self.last_sync >= interval:
+            self.last_sync = time.monotonic()
+            try:
+                return self.sync_from_mongo(collection)
+            except Exception:
+                # Mongo unavailable: keep serving the profiles we have
+                return 0
+        return 0
+
+    def memory_bytes(self):
+        arrays = [self.customer_ids, self.dish_counts, self.cuisine_counts, *self.counters.values()]
+        return sum(a.nbytes for a in arrays)
+
+    def memory_per_profile(self):
+        # Bytes of array storage per stored guest (excludes the id -> row dict)
+        used = self.size or 1
+        per_row = sum(a.itemsize * (a.shape[1] if a.ndim == 2 else 1)
+                      for a in [self.customer_ids, self.dish_counts, self.cuisine_counts, *self.counters.values()])
+        return per_row, self.memory_bytes() / used
+
+    def save(self, path=PROFILE_FILE):
+        with self.lock:
+            np.savez(
+                path,
+                customer_ids=self.customer_ids[:self.size],
+                dish_counts=self.dish_counts[:self.size],
+                cuisine_counts=self.cuisine_counts[:self.size],
+                dish_names=np.array(self.dishes.names, dtype=object),
+                cuisine_names=np.array(self.cuisines.names, dtype=object),
+                reference_time=np.array([np.nan if self.reference_time is None else self.reference_time]),
+                watermark=np.array([np.nan if self.watermark is None else self.watermark.timestamp()]),
+                id_watermark=np.array([np.nan if self.id_watermark is None else self.id_watermark]),
+                synced_ids=np.array(sorted(self.synced_ids), dtype=object),
+                **{name: values[:self.size] for name, values in self.counters.items()}
+            )
+
+    @classmethod
+    def load(cls, path=PROFILE_FILE):
+        data = np.load(path, allow_pickle=True)
+        size = len(data["customer_ids"])
+        store = cls(capacity=max(1024, size))
+        store.size = size
+        store.customer_ids[:size] = data["customer_ids"]
+        store.rows = {int(cid): i for i, cid in enumerate(data["customer_ids"])}
+        for name in COUNTERS:
+            store.counters[name][:size] = data[name]
+        store.dishes = Vocabulary(data["dish_names"].tolist())
+        store.cuisines = Vocabulary(data["cuisine_names"].tolist())
+        store.dish_counts = np.zeros((store.capacity, max(16, data["dish_counts"].shape[1])), dtype=np.int32)
+        store.dish_counts[:size, :data["dish_counts"].shape[1]] = data["dish_counts"]
+        store.cuisine_counts = np.zeros((store.capacity, max(4, data["cuisine_counts"].shape[1])), dtype=np.int32)
+        store.cuisine_counts[:size, :data["cuisine_counts"].shape[1]] = data["cuisine_counts"]
+        reference_time = float(data["reference_time"][0])
+        store.reference_time = None if np.isnan(reference_time) else reference_time
+        watermark = float(data["watermark"][0])
+        store.watermark = None if np.isnan(watermark) else pd.Timestamp(watermark, unit="s")
+        # Files saved before the _id watermark existed resume from order_time
+        if "id_watermark" in data:
+            id_watermark = float(data["id_watermark"][0])
+            store.id_watermark = None if np.isnan(id_watermark) else id_watermark
+            store.synced_ids = set(data["synced_ids"].tolist())
+        return store
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build the guest profile store from dining transactions")
+    parser.add_argument("--dining-file", default=os.path.join(BASE_DIR, "..", "ASSESSMENT - 01", "dining_info.xlsx"))
+    parser.add_argument("--before", help="only use orders before this date (e.g. 2024-01-01 to match the snapshots)")
+    parser.add_argument("--output", default=PROFILE_FILE)
+    parser.add_argument("--mongo-uri", help="update an existing profile file with new dining_info documents from Mongo")
+    args = parser.parse_args()
+
+    if args.mongo_uri and os.path.exists(args.output):
+        from pymongo import MongoClient
+        store = GuestProfileStore.load(args.output)
+        start = time.perf_counter()
+        count = store.sync_from_mongo(MongoClient(args.mongo_uri)["hotel_guests"]["dining_info"])
+        elapsed = time.perf_counter() - start
+    else:
+        transactions = read_table(args.dining_file)
+        transactions["order_time"] = pd.to_datetime(transactions["order_time"])
+        if args.before:
+            transactions = transactions[transactions["order_time"] < args.before]
+        transactions = transactions.sort_values("order_time")
+
+        store = GuestProfileStore()
+        start = time.perf_counter()
+        store.record_transactions(transactions)
+        elapsed = time.perf_counter() - start
+        count = len(transactions)
+    store.save(args.output)
+
+    per_row, per_profile = store.memory_per_profile()
+    print(f"{store.size} profiles, {count} transactions applied")
+    print(f"Update throughput: {count / max(elapsed, 1e-9):,.0f} transactions/s")
+    print(f"Memory: {per_row} bytes per profile row ({per_profile:.0f} bytes/profile including spare capacity)")
+    print(f"Saved to {args.output} at {datetime.now():%Y-%m-%d %H:%M:%S}")
+
+
+if __name__ == "__main__":
+    main()
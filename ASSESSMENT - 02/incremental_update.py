@@ -0,0 +1,203 @@
+import argparse
+import json
+import os
+import time
+import numpy as np
+import pandas as pd
+import xgboost as xgb
+from feature_store import get_feature_store
+from feature_transformer import FeatureTransformer
+from model_registry import ModelRegistry
+from model_bundle import BUNDLE_DIR, SERVING_PIPELINE, export_bundle
+from sparse_encoding import align_onehot_splits
+import repo_paths
+from data_access import read_table
+
+# Nightly update: continue boosting the deployed booster on dining transactions newer than the
+# bundle's `trained_through` watermark, instead of retraining on the whole history.
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+DINING_FILE = os.path.join(BASE_DIR, "..", "ASSESSMENT - 01", "dining_info.xlsx")
+
+# The shipped model was trained on the notebook's Jan - Oct 2024 split
+DEFAULT_WATERMARK = "2024-10-01"
+
+
+def load_new_transactions(since, dining_file=DINING_FILE, mongo_uri=None):
+    if mongo_uri:
+        from pymongo import MongoClient
+        collection = MongoClient(mongo_uri)["hotel_guests"]["dining_info"]
+        df = pd.DataFrame(list(collection.find({"order_time": {"$gt": since.to_pydatetime()}}, {"_id": 0})))
+    else:
+        df = read_table(dining_file)
+    if df.empty:
+        return df
+    df.columns = df.columns.str.strip()
+    df["order_time"] = pd.to_datetime(df["order_time"])
+    return df[df["order_time"] > since].sort_values("order_time").reset_index(drop=True)
+
+
+def extend_classes(booster, n_new, initial_margin=-3.0):
+    # Grow a multi-class booster by n_new classes. Existing margins are untouched; every boosting round gets
+    # one single-leaf tree per new class, the first one setting the new classes' margin to `initial_margin`
+    # so they start with a small probability that the continued boosting then learns from the data.
+    model = json.loads(booster.save_raw("json"))
+    learner = model["learner"]
+    params = learner["learner_model_param"]
+    old_classes = int(params["num_class"])
+    new_classes = old_classes + n_new
+    gbtree = learner["gradient_booster"]["model"]
+    trees = gbtree["trees"]
+    rounds = len(trees) // old_classes
+
+    def leaf(value):
+        return {"base_weights": [value], "categories": [], "categories_nodes": [], "categories_segments": [],
+                "categories_sizes": [], "default_left": [0], "id": 0, "left_children": [-1], "loss_changes": [0.0],
+                "parents": [2147483647], "right_children": [-1], "split_conditions": [value], "split_indices": [0],
+                "split_type": [0], "sum_hessian": [0.0],
+                "tree_param": {"num_deleted": "0", "num_feature": params["num_feature"], "num_nodes": "1",
+                               "size_leaf_vector": "1"}}
+
+    grown = []
+    for r in range(rounds):
+        grown.extend(trees[r * old_classes:(r + 1) * old_classes])
+        grown.extend(leaf(initial_margin if r == 0 else 0.0) for _ in range(n_new))
+    for i, tree in enumerate(grown):
+        tree["id"] = i
+    gbtree["trees"] = grown
+    gbtree["tree_info"] = list(range(new_classes)) * rounds
+    gbtree["iteration_indptr"] = [r * new_classes for r in range(rounds + 1)]
+    gbtree["gbtree_model_param"]["num_trees"] = str(len(grown))
+
+    base_score = params["base_score"].strip("[]").split(",")
+    if len(base_score) == old_classes:
+        params["base_score"] = "[" + ",".join(base_score + base_score[-1:] * n_new) + "]"
+    params["num_class"] = str(new_classes)
+    learner["objective"]["softmax_multiclass_param"]["num_class"] = str(new_classes)
+
+    extended = xgb.Booster()
+    extended.load_model(bytearray(json.dumps(model).encode()))
+    return extended
+
+
+def softmax_proba(booster, X):
+    margin = booster.inplace_predict(X, predict_type="margin")
+    margin = margin - margin.max(axis=1, keepdims=True)
+    probs = np.exp(margin)
+    return probs / probs.sum(axis=1, keepdims=True)
+
+
+def holdout_metrics(probs, y, n_classes):
+    # Previous model: classes it doesn't know get probability 0 (clipped in the log loss)
+    if probs.shape[1] < n_classes:
+        probs = np.hstack([probs, np.zeros((len(probs), n_classes - probs.shape[1]))])
+    picked = np.clip(probs[np.arange(len(y)), y], 1e-15, 1.0)
+    top3 = np.argsort(-probs, axis=1)[:, :3]
+    return {
+        "log_loss": float(-np.log(picked).mean()),
+        "accuracy": float((probs.argmax(axis=1) == y).mean()),
+        "top3_hit_rate": float((top3 == y[:, None]).any(axis=1).mean())
+    }
+
+
+def run_update(since=None, dining_file=DINING_FILE, mongo_uri=None, bundle_dir=BUNDLE_DIR, rounds=10,
+               learning_rate=0.05, max_depth=3, holdout_fraction=0.2, tolerance=0.0, accuracy_tolerance=0.01,
+               publish=True):
+    artifacts = ModelRegistry(bundle_dir=bundle_dir).get()
+    manifest = {}
+    if artifacts.source == "bundle":
+        with open(os.path.join(bundle_dir, "manifest.json")) as f:
+            manifest = json.load(f)
+    since = pd.Timestamp(since or manifest.get("trained_through") or DEFAULT_WATERMARK)
+
+    report = {"previous_version": artifacts.version, "since": str(since)}
+    transactions = load_new_transactions(since, dining_file, mongo_uri)
+    report["new_transactions"] = len(transactions)
+    if len(transactions) < 10:
+        report["status"] = "nothing to do"
+        return report
+
+    # Most recent rows are the holdout; only the older part is trained on (and the watermark stops there)
+    split = int(len(transactions) * (1 - holdout_fraction))
+    train, holdout = transactions.iloc[:split], transactions.iloc[split:]
+
+    # Dishes the model has never seen become new classes at the end of the class list
+    dish_names = [str(d) for d in artifacts.dish_names]
+    new_dishes = sorted(set(transactions["dish"].astype(str)) - set(dish_names))
+    classes = dish_names + new_dishes
+    class_index = {dish: i for i, dish in enumerate(classes)}
+    report["new_dishes"] = new_dishes
+
+    transformer = FeatureTransformer(artifacts, get_feature_store())
+    features = transformer.features
+    # CSR all the way into XGBoost: one-hot columns are never densified
+    X_train = transformer.transform_sparse(train.drop(columns=["dish"]))
+    y_train = train["dish"].astype(str).map(class_index).to_numpy()
+    X_holdout = transformer.transform_sparse(holdout.drop(columns=["dish"]))
+    y_holdout = holdout["dish"].astype(str).map(class_index).to_numpy()
+
+    previous = transformer.sparse_input_booster()
+    start_booster = extend_classes(previous, len(new_dishes)) if new_dishes else previous.copy()
+
+    start = time.perf_counter()
+    params = {"objective": "multi:softmax", "num_class": len(classes), "tree_method": "hist",
+              "eta": learning_rate, "max_depth": max_depth, "nthread": os.cpu_count() or 1}
+    dtrain = xgb.DMatrix(X_train, label=y_train, feature_names=features)
+    updated = xgb.train(params, dtrain, num_boost_round=rounds, xgb_model=start_booster)
+    # New trees learned "absent = 0" from the CSR input; align them so dense callers get the same answers
+    updated = align_onehot_splits(updated, transformer.onehot_targets, trained_sparse=True)
+    train_seconds = time.perf_counter() - start
+
+    before = holdout_metrics(softmax_proba(previous, X_holdout), y_holdout, len(classes))
+    after = holdout_metrics(softmax_proba(updated, X_holdout), y_holdout, len(classes))
+    report.update({
+        "train_rows": len(train), "holdout_rows": len(holdout), "rounds": rounds,
+        "train_seconds": train_seconds, "rows_per_second": len(train) / train_seconds,
+        "holdout_before": before, "holdout_after": after
+    })
+
+    regression = (after["log_loss"] > before["log_loss"] * (1 + tolerance)
+                  or after["accuracy"] < before["accuracy"] - accuracy_tolerance)
+    if regression:
+        report["status"] = "rejected: updated model is worse on the holdout"
+        return report
+    if not publish:
+        report["status"] = "passed (dry run, not published)"
+        return report
+
+    label_names = np.array(classes, dtype=object)
+    label_encoder = type(artifacts.label_encoder)()
+    label_encoder.classes_ = label_names  # index order = booster output order (new dishes appended)
+    trained_through = train["order_time"].max()
+    new_manifest = export_bundle(updated, artifacts.encoder, label_encoder, features, bundle_dir, extra={
+        "trained_through": trained_through.isoformat(),
+        "previous_version": artifacts.version,
+        "update": {k: report[k] for k in ("train_rows", "rounds", "train_seconds", "holdout_before", "holdout_after")}
+    }, pipeline=SERVING_PIPELINE)
+    report["status"] = f"published {new_manifest['version']}"
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Continue boosting the deployed dish model on new transactions")
+    parser.add_argument("--since", help="override the bundle's trained_through watermark")
+    parser.add_argument("--dining-file", default=DINING_FILE)
+    parser.add_argument("--mongo-uri", help="read new transactions from hotel_guests.dining_info instead")
+    parser.add_argument("--bundle-dir", default=BUNDLE_DIR)
+    parser.add_argument("--rounds", type=int, default=10)
+    parser.add_argument("--learning-rate", type=float, default=0.05)
+    parser.add_argument("--max-depth", type=int, default=3)
+    parser.add_argument("--holdout-fraction", type=float, default=0.2)
+    parser.add_argument("--tolerance", type=float, default=0.0, help="allowed relative holdout log loss increase")
+    parser.add_argument("--accuracy-tolerance", type=float, default=0.01, help="allowed holdout accuracy drop")
+    parser.add_argument("--dry-run", action="store_true", help="train and compare but do not publish")
+    args = parser.parse_args()
+
+    report = run_update(args.since, args.dining_file, args.mongo_uri, args.bundle_dir, args.rounds,
+                        args.learning_rate, args.max_depth, args.holdout_fraction, args.tolerance,
+                        args.accuracy_tolerance, publish=not args.dry_run)
+    print(json.dumps(report, indent=2, default=str))
+
+
+if __name__ == "__main__":
+    main()
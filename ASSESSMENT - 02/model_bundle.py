@@ -0,0 +1,200 @@
+import argparse
+import hashlib
+import json
+import os
+import sys
+import time
+from datetime import datetime
+import numpy as np
+import pandas as pd
+import xgboost as xgb
+from sklearn.preprocessing import OneHotEncoder, LabelEncoder
+
+# Single versioned model bundle replacing the four loose artifacts:
+#   model_bundle/booster.ubj     XGBoost native binary booster
+#   model_bundle/manifest.json   encoder categories, dish classes, ordered feature names, checksums
+# The manifest is written last, so a bundle is only visible once both files are complete.
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+BUNDLE_DIR = os.path.join(BASE_DIR, "model_bundle")
+BOOSTER_FILE = "booster.ubj"
+MANIFEST_FILE = "manifest.json"
+BUNDLE_FORMAT = 1
+# Feature pipeline the app serves (feature store + FeatureTransformer). Bundles record the pipeline their
+# feature list comes from, and the app only loads bundles built for its own.
+SERVING_PIPELINE = "booking_features"
+
+
+def bundle_paths(bundle_dir=BUNDLE_DIR):
+    return {"manifest": os.path.join(bundle_dir, MANIFEST_FILE), "booster": os.path.join(bundle_dir, BOOSTER_FILE)}
+
+
+def json_category(value):
+    # NaN (the encoder's missing-value category) is stored as null
+    if isinstance(value, float) and np.isnan(value):
+        return None
+    return value.item() if isinstance(value, np.generic) else value
+
+
+def atomic_write(path, data):
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(data)
+    os.replace(tmp, path)
+
+
+def export_bundle(model, encoder, label_encoder, features, bundle_dir=BUNDLE_DIR, extra=None, pipeline=None):
+    # `model` is an XGBClassifier or a bare Booster; `extra` adds fields (e.g. training watermark) to the manifest;
+    # `pipeline` names the feature pipeline that produced `features` (SERVING_PIPELINE for bundles the app serves)
+    booster = model.get_booster() if hasattr(model, "get_booster") else model
+    raw = bytes(booster.save_raw("ubj"))
+    features = [str(f) for f in features]
+    objective = getattr(model, "objective", None) or json.loads(booster.save_config())["learner"]["objective"]["name"]
+    manifest = {
+        "format": BUNDLE_FORMAT,
+        "created_at": datetime.now().isoformat(timespec="seconds"),
+        "xgboost_version": xgb.__version__,
+        "objective": objective,
+        "pipeline": pipeline,
+        "best_iteration": getattr(model, "best_iteration", None),
+        "num_boosted_rounds": booster.num_boosted_rounds(),
+        "features": features,
+        "dish_classes": [json_category(c) for c in label_encoder.classes_],
+        "encoder": {
+            "columns": [str(c) for c in encoder.feature_names_in_],
+            "categories": [[json_category(v) for v in categories] for categories in encoder.categories_],
+            "handle_unknown": encoder.handle_unknown
+        },
+        "booster_sha256": hashlib.sha256(raw).hexdigest(),
+        "booster_bytes": len(raw)
+    }
+    manifest.update(extra or {})
+    # Version = content hash, so re-exporting the same model gives the same version
+    manifest["version"] = hashlib.sha256(
+        json.dumps({k: v for k, v in manifest.items() if k != "created_at"}, sort_keys=True).encode()
+    ).hexdigest()[:12]
+
+    os.makedirs(bundle_dir, exist_ok=True)
+    paths = bundle_paths(bundle_dir)
+    atomic_write(paths["booster"], raw)
+    atomic_write(paths["manifest"], json.dumps(manifest, indent=2).encode())
+    return manifest
+
+
+def build_encoder(spec):
+    # Refit a OneHotEncoder on its own categories: same columns and output order, no unpickling
+    categories = [[np.nan if v is None else v for v in values] for values in spec["categories"]]
+    encoder = OneHotEncoder(categories=[np.array(c, dtype=object) for c in categories],
+                            handle_unknown=spec["handle_unknown"], sparse_output=False)
+    sample = pd.DataFrame({col: [values[0]] for col, values in zip(spec["columns"], categories)})
+    return encoder.fit(sample)
+
+
+def validate_bundle(manifest, model, encoder, label_encoder):
+    # Refuse to serve a bundle whose parts disagree
+    features = manifest["features"]
+    booster = model.get_booster()
+    if booster.num_features() != len(features):
+        raise ValueError(f"Booster expects {booster.num_features()} features, manifest lists {len(features)}")
+    if booster.feature_names is not None and list(booster.feature_names) != features:
+        raise ValueError("Booster feature names do not match the manifest feature order")
+    if model.n_classes_ != len(label_encoder.classes_):
+        raise ValueError(f"Booster predicts {model.n_classes_} classes, manifest has {len(label_encoder.classes_)}")
+    missing = set(encoder.get_feature_names_out()) - set(features)
+    if missing:
+        raise ValueError(f"Encoder columns missing from the feature list: {sorted(missing)[:5]}")
+
+
+def load_bundle(bundle_dir=BUNDLE_DIR, pipeline=SERVING_PIPELINE):
+    # Returns model, encoder, label encoder, feature list and manifest; raises on any mismatch, including a
+    # bundle whose features come from another pipeline (e.g. the notebook's raw dining columns)
+    paths = bundle_paths(bundle_dir)
+    with open(paths["manifest"]) as f:
+        manifest = json.load(f)
+    if manifest.get("format") != BUNDLE_FORMAT:
+        raise ValueError(f"Unsupported bundle format {manifest.get('format')}")
+    if pipeline is not None and manifest.get("pipeline") != pipeline:
+        raise ValueError(f"Bundle features come from the {manifest.get('pipeline')!r} pipeline, expected {pipeline!r}")
+    with open(paths["booster"], "rb") as f:
+        raw = f.read()
+    if hashlib.sha256(raw).hexdigest() != manifest["booster_sha256"]:
+        raise ValueError("Booster file does not match the manifest checksum")
+
+    model = xgb.XGBClassifier()
+    model.load_model(bytearray(raw))
+    encoder = build_encoder(manifest["encoder"])
+    label_encoder = LabelEncoder()
+    label_encoder.classes_ = np.array(manifest["dish_classes"], dtype=object)
+    validate_bundle(manifest, model, encoder, label_encoder)
+    return model, encoder, label_encoder, list(manifest["features"]), manifest
+
+
+def bundle_from_pickles(base_dir=BASE_DIR, bundle_dir=BUNDLE_DIR):
+    # One-off conversion of the current xgb_model_dining.pkl / encoder.pkl / label_encoder.pkl / features.xlsx
+    import joblib
+    from model_registry import ARTIFACT_FILES
+    import repo_paths
+    from data_access import read_table
+    paths = {name: os.path.join(base_dir, file_name) for name, file_name in ARTIFACT_FILES.items()}
+    model = joblib.load(paths["model"])
+    encoder = joblib.load(paths["encoder"])
+    label_encoder = joblib.load(paths["label_encoder"])
+    features = list(read_table(paths["features"])[0])
+    return export_bundle(model, encoder, label_encoder, features, bundle_dir, pipeline=SERVING_PIPELINE)
+
+
+def benchmark(base_dir=BASE_DIR, bundle_dir=BUNDLE_DIR):
+    # Cold start (fresh interpreter) and size: pickle set vs bundle
+    import subprocess
+    from model_registry import ARTIFACT_FILES
+    pickle_script = (
+        "import time, warnings; warnings.simplefilter('ignore'); start = time.perf_counter(); import joblib, pandas as pd;"
+        "joblib.load('xgb_model_dining.pkl'); joblib.load('encoder.pkl'); joblib.load('label_encoder.pkl');"
+        "list(pd.read_excel('features.xlsx')[0]); print(time.perf_counter() - start)")
+    bundle_script = (
+        "import time, warnings; warnings.simplefilter('ignore'); start = time.perf_counter(); import model_bundle;"
+        f"model_bundle.load_bundle({bundle_dir!r}); print(time.perf_counter() - start)")
+    results = {}
+    for name, script in (("pickle set", pickle_script), ("bundle", bundle_script)):
+        runs = [float(subprocess.run([sys.executable, "-c", script], cwd=base_dir, capture_output=True, text=True,
+                                     check=True).stdout.strip().splitlines()[-1]) for _ in range(3)]
+        results[name] = sorted(runs)[1]
+
+    # Load time once the libraries are imported (what a hot swap pays)
+    import joblib
+    start = time.perf_counter()
+    for file_name in list(ARTIFACT_FILES.values())[:3]:
+        joblib.load(os.path.join(base_dir, file_name))
+    pd.read_excel(os.path.join(base_dir, ARTIFACT_FILES["features"]))
+    pickle_warm = time.perf_counter() - start
+    start = time.perf_counter()
+    load_bundle(bundle_dir)
+    bundle_warm = time.perf_counter() - start
+
+    pickle_size = sum(os.path.getsize(os.path.join(base_dir, f)) for f in ARTIFACT_FILES.values())
+    bundle_size = sum(os.path.getsize(p) for p in bundle_paths(bundle_dir).values())
+    print(f"{'':<12}{'cold start':>12}{'load (imports done)':>22}{'size':>12}")
+    print(f"{'pickle set':<12}{results['pickle set'] * 1000:>10.0f}ms{pickle_warm * 1000:>20.1f}ms{pickle_size / 1024:>10.0f}KB")
+    print(f"{'bundle':<12}{results['bundle'] * 1000:>10.0f}ms{bundle_warm * 1000:>20.1f}ms{bundle_size / 1024:>10.0f}KB")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build or benchmark the model bundle")
+    parser.add_argument("--from-pickles", action="store_true", help="convert the current pickle set into a bundle")
+    parser.add_argument("--benchmark", action="store_true", help="compare cold start and size with the pickle set")
+    parser.add_argument("--bundle-dir", default=BUNDLE_DIR)
+    args = parser.parse_args()
+
+    if args.from_pickles:
+        manifest = bundle_from_pickles(bundle_dir=args.bundle_dir)
+        print(f"Wrote bundle version {manifest['version']} to {args.bundle_dir}")
+    if args.benchmark:
+        benchmark(bundle_dir=args.bundle_dir)
+    if not (args.from_pickles or args.benchmark):
+        model, encoder, label_encoder, features, manifest = load_bundle(args.bundle_dir)
+        print(f"Bundle {manifest['version']} OK: {len(features)} features, {len(label_encoder.classes_)} dishes, "
+              f"{manifest['num_boosted_rounds']} rounds")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,193 @@
+import os
+import hashlib
+import threading
+import time
+import joblib
+import numpy as np
+import pandas as pd
+
+import repo_paths
+from data_access import read_table
+from model_bundle import BUNDLE_DIR, bundle_paths, load_bundle
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Legacy artifacts written by Predict_Fav_Dish.ipynb; used only when there is no model bundle
+ARTIFACT_FILES = {
+    "model": "xgb_model_dining.pkl",
+    "encoder": "encoder.pkl",
+    "label_encoder": "label_encoder.pkl",
+    "features": "features.xlsx"
+}
+
+
+class ModelArtifacts:
+    # One consistent set of model, encoders and expected feature list
+
+    def __init__(self, model, encoder, label_encoder, expected_features, version, file_stamps, load_seconds,
+                 source="pickle"):
+        self.model = model
+        self.encoder = encoder
+        self.label_encoder = label_encoder
+        self.expected_features = expected_features
+        self.dish_names = label_encoder.classes_
+        self.version = version
+        self.file_stamps = file_stamps
+        self.load_seconds = load_seconds
+        self.loaded_at = time.time()
+        self.warmup_seconds = None
+        self.source = source
+
+
+def file_stamp(path):
+    stat = os.stat(path)
+    return (stat.st_mtime_ns, stat.st_size)
+
+
+def artifact_version(paths):
+    # Short content hash of all four files, so the same artifacts always report the same version
+    digest = hashlib.sha1()
+    for name in sorted(paths):
+        with open(paths[name], "rb") as f:
+            for chunk in iter(lambda: f.read(1 << 20), b""):
+                digest.update(chunk)
+    return digest.hexdigest()[:12]
+
+
+def validate_artifacts(artifacts):
+    # Catch a half-copied artifact set (e.g. new model next to the old encoder) before it is served
+    encoded_columns = set(artifacts.encoder.get_feature_names_out())
+    missing = encoded_columns - set(artifacts.expected_features)
+    if missing:
+        raise ValueError(f"Encoder columns missing from features.xlsx: {sorted(missing)[:5]}")
+
+    n_features = getattr(artifacts.model, "n_features_in_", None)
+    if n_features is not None and n_features != len(artifacts.expected_features):
+        raise ValueError(f"Model expects {n_features} features, features.xlsx lists {len(artifacts.expected_features)}")
+
+    n_classes = getattr(artifacts.model, "n_classes_", None)
+    if n_classes is not None and n_classes != len(artifacts.dish_names):
+        raise ValueError(f"Model predicts {n_classes} classes, label encoder has {len(artifacts.dish_names)}")
+
+
+def warm_up(artifacts):
+    # One dummy prediction so the first guest doesn't pay for lazy booster setup
+    start = time.perf_counter()
+    dummy = pd.DataFrame(np.zeros((1, len(artifacts.expected_features))), columns=artifacts.expected_features)
+    artifacts.model.predict_proba(dummy)
+    artifacts.warmup_seconds = time.perf_counter() - start
+
+
+class ModelRegistry:
+    # Loads the dish predictor once per process and hot swaps it when new artifacts land on disk
+
+    def __init__(self, files=None, base_dir=BASE_DIR, check_interval=5.0, bundle_dir=BUNDLE_DIR):
+        self.files = dict(files or ARTIFACT_FILES)
+        self.base_dir = base_dir
+        self.bundle_dir = bundle_dir
+        self.check_interval = check_interval
+        self.last_check = 0.0
+        self.last_error = None
+        # Stamps of the last artifact set that failed to load; retried only once the files change again
+        self.failed_stamps = None
+        self.reload_count = 0
+        self.lock = threading.Lock()
+        self.current = self.load()
+        self.last_check = time.monotonic()
+
+    def paths(self):
+        # The bundle wins as soon as its manifest exists
+        if self.bundle_dir and os.path.exists(bundle_paths(self.bundle_dir)["manifest"]):
+            return bundle_paths(self.bundle_dir)
+        return {
+            name: file_name if os.path.isabs(file_name) else os.path.join(self.base_dir, file_name)
+            for name, file_name in self.files.items()
+        }
+
+    def load(self):
+        paths = self.paths()
+        start = time.perf_counter()
+        stamps = {name: file_stamp(path) for name, path in paths.items()}
+
+        if "manifest" in paths:
+            # Native booster + manifest, checksummed and validated by load_bundle
+            model, encoder, label_encoder, expected_features, manifest = load_bundle(self.bundle_dir)
+            version = manifest["version"]
+            source = "bundle"
+        else:
+            model = joblib.load(paths["model"])
+            encoder = joblib.load(paths["encoder"])
+            label_encoder = joblib.load(paths["label_encoder"])
+            expected_features = list(read_table(paths["features"])[0])
+            version = artifact_version(paths)
+            source = "pickle"
+
+        # Files changed while we were reading them: let the next check pick up the finished set
+        if stamps != {name: file_stamp(path) for name, path in paths.items()}:
+            raise ValueError("Model artifacts changed while loading")
+
+        artifacts = ModelArtifacts(model, encoder, label_encoder, expected_features, version, stamps,
+                                   time.perf_counter() - start, source)
+        validate_artifacts(artifacts)
+        warm_up(artifacts)
+        return artifacts
+
+    def disk_stamps(self):
+        try:
+            return {name: file_stamp(path) for name, path in self.paths().items()}
+        except OSError:
+            return None
+
+    def changed_on_disk(self):
+        stamps = self.disk_stamps()
+        return stamps is not None and stamps != self.current.file_stamps and stamps != self.failed_stamps
+
+    def reload(self):
+        with self.lock:
+            stamps = self.disk_stamps()
+            try:
+                artifacts = self.load()
+            except Exception as e:
+                # Keep serving the current model if the new set is incomplete or broken
+                self.last_error = str(e)
+                self.failed_stamps = stamps
+                return False
+            # A single reference swap, so readers always get all four artifacts from the same set
+            self.current = artifacts
+            self.last_error = None
+            self.failed_stamps = None
+            self.reload_count += 1
+            return True
+
+    def get(self):
+        now = time.monotonic()
+        if now - self.last_check >= self.check_interval:
+            self.last_check = now
+            if self.changed_on_disk():
+                self.reload()
+        return self.current
+
+    def status(self):
+        artifacts = self.current
+        return {
+            "version": artifacts.version,
+            "source": artifacts.source,
+            "loaded_at": artifacts.loaded_at,
+            "load_seconds": artifacts.load_seconds,
+            "warmup_seconds": artifacts.warmup_seconds,
+            "reload_count": self.reload_count,
+            "last_error": self.last_error
+        }
+
+
+_registry = None
+_registry_lock = threading.Lock()
+
+
+def get_model_registry():
+    global _registry
+    if _registry is None:
+        with _registry_lock:
+            if _registry is None:
+                _registry = ModelRegistry()
+    return _registry
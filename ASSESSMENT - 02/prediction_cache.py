@@ -0,0 +1,167 @@
+import threading
+import time
+from collections import OrderedDict
+from datetime import date, timedelta
+import numpy as np
+import pandas as pd
+from feature_transformer import get_transformer
+
+# Booking form limits for guests without a customer_id
+AGE_RANGE = range(18, 121)
+CUISINES = ["South Indian", "North Indian", "Multi"]
+STAYERS = range(1, 4)
+POINTS = (0, 1)
+MAX_STAY_DAYS = 30
+PRECOMPUTE_BATCH = 20000
+DATE_FEATURES = ['check_in_day', 'check_out_day', 'check_in_month', 'check_out_month']
+
+
+def row_key(row):
+    # Encoded feature row -> hashable key (NaN for unknown customers is normalized to one bit pattern)
+    return np.nan_to_num(np.asarray(row, dtype=np.float64), nan=np.inf).tobytes()
+
+
+class PredictionCache:
+    # Bounded LRU + TTL cache of predict_proba rows, keyed on the final encoded feature row
+
+    def __init__(self, max_size=50000, ttl_seconds=3600, precompute=False):
+        self.max_size = max_size
+        self.precompute = precompute
+        self.ttl = ttl_seconds
+        self.entries = OrderedDict()
+        self.pinned = {}
+        self.pinned_generation = None
+        self.generation = None
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self.lock = threading.Lock()
+
+    def check_generation(self, generation):
+        # Drop everything when the model or the feature tables change
+        with self.lock:
+            if generation == self.generation:
+                return False
+            if self.generation is not None:
+                self.invalidations += 1
+            self.entries.clear()
+            self.pinned.clear()
+            self.pinned_generation = None
+            self.generation = generation
+            return True
+
+    def get(self, key):
+        with self.lock:
+            probs = self.pinned.get(key)
+            if probs is not None:
+                self.hits += 1
+                return probs
+            entry = self.entries.get(key)
+            if entry is not None:
+                probs, stored_at = entry
+                if time.monotonic() - stored_at <= self.ttl:
+                    self.entries.move_to_end(key)
+                    self.hits += 1
+                    return probs
+                del self.entries[key]
+            self.misses += 1
+            return None
+
+    def put(self, key, probs):
+        with self.lock:
+            self.entries[key] = (probs, time.monotonic())
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+
+    def pin(self, keys, probs, generation):
+        # Precomputed entries don't expire and don't count against max_size. A batch scored by an older
+        # model/feature generation is refused (False), and pins left from one are dropped.
+        with self.lock:
+            if self.generation is None:
+                self.generation = generation
+            if generation != self.generation:
+                return False
+            if self.pinned_generation != generation:
+                self.pinned.clear()
+                self.pinned_generation = generation
+            self.pinned.update(zip(keys, probs))
+            return True
+
+    def predict_proba(self, X, artifacts, feature_store, predict=None):
+        # Serve cached rows, score only the misses in one predict call
+        if self.check_generation(cache_generation(feature_store, artifacts)) and self.precompute:
+            # Refill the new-guest table for the new model/features in the background
+            threading.Thread(target=precompute_new_guests, args=(self, feature_store, artifacts), daemon=True).start()
+        predict = predict or artifacts.model.predict_proba
+        keys = [row_key(row) for row in X]
+        y_pred_prob = np.empty((len(keys), len(artifacts.dish_names)))
+        missing = []
+        for i, key in enumerate(keys):
+            probs = self.get(key)
+            if probs is None:
+                missing.append(i)
+            else:
+                y_pred_prob[i] = probs
+
+        if missing:
+            y_pred_prob[missing] = predict(X[missing])
+            for i in missing:
+                self.put(keys[i], y_pred_prob[i].copy())
+        return y_pred_prob
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / total if total else 0.0,
+            'entries': len(self.entries),
+            'pinned': len(self.pinned),
+            'invalidations': self.invalidations
+        }
+
+
+def cache_generation(feature_store, artifacts):
+    return (artifacts.version, feature_store.version)
+
+
+def new_guest_bookings(expected_features, max_stay_days=MAX_STAY_DAYS):
+    # Every form input combination for a guest without history
+    if any(col in expected_features for col in DATE_FEATURES):
+        # The model uses weekday/month: one check-in date per (weekday, month)
+        start = date(2025, 1, 1)
+        first_per_slot = {}
+        for offset in range(365):
+            day = start + timedelta(days=offset)
+            first_per_slot.setdefault((day.month, day.weekday()), day)
+        check_ins = list(first_per_slot.values())
+    else:
+        check_ins = [date(2025, 1, 1)]
+
+    index = pd.MultiIndex.from_product(
+        [AGE_RANGE, CUISINES, STAYERS, POINTS, check_ins, range(max_stay_days + 1)],
+        names=['age', 'Preferred Cusine', 'number_of_stayers', 'booked_through_points', 'check_in_date', 'days'])
+    bookings = index.to_frame(index=False)
+    bookings['check_in_date'] = pd.to_datetime(bookings['check_in_date'])
+    bookings['check_out_date'] = bookings['check_in_date'] + pd.to_timedelta(bookings.pop('days'), unit='D')
+    bookings['customer_id'] = np.nan
+    return bookings
+
+
+def precompute_new_guests(cache, feature_store, artifacts, max_stay_days=MAX_STAY_DAYS, batch_size=PRECOMPUTE_BATCH):
+    # Materialize predictions for every unknown-customer combination ahead of time; stops as soon as a
+    # newer model/feature generation is active. Returns the number of rows pinned.
+    generation = cache_generation(feature_store, artifacts)
+    transformer = get_transformer(artifacts, feature_store)
+    X = transformer.transform(new_guest_bookings(artifacts.expected_features, max_stay_days))
+    X = np.unique(X, axis=0)
+    pinned = 0
+    for start in range(0, len(X), batch_size):
+        if cache.generation not in (None, generation):
+            break
+        batch = X[start:start + batch_size]
+        if not cache.pin([row_key(row) for row in batch], transformer.predict_proba(batch), generation):
+            break
+        pinned += len(batch)
+    return pinned
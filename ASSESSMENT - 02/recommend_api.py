@@ -0,0 +1,170 @@
+import asyncio
+import os
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from datetime import date
+from typing import Optional
+import numpy as np
+from fastapi import FastAPI
+from pydantic import BaseModel, Field
+from feature_store import get_feature_store
+from model_registry import get_model_registry
+from recommender import recommend
+from prediction_cache import PredictionCache
+
+# Requests arriving within MAX_WAIT_MS of each other share one predict_proba call
+MAX_WAIT_MS = 5
+MAX_BATCH_SIZE = 256
+
+
+class BookingRequest(BaseModel):
+    customer_id: Optional[int] = None
+    age: int = Field(ge=18, le=120)
+    preferred_cuisine: str = Field(alias="Preferred Cusine")
+    check_in_date: date
+    check_out_date: date
+    number_of_stayers: int = Field(ge=1, le=3)
+    booked_through_points: int = Field(ge=0, le=1)
+
+    model_config = {"populate_by_name": True}
+
+    def to_booking(self):
+        return {
+            'customer_id': self.customer_id,
+            'Preferred Cusine': self.preferred_cuisine,
+            'age': self.age,
+            'check_in_date': self.check_in_date,
+            'check_out_date': self.check_out_date,
+            'booked_through_points': self.booked_through_points,
+            'number_of_stayers': self.number_of_stayers
+        }
+
+
+class MicroBatcher:
+    # Collects concurrent requests for a few milliseconds and scores them as one stacked matrix
+
+    def __init__(self, feature_store, model_registry, cache=None, max_wait_ms=MAX_WAIT_MS,
+                 max_batch_size=MAX_BATCH_SIZE, k=3):
+        self.feature_store = feature_store
+        self.model_registry = model_registry
+        self.cache = cache
+        self.max_wait = max_wait_ms / 1000
+        self.max_batch_size = max_batch_size
+        self.k = k
+        self.queue = asyncio.Queue()
+        self.worker = None
+        self.batch_sizes = deque(maxlen=1000)
+        self.queue_waits = deque(maxlen=1000)
+        self.requests = 0
+        self.batches = 0
+
+    def start(self):
+        self.worker = asyncio.create_task(self.run())
+
+    async def stop(self):
+        if self.worker:
+            self.worker.cancel()
+            try:
+                await self.worker
+            except asyncio.CancelledError:
+                pass
+
+    async def submit(self, booking):
+        future = asyncio.get_running_loop().create_future()
+        await self.queue.put((booking, time.perf_counter(), future))
+        return await future
+
+    async def collect(self):
+        # Block for the first request, then take whatever else arrives inside the window
+        batch = [await self.queue.get()]
+        deadline = time.perf_counter() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            timeout = deadline - time.perf_counter()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self.queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    def score(self, bookings):
+        artifacts = self.model_registry.get()
+        dishes, scores = recommend(bookings, self.feature_store, artifacts, self.k, cache=self.cache)
+        return dishes, scores, artifacts.version
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = await self.collect()
+            started = time.perf_counter()
+            bookings = [booking for booking, _, _ in batch]
+            try:
+                # Model call runs off the event loop so new requests keep queueing meanwhile
+                dishes, scores, version = await loop.run_in_executor(None, self.score, bookings)
+            except Exception as e:
+                for _, _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+
+            self.requests += len(batch)
+            self.batches += 1
+            self.batch_sizes.append(len(batch))
+            for i, (_, queued_at, future) in enumerate(batch):
+                queue_wait = started - queued_at
+                self.queue_waits.append(queue_wait)
+                if not future.done():
+                    future.set_result({
+                        'recommended_dishes': [str(d) for d in dishes[i]],
+                        'scores': [float(s) for s in scores[i]],
+                        'model_version': version,
+                        'batch_size': len(batch),
+                        'queue_wait_ms': queue_wait * 1000
+                    })
+
+    def stats(self):
+        waits_ms = np.array(self.queue_waits) * 1000
+        sizes = np.array(self.batch_sizes)
+        return {
+            'requests': self.requests,
+            'batches': self.batches,
+            'queue_depth': self.queue.qsize(),
+            'mean_batch_size': float(sizes.mean()) if len(sizes) else 0.0,
+            'max_batch_size': int(sizes.max()) if len(sizes) else 0,
+            'queue_wait_ms_p50': float(np.percentile(waits_ms, 50)) if len(waits_ms) else 0.0,
+            'queue_wait_ms_p95': float(np.percentile(waits_ms, 95)) if len(waits_ms) else 0.0
+        }
+
+
+@asynccontextmanager
+async def lifespan(app):
+    app.state.model_registry = get_model_registry()
+    # PRECOMPUTE_NEW_GUESTS=1 fills the cache with every new-guest combination at startup
+    app.state.cache = PredictionCache(precompute=os.environ.get("PRECOMPUTE_NEW_GUESTS") == "1")
+    app.state.batcher = MicroBatcher(get_feature_store(), app.state.model_registry, app.state.cache)
+    app.state.batcher.start()
+    yield
+    await app.state.batcher.stop()
+
+
+app = FastAPI(title="Dish Recommendation Service", lifespan=lifespan)
+
+
+@app.post("/recommend")
+async def recommend_dishes(request: BookingRequest):
+    result = await app.state.batcher.submit(request.to_booking())
+    return {'customer_id': request.customer_id, **result}
+
+
+@app.get("/stats")
+async def stats():
+    return {
+        'batcher': app.state.batcher.stats(),
+        'cache': app.state.cache.stats(),
+        'model': app.state.model_registry.status()
+    }
+
+
+# Run with: uvicorn recommend_api:app --port 8000
@@ -0,0 +1,60 @@
+import numpy as np
+import pandas as pd
+from feature_transformer import get_transformer
+
+
+def prepare_bookings(bookings_df):
+    # Date features used by the booking form, computed for all bookings at once
+    df = bookings_df.copy()
+    df['check_in_date'] = pd.to_datetime(df['check_in_date'])
+    df['check_out_date'] = pd.to_datetime(df['check_out_date'])
+    df['check_in_day'] = df['check_in_date'].dt.dayofweek
+    df['check_out_day'] = df['check_out_date'].dt.dayofweek
+    df['check_in_month'] = df['check_in_date'].dt.month
+    df['check_out_month'] = df['check_out_date'].dt.month
+    df['stay_duration'] = (df['check_out_date'] - df['check_in_date']).dt.days
+    return df
+
+
+def build_feature_matrix(bookings_df, feature_store, artifacts):
+    # Bookings (already passed through prepare_bookings) -> model input in `features.xlsx` column order.
+    # DataFrame reference version of feature_transformer.FeatureTransformer, kept for checks and benchmarks
+    df = bookings_df.reset_index(drop=True)
+    df = pd.concat([df, feature_store.features_for_frame(df)], axis=1)
+
+    # Ensure categorical columns exist before encoding
+    categorical_cols = list(artifacts.encoder.feature_names_in_)
+    for col in categorical_cols:
+        if col not in df.columns:
+            df[col] = "Unknown"
+
+    # One-hot encode all rows in one call
+    encoded = artifacts.encoder.transform(df[categorical_cols])
+    encoded_df = pd.DataFrame(encoded, columns=artifacts.encoder.get_feature_names_out())
+
+    # Numeric columns (booking fields + aggregates) next to the encoded ones, then align to the model
+    numeric_df = df.drop(columns=categorical_cols).select_dtypes(include="number")
+    features = pd.concat([numeric_df, encoded_df], axis=1)
+    features = features.loc[:, ~features.columns.duplicated()]
+    return features.reindex(columns=artifacts.expected_features, fill_value=0)
+
+
+def top_k_dishes(y_pred_prob, dish_names, k=3):
+    # Partial sort: only the k best classes per row are ordered
+    k = min(k, y_pred_prob.shape[1])
+    top_k = np.argpartition(-y_pred_prob, k - 1, axis=1)[:, :k]
+    top_k_prob = np.take_along_axis(y_pred_prob, top_k, axis=1)
+    order = np.argsort(-top_k_prob, axis=1)
+    top_k = np.take_along_axis(top_k, order, axis=1)
+    return dish_names[top_k], np.take_along_axis(top_k_prob, order, axis=1)
+
+
+def recommend(bookings, feature_store, artifacts, k=3, cache=None):
+    # Bookings (DataFrame, dict or list of dicts) -> top-k dish names and probabilities
+    transformer = get_transformer(artifacts, feature_store)
+    X = transformer.transform(bookings)
+    if cache is None:
+        y_pred_prob = transformer.predict_proba(X)
+    else:
+        y_pred_prob = cache.predict_proba(X, artifacts, feature_store, transformer.predict_proba)
+    return top_k_dishes(y_pred_prob, artifacts.dish_names, k)
@@ -0,0 +1,11 @@
+import os
+import sys
+
+# Path setup for this folder's modules and notebooks: the repository root (shared data_access.py).
+# Import it before importing from those places.
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SHARED_DIRS = [ROOT_DIR]
+
+for path in SHARED_DIRS:
+    if path not in sys.path:
+        sys.path.append(path)
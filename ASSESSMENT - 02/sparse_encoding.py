@@ -0,0 +1,177 @@
+import argparse
+import json
+import os
+import time
+import tracemalloc
+import numpy as np
+import pandas as pd
+import scipy.sparse as sp
+import xgboost as xgb
+from sklearn.preprocessing import OneHotEncoder
+
+# Sparse (CSR) path for the one-hot features. XGBoost treats entries that are absent from a CSR matrix
+# as missing, not as 0. A tree trained on dense input sends 0 by its split threshold and missing by an
+# arbitrary default direction; a tree trained on CSR input never sees a stored 0 and sends "0" (missing)
+# by the learned default. `align_onehot_splits` rewrites every one-hot split to the same form,
+# value < 0.5 -> left with missing -> left, so dense and CSR input take the same path whichever way
+# the tree was trained. Numeric columns are stored explicitly (zeros included) and are only missing
+# when they are NaN.
+
+
+def align_onehot_splits(booster, onehot_features, trained_sparse=False):
+    # Copy of the booster where 0 and missing take the same branch on the given (one-hot) feature indices.
+    # trained_sparse says what "0" meant when the trees were grown: the default direction (CSR input)
+    # or the threshold (dense input). Trees that are already aligned are unchanged either way.
+    onehot_features = set(int(i) for i in onehot_features)
+    model = json.loads(booster.save_raw("json"))
+    for tree in model["learner"]["gradient_booster"]["model"]["trees"]:
+        left, right = tree["left_children"], tree["right_children"]
+        conditions, default_left = tree["split_conditions"], tree["default_left"]
+        for node, feature in enumerate(tree["split_indices"]):
+            if left[node] == -1 or feature not in onehot_features:
+                continue
+            # XGBoost goes left when value < split_condition
+            one_left = 1.0 < conditions[node]
+            zero_left = bool(default_left[node]) if trained_sparse else 0.0 < conditions[node]
+            if one_left == zero_left:
+                # Degenerate split (both values on one side): just make missing follow 0
+                default_left[node] = int(zero_left)
+                continue
+            if one_left:
+                left[node], right[node] = right[node], left[node]
+            conditions[node] = 0.5
+            default_left[node] = 1
+    aligned = xgb.Booster()
+    aligned.load_model(bytearray(json.dumps(model).encode()))
+    return aligned
+
+
+def csr_from_parts(n_rows, n_features, numeric, numeric_targets, hit_rows, hit_cols):
+    # numeric: (n_rows, len(numeric_targets)) block, NaN = missing (left out of the matrix);
+    # hit_rows / hit_cols: positions of the one-hot 1s
+    present = ~np.isnan(numeric)
+    rows = np.concatenate([np.nonzero(present)[0], hit_rows])
+    cols = np.concatenate([np.asarray(numeric_targets)[np.nonzero(present)[1]], hit_cols])
+    data = np.concatenate([numeric[present], np.ones(len(hit_rows), dtype=np.float32)])
+    matrix = sp.csr_matrix((data.astype(np.float32), (rows, cols)), shape=(n_rows, n_features))
+    matrix.sort_indices()
+    return matrix
+
+
+def encode_sparse(encoder, df, categorical_cols):
+    # Training-side equivalent of the notebook's dense concat: numeric columns first, then the one-hot block.
+    # The encoder must be built with sparse_output=True.
+    numeric = df.drop(columns=categorical_cols).to_numpy(dtype=np.float32)
+    present = ~np.isnan(numeric)
+    rows, cols = np.nonzero(present)
+    numeric_block = sp.csr_matrix((numeric[present], (rows, cols)), shape=numeric.shape)
+    onehot = encoder.transform(df[categorical_cols]).astype(np.float32)
+    return sp.hstack([numeric_block, onehot], format="csr")
+
+
+def csr_nbytes(matrix):
+    return matrix.data.nbytes + matrix.indices.nbytes + matrix.indptr.nbytes
+
+
+def synthetic_bookings(n_rows, cardinalities, n_numeric=8, n_classes=15, seed=0):
+    # Skewed categories (a few popular values, a long tail) and a label that depends on them
+    rng = np.random.default_rng(seed)
+    df = pd.DataFrame({f"num_{i}": rng.normal(size=n_rows).astype(np.float32) for i in range(n_numeric)})
+    score = np.zeros(n_rows)
+    for i, cardinality in enumerate(cardinalities):
+        codes = np.minimum(rng.zipf(1.3, size=n_rows) - 1, cardinality - 1)
+        df[f"cat_{i}"] = np.array([f"c{i}_{code}" for code in range(cardinality)], dtype=object)[codes]
+        score += codes % n_classes
+    labels = ((score + df["num_0"].to_numpy() * 3).astype(np.int64)) % n_classes
+    return df, labels
+
+
+def measure(label, encode, labels, rounds, threads):
+    tracemalloc.start()
+    start = time.perf_counter()
+    X = encode()
+    encode_seconds = time.perf_counter() - start
+    encode_peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    params = {"objective": "multi:softmax", "num_class": int(labels.max()) + 1, "tree_method": "hist",
+              "max_depth": 3, "eta": 0.1, "nthread": threads}
+    start = time.perf_counter()
+    booster = xgb.train(params, xgb.DMatrix(X, label=labels), num_boost_round=rounds)
+    train_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    booster.inplace_predict(X, predict_type="margin")
+    predict_seconds = time.perf_counter() - start
+    return {
+        "input": label,
+        "matrix_mb": (csr_nbytes(X) if sp.issparse(X) else X.nbytes) / 2 ** 20,
+        "encode_peak_mb": encode_peak / 2 ** 20,
+        "encode_ms": encode_seconds * 1000,
+        "train_s": train_seconds,
+        "predict_ms": predict_seconds * 1000,
+        "rows_per_s": len(labels) / predict_seconds
+    }
+
+
+def benchmark(cardinalities, multipliers=(1, 10, 100), n_rows=10000, rounds=20, threads=None):
+    threads = threads or os.cpu_count() or 1
+    results = []
+    for multiplier in multipliers:
+        scaled = [max(1, c * multiplier) for c in cardinalities]
+        df, labels = synthetic_bookings(n_rows, scaled)
+        categorical_cols = [c for c in df.columns if c.startswith("cat_")]
+        numeric_cols = [c for c in df.columns if c not in categorical_cols]
+        dense_encoder = OneHotEncoder(handle_unknown="ignore", sparse_output=False).fit(df[categorical_cols])
+        sparse_encoder = OneHotEncoder(handle_unknown="ignore", sparse_output=True).fit(df[categorical_cols])
+
+        def encode_dense():
+            onehot = dense_encoder.transform(df[categorical_cols]).astype(np.float32)
+            return np.hstack([df[numeric_cols].to_numpy(dtype=np.float32), onehot])
+
+        for label, encode in (("dense", encode_dense),
+                              ("csr", lambda: encode_sparse(sparse_encoder, df, categorical_cols))):
+            result = measure(label, encode, labels, rounds, threads)
+            result.update({"cardinality": f"{multiplier}x", "onehot_columns": sum(scaled)})
+            results.append(result)
+    return pd.DataFrame(results)
+
+
+def check_transformer(n_rows=2000):
+    # Serving check: transform_sparse + the rewritten booster give the dense path's probabilities
+    from model_registry import get_model_registry
+    from feature_store import get_feature_store
+    from feature_transformer import FeatureTransformer
+    from benchmark_transformer import random_bookings
+    transformer = FeatureTransformer(get_model_registry().get(), get_feature_store())
+    bookings = random_bookings(n_rows)
+    dense = transformer.predict_proba(transformer.transform(bookings))
+    sparse = transformer.predict_proba(transformer.transform_sparse(bookings))
+    return float(np.abs(dense - sparse).max())
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Dense vs CSR one-hot encoding: memory and throughput")
+    parser.add_argument("--rows", type=int, default=10000)
+    parser.add_argument("--multipliers", type=int, nargs="+", default=[1, 10, 100],
+                        help="category cardinality relative to the deployed encoder")
+    parser.add_argument("--rounds", type=int, default=20)
+    parser.add_argument("--skip-check", action="store_true", help="skip the deployed-model equivalence check")
+    args = parser.parse_args()
+
+    from model_bundle import BUNDLE_DIR, MANIFEST_FILE
+    with open(os.path.join(BUNDLE_DIR, MANIFEST_FILE)) as f:
+        cardinalities = [len(c) for c in json.load(f)["encoder"]["categories"]]
+    print(f"Deployed encoder: {len(cardinalities)} categorical columns, {sum(cardinalities)} one-hot columns")
+
+    board = benchmark(cardinalities, args.multipliers, args.rows, args.rounds)
+    columns = ["cardinality", "onehot_columns", "input", "matrix_mb", "encode_peak_mb", "encode_ms", "train_s",
+               "predict_ms", "rows_per_s"]
+    print(board[columns].to_string(index=False, float_format=lambda v: f"{v:.2f}"))
+
+    if not args.skip_check:
+        print(f"Deployed model, dense vs CSR input: max probability difference {check_transformer():.2e}")
+
+
+if __name__ == "__main__":
+    main()
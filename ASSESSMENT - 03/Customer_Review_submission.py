@@ -1,38 +1,49 @@
 import streamlit as st
-import pandas as pd
 import datetime
 import random
 import os
+import queue
 import numpy as np
-from pinecone import Pinecone
 from together import Together
 from langchain_together import TogetherEmbeddings
 from textblob import TextBlob
-import smtplib
-from email.mime.text import MIMEText
+
+from review_store import ReviewStore
+from review_ingestion import IngestionPipeline
+from embedding_cache import CachedEmbeddings
+from vector_index import open_index
+from sentiment_scores import record_sentiment
+from answer_cache import AnswerCache
 
 # ✅ Set API Keys
 TOGETHER_API_KEY = ""
 PINECONE_API_KEY = ""
 PINECONE_HOST = ""
 
-# ✅ Initialize Pinecone
-pc = Pinecone(api_key=PINECONE_API_KEY)
-index = pc.Index(host=PINECONE_HOST)
+# ✅ Initialize Pinecone (or the local index with VECTOR_BACKEND=local)
+index = open_index(host=PINECONE_HOST, api_key=PINECONE_API_KEY)
 
 # ✅ Set Together API Key
 os.environ["TOGETHER_API_KEY"] = TOGETHER_API_KEY
-embeddings = TogetherEmbeddings(model="togethercomputer/m2-bert-80M-8k-retrieval")
+embeddings = CachedEmbeddings(TogetherEmbeddings(model="togethercomputer/m2-bert-80M-8k-retrieval"))
+
+# ✅ Append-only review log (imports reviews_data.xlsx on first use; export with `python review_store.py --export`)
+@st.cache_resource
+def load_review_store():
+    return ReviewStore()
+
+review_store = load_review_store()
 
-# ✅ Define the Excel file
-file_name = "reviews_data.xlsx"
+# ✅ Background embedding + Pinecone upserts (batched, retried); submitting only enqueues
+@st.cache_resource
+def load_ingestion_pipeline():
+    # Newly indexed reviews drop the manager's cached answers they would change; reviews given up on
+    # are recorded in the review log for `reindex_reviews.py --mode backlog`
+    return IngestionPipeline(embeddings, index, on_indexed=AnswerCache().invalidate_for_reviews,
+                             on_failed=lambda reviews: review_store.mark_unindexed(
+                                 [review["seq"] for review in reviews], "failed")).start()
 
-# ✅ Load dataset or create if not exists
-if os.path.exists(file_name):
-    df = pd.read_excel(file_name)
-else:
-    df = pd.DataFrame(columns=["review_id", "customer_id", "review_date", "Review", "Rating", "review_date_numeric"])
-    
+ingestion = load_ingestion_pipeline()
 
 
 # ✅ Function to generate a random 4-digit ID
@@ -44,32 +55,6 @@ def get_sentiment(review_text):
     analysis = TextBlob(review_text)
     return analysis.sentiment.polarity
 
-# ✅ Function to send email
-import smtplib
-from email.mime.text import MIMEText
-from email.mime.multipart import MIMEMultipart
-
-def send_email(room_number, review_text, sentiment_score):
-    sender_email = ""
-    receiver_email = ""
-    password = ""
-
-    subject = "Negative Review Alert 🚨"
-    body = f"Room Number: {room_number}\nReview: {review_text}\nSentiment Score: {sentiment_score}"
-
-    message = MIMEMultipart()
-    message["From"] = sender_email
-    message["To"] = receiver_email
-    message["Subject"] = subject
-    message.attach(MIMEText(body, "plain"))
-
-    # Connect to Gmail SMTP server
-    with smtplib.SMTP('smtp.gmail.com', 587) as server:
-        server.starttls()
-        server.login(sender_email, password)
-        server.sendmail(sender_email, receiver_email, message.as_string())
-
-
 # ✅ Streamlit UI
 st.set_page_config(page_title="Hotel Reviews", page_icon="⭐", layout="centered")
 st.title("📢 Customer Review Submission")
@@ -82,8 +67,7 @@ room_number = st.text_input("🏨 Room Number (if staying):", "")
 
 if st.button("✅ Submit Review", use_container_width=True):
     if review_text.strip():
-        # ✅ Generate new review ID & customer ID
-        new_review_id = generate_id()
+        # ✅ Generate customer ID (the review ID is assigned by the review store)
         customer_id = generate_id()
 
         # ✅ Get current timestamp and convert it to numeric format
@@ -93,25 +77,22 @@ if st.button("✅ Submit Review", use_container_width=True):
         # ✅ Analyze sentiment
         sentiment_score = get_sentiment(review_text)
 
-        # ✅ Prepare new entry
-        new_entry = pd.DataFrame([[new_review_id, customer_id, timestamp, review_text, rating, numeric_timestamp]],
-                                 columns=df.columns)
-
-        # ✅ Append to dataset & save
-        df = pd.concat([df, new_entry], ignore_index=True)
-        df.to_excel(file_name, index=False)
-
-        # ✅ Generate Embeddings using Together AI
-        review_embedding = embeddings.embed_query(review_text)
+        # ✅ Append to the review log (one atomic insert, concurrent sessions are safe)
+        new_review = review_store.append(customer_id, review_text, rating, timestamp, numeric_timestamp,
+                                         room_number=room_number.strip())
+        new_review_id = new_review["review_id"]
+        record_sentiment(review_store, new_review, sentiment_score)
 
-        # ✅ Store review in Pinecone
-        index.upsert(
-            vectors=[(str(new_review_id), review_embedding, {"review_id": new_review_id, "customer_id": customer_id, "rating": rating})]
-        )
+        # ✅ Queue the review for embedding (Together AI) and indexing (Pinecone) in the background
+        try:
+            ingestion.submit(new_review)
+            indexing_queued = True
+        except queue.Full:
+            review_store.mark_unindexed([new_review["seq"]], "rejected")
+            indexing_queued = False
 
-        # ✅ Send email if negative sentiment and customer is staying
-        if sentiment_score < 0 and room_number:
-            send_email(room_number, review_text, sentiment_score)
+        # ✅ Negative reviews from staying guests are emailed to the manager by the alert monitor
+        #    (`python review_alerts.py`), which tails the review log and sends one digest per room
 
         # 🎉 Display Success Message with Review Details
         st.success("✅ Review submitted successfully!")
@@ -127,10 +108,15 @@ if st.button("✅ Submit Review", use_container_width=True):
         st.markdown("---")
         st.markdown("### 📂 Data Storage Confirmation")
         st.success("✅ Your review has been successfully stored in our dataset!")
-        st.info("📌 It is saved in `reviews_data.xlsx`.")
+        st.info("📌 It is saved in the review log (`reviews.db`, exported to `reviews_data.xlsx` on demand).")
 
         st.markdown("### 🔗 Vector Database Confirmation")
-        st.success("✅ Your review embedding has been successfully stored in Pinecone!")
-        st.info("📌 It is indexed under the ID: " + str(new_review_id))
+        if indexing_queued:
+            st.success("✅ Your review is queued for indexing in Pinecone!")
+            st.info("📌 It will be indexed under the ID: " + str(new_review_id) +
+                    f" (current indexing lag ~{ingestion.stats()['lag_p50']:.1f}s)")
+        else:
+            st.warning("⚠️ Indexing is busy; your review is saved and flagged in the review log for the next "
+                       "backlog re-index (`reindex_reviews.py --mode backlog`).")
     else:
         st.error("❌ Please enter a review before submitting!")
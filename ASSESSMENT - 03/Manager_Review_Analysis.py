@@ -1,14 +1,19 @@
 import streamlit as st
-import pandas as pd
 import os
 import matplotlib.pyplot as plt
 import seaborn as sns
 from wordcloud import WordCloud
-from pinecone import Pinecone
 from langchain_together import TogetherEmbeddings
-from together import Together
 from io import BytesIO
 import re
+import time
+
+from review_store import ReviewStore
+from embedding_cache import CachedEmbeddings
+from vector_index import open_index
+from answer_cache import AnswerCache
+from llm_calls import LLMRunner, CHAT_MODEL
+from context_packer import BUDGET_TOKENS, answer as packed_answer
 
 # ✅ Set Streamlit Page Config at the Start
 st.set_page_config(layout="wide")
@@ -17,35 +22,42 @@ st.set_page_config(layout="wide")
 if not os.getenv("TOGETHER_API_KEY"):
     os.environ["TOGETHER_API_KEY"] = ""
 
-# ✅ Initialize Pinecone
-pc = Pinecone(api_key="")
-index = pc.Index(host="")
+# ✅ Initialize Pinecone (or the local index with VECTOR_BACKEND=local)
+index = open_index(host="", api_key="")
 
-# ✅ Load Data
-@st.cache_data
+# ✅ Load Data (from the review log, refreshed every minute so new submissions show up)
+@st.cache_data(ttl=60)
 def load_data():
-    return pd.read_excel("reviews_data.xlsx")
+    return ReviewStore().read_frame()
 
 df = load_data()
 
+# ✅ One embeddings client per app process; repeated queries are served from the embedding cache
+@st.cache_resource
+def load_embeddings():
+    return CachedEmbeddings(TogetherEmbeddings(model="togethercomputer/m2-bert-80M-8k-retrieval"))
+
+embeddings = load_embeddings()
+
+# ✅ Answers to earlier, similar queries over the same matched reviews (shared answer_cache.db)
+@st.cache_resource
+def load_answer_cache():
+    return AnswerCache()
+
+answer_cache = load_answer_cache()
+
+
+# ✅ One async Together client per app process: summary and word-cloud calls run concurrently, summary streamed
+#    (TOGETHER_BASE_URL points it at a local OpenAI-compatible server, e.g. local_services.LocalChatServer)
+@st.cache_resource
+def load_llm():
+    return LLMRunner()
 
-# ✅ Function to Generate Query-Based Word Cloud from Together API Response
-def generate_wordcloud_from_api(filtered_reviews, query):
-    if filtered_reviews.empty:
-        st.sidebar.warning("⚠️ No relevant reviews found for this query!")
-        return
-
-    concatenated_reviews = " ".join(filtered_reviews["Review"].tolist())
-    client = Together()
-    response = client.chat.completions.create(
-        model="meta-llama/Llama-Vision-Free",
-        messages=[{
-            "role": "user",
-            "content": f"Extract the most frequent and relevant words from these reviews based on the query: '{query}'. Here are the reviews: {concatenated_reviews}. Return only a comma-separated list of words."
-        }]
-    )
-    
-    frequent_words = response.choices[0].message.content.strip()
+llm = load_llm()
+
+
+# ✅ Function to Show the Word Cloud in the Sidebar
+def show_wordcloud(frequent_words):
     if frequent_words:
         wordcloud = WordCloud(width=300, height=200, background_color="white").generate(frequent_words)
         st.sidebar.subheader("🌟 Frequent Words Used in Reviews")
@@ -60,15 +72,16 @@ st.markdown("💡 **Analyze customer feedback, track sentiments, and generate ke
 # ✅ Manager's Query Input
 st.subheader("🎙️ Ask Anything About Customer Reviews")
 query = st.text_input("e.g., 'What do customers say about our breakfast service?'")
+# Prompts stay within the context packer's token budget, so large result sets are safe (map-reduce summary)
+top_k = st.select_slider("Matching reviews to analyze", options=[10, 25, 50, 100, 200], value=10)
 
 if st.button("🔎 Get Insights"):
     if query:
-        embeddings = TogetherEmbeddings(model="togethercomputer/m2-bert-80M-8k-retrieval")
         query_embedding = embeddings.embed_query(query)
 
         results = index.query(
             vector=query_embedding,
-            top_k=10,  
+            top_k=top_k,
             include_metadata=True
         )
 
@@ -79,28 +92,43 @@ if st.button("🔎 Get Insights"):
             req_df = df[df["review_id"].isin(matched_ids)]
 
             if not req_df.empty:
-                concatenated_reviews = " ".join(req_df["Review"].tolist())
-
-                # ✅ Generate Answer using Together AI
-                client = Together()
-                response = client.chat.completions.create(
-                    model="meta-llama/Llama-Vision-Free",
-                    messages=[{
-                        "role": "user",
-                        "content": f"Based on these customer reviews, answer this manager's query: {query}. Here are the relevant reviews: {concatenated_reviews}. Provide a concise and professional summary that is elaborated."
-                    }]
-                )
-                
-                answer = response.choices[0].message.content
+                variant = f"{CHAT_MODEL}:{top_k}:{BUDGET_TOKENS}"
+                cached = answer_cache.get(query_embedding, matched_ids, variant)
                 st.subheader("💡 Insightful Summary")
-                st.write(answer)
-                
+                if cached:
+                    answer, frequent_words = cached["answer"], cached["words"]
+                    st.write(answer)
+                    st.caption(f"⚡ Answered from the cache (asked before as \"{cached['query']}\", same matching reviews); "
+                               f"{cached['llm_seconds']:.1f}s of LLM time saved")
+                else:
+                    start = time.perf_counter()
+                    scores = {int(match["metadata"]["review_id"]): match["score"] for match in matches}
+
+                    # ✅ Generate Answer and Word-Cloud Words using Together AI: best-matching reviews packed into
+                    #    the token budget (map-reduce over chunks for large result sets), answer streamed
+                    tokens, done = packed_answer(llm, query, req_df["Review"].tolist(),
+                                                 req_df["review_id"].map(scores).fillna(0.0).tolist())
+                    st.write_stream(tokens)
+                    result = done.result()
+                    answer, frequent_words, report = result["summary"], result["words"], result["report"]
+                    st.caption(f"⏱️ {report['reviews_used']} of {report['reviews_in']} reviews used "
+                               f"({report['duplicates']} near-duplicates, {report['dropped']} over budget) · "
+                               f"{report['mode'].replace('_', '-')}, {report['llm_calls']} LLM calls, "
+                               f"~{report['prompt_tokens']} prompt tokens · first token {report['first_token_seconds']:.1f}s, "
+                               f"complete {report['total_seconds']:.1f}s")
+                    answer_cache.put(query, query_embedding, matched_ids, answer, frequent_words,
+                                     time.perf_counter() - start, min(match["score"] for match in matches), variant)
+
                 output = BytesIO()
                 output.write(answer.encode())
                 st.download_button("📥 Download Report", data=output, file_name="review_analysis.txt", mime="text/plain")
-                
-                # ✅ Generate Query-Based Word Cloud in Sidebar
-                generate_wordcloud_from_api(req_df, query)
+
+                # ✅ Show Query-Based Word Cloud in Sidebar
+                show_wordcloud(frequent_words)
+
+                cache_stats = answer_cache.stats()
+                st.sidebar.caption(f"Answer cache: {cache_stats['hit_rate']:.0%} hit rate, "
+                                   f"{cache_stats['llm_seconds_saved']:.0f}s of LLM time saved")
             else:
                 st.warning("⚠️ No matching reviews found for this query.")
         else:
@@ -0,0 +1,252 @@
+import argparse
+import json
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+from contextlib import closing
+import numpy as np
+
+# Semantic answer cache for Manager_Review_Analysis.py. An entry stores a manager query's embedding,
+# the review_ids the index matched for it, and the generated summary and word-cloud words. A new query
+# is answered from an entry when their embeddings are within SIMILARITY_THRESHOLD (cosine) and the index
+# still matches exactly the same review_ids, so an answer is never served for a different set of reviews.
+# Newly indexed reviews that would rank among an entry's matches delete it (invalidate_for_reviews).
+# Entries live in SQLite (answer_cache.db), shared by the manager and submission apps.
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+DB_FILE = os.path.join(BASE_DIR, "answer_cache.db")
+SIMILARITY_THRESHOLD = 0.95
+MAX_ENTRIES = 1000
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS answers (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    variant TEXT NOT NULL,
+    query TEXT NOT NULL,
+    embedding BLOB NOT NULL,
+    review_ids TEXT NOT NULL,
+    min_score REAL NOT NULL,
+    answer TEXT NOT NULL,
+    words TEXT NOT NULL,
+    llm_seconds REAL NOT NULL,
+    created_at REAL NOT NULL,
+    last_hit_at REAL,
+    hits INTEGER NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS counters (
+    name TEXT PRIMARY KEY,
+    value REAL NOT NULL
+);
+"""
+
+
+def unit(vector):
+    vector = np.asarray(vector, dtype=np.float32)
+    return vector / max(float(np.linalg.norm(vector)), 1e-12)
+
+
+def id_set(review_ids):
+    return json.dumps(sorted({int(i) for i in review_ids}))
+
+
+class AnswerCache:
+
+    def __init__(self, db_path=DB_FILE, threshold=SIMILARITY_THRESHOLD, max_entries=MAX_ENTRIES):
+        self.db_path = db_path
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.lock = threading.Lock()
+        with closing(self.connect()) as conn:
+            conn.executescript(SCHEMA)
+        # Embedding matrix of the entries, reloaded when another process has changed the table
+        self.version = None
+        self.entry_ids = np.zeros(0, dtype=np.int64)
+        self.variants = []
+        self.matrix = np.zeros((0, 0), dtype=np.float32)
+
+    def connect(self):
+        conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    def count(self, conn, name, amount=1):
+        conn.execute("INSERT INTO counters (name, value) VALUES (?, ?) "
+                     "ON CONFLICT (name) DO UPDATE SET value = value + excluded.value", (name, amount))
+
+    def load(self, conn):
+        # Inserts and deletes bump the max id / row count; cheap check before re-reading embeddings
+        version = conn.execute("SELECT COUNT(*), COALESCE(MAX(id), 0) FROM answers").fetchone()
+        if version == self.version:
+            return
+        rows = conn.execute("SELECT id, variant, embedding FROM answers").fetchall()
+        self.entry_ids = np.array([row[0] for row in rows], dtype=np.int64)
+        self.variants = [row[1] for row in rows]
+        self.matrix = (np.stack([np.frombuffer(row[2], dtype=np.float32) for row in rows])
+                       if rows else np.zeros((0, 0), dtype=np.float32))
+        self.version = version
+
+    def get(self, query_vector, review_ids, variant=""):
+        # Cached {"answer", "words", ...} for a similar query over the same reviews, else None
+        query_vector = unit(query_vector)
+        wanted = id_set(review_ids)
+        with self.lock, closing(self.connect()) as conn:
+            self.load(conn)
+            if len(self.entry_ids):
+                scores = self.matrix @ query_vector
+                scores[[v != variant for v in self.variants]] = -1.0
+                for i in np.argsort(-scores):
+                    if scores[i] < self.threshold:
+                        break
+                    row = conn.execute("SELECT query, review_ids, answer, words, llm_seconds FROM answers "
+                                       "WHERE id = ?", (int(self.entry_ids[i]),)).fetchone()
+                    if row is None or row[1] != wanted:
+                        # Similar query, but the index now matches other reviews
+                        self.count(conn, "stale")
+                        continue
+                    conn.execute("UPDATE answers SET hits = hits + 1, last_hit_at = ? WHERE id = ?",
+                                 (time.time(), int(self.entry_ids[i])))
+                    self.count(conn, "hits")
+                    self.count(conn, "llm_seconds_saved", row[4])
+                    return {"query": row[0], "similarity": float(scores[i]), "answer": row[2],
+                            "words": row[3], "llm_seconds": row[4]}
+            self.count(conn, "misses")
+            return None
+
+    def put(self, query, query_vector, review_ids, answer, words, llm_seconds, min_score, variant=""):
+        # Replaces entries for near-identical queries in the same variant (their answers are older)
+        query_vector = unit(query_vector)
+        with self.lock, closing(self.connect()) as conn:
+            self.load(conn)
+            conn.execute("BEGIN IMMEDIATE")
+            if len(self.entry_ids):
+                scores = self.matrix @ query_vector
+                same = [int(self.entry_ids[i]) for i in np.flatnonzero(scores >= self.threshold)
+                        if self.variants[i] == variant]
+                conn.executemany("DELETE FROM answers WHERE id = ?", [(i,) for i in same])
+            conn.execute(
+                "INSERT INTO answers (variant, query, embedding, review_ids, min_score, answer, words, llm_seconds, "
+                "created_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (variant, query, query_vector.tobytes(), id_set(review_ids), float(min_score), answer, words,
+                 float(llm_seconds), time.time()))
+            # Least recently used entries beyond max_entries
+            conn.execute("DELETE FROM answers WHERE id NOT IN (SELECT id FROM answers "
+                         "ORDER BY COALESCE(last_hit_at, created_at) DESC LIMIT ?)", (self.max_entries,))
+            conn.execute("COMMIT")
+
+    def invalidate_for_reviews(self, vectors):
+        # A new review whose similarity to an entry's query reaches the entry's weakest match would now
+        # be among its results: drop the entry. Returns the number of entries dropped.
+        if not len(vectors):
+            return 0
+        vectors = np.stack([unit(v) for v in vectors])
+        with self.lock, closing(self.connect()) as conn:
+            self.load(conn)
+            if not len(self.entry_ids):
+                return 0
+            min_scores = dict(conn.execute("SELECT id, min_score FROM answers").fetchall())
+            best = (self.matrix @ vectors.T).max(axis=1)
+            stale = [int(entry_id) for entry_id, score in zip(self.entry_ids, best)
+                     if score >= min_scores.get(int(entry_id), np.inf)]
+            if stale:
+                conn.executemany("DELETE FROM answers WHERE id = ?", [(i,) for i in stale])
+                self.count(conn, "invalidated", len(stale))
+            return len(stale)
+
+    def clear(self):
+        with self.lock, closing(self.connect()) as conn:
+            conn.execute("DELETE FROM answers")
+
+    def stats(self):
+        with closing(self.connect()) as conn:
+            counters = dict(conn.execute("SELECT name, value FROM counters").fetchall())
+            entries = conn.execute("SELECT COUNT(*) FROM answers").fetchone()[0]
+        hits, misses = int(counters.get("hits", 0)), int(counters.get("misses", 0))
+        return {
+            "entries": entries,
+            "hits": hits,
+            "misses": misses,
+            "hit_rate": hits / (hits + misses) if hits + misses else 0.0,
+            "invalidated": int(counters.get("invalidated", 0)),
+            "stale": int(counters.get("stale", 0)),
+            "llm_seconds_saved": counters.get("llm_seconds_saved", 0.0)
+        }
+
+
+def benchmark(reviews_file, rounds=20, llm_seconds=3.0, new_reviews_per_round=5):
+    # Manager workload: the same few questions (some reworded) asked over and over while new reviews
+    # arrive, against the local stand-in embeddings and an in-memory index; the LLM is not called,
+    # each miss is charged llm_seconds
+    import random
+    from local_services import LocalEmbeddings, LocalIndex
+    from review_ingestion import review_metadata
+    import repo_paths
+    from data_access import read_table
+    reviews = read_table(reviews_file).to_dict("records")
+    questions = ["What do customers say about breakfast?", "What do customers say about the breakfast?",
+                 "Is the room clean?", "Is the room clean", "How is the staff?", "How friendly is the staff?",
+                 "How is the location?", "Is the hotel quiet at night?"]
+    embeddings, index = LocalEmbeddings(), LocalIndex()
+    rng = random.Random(0)
+    history = reviews
+    # Short new reviews, some of them about the topics being asked about
+    phrases = ["The breakfast was cold", "Staff were very friendly", "The room was not clean", "Great location",
+               "Noisy at night", "Lovely pool", "Parking was expensive", "Beds were comfortable"]
+    next_id = max(int(r["review_id"]) for r in reviews) + 1
+    arriving = [{"review_id": next_id + i, "customer_id": 1, "review_date_numeric": 20250101, "Rating": 5,
+                 "Review": rng.choice(phrases)} for i in range(rounds * new_reviews_per_round)]
+    for i in range(0, len(history), 500):
+        batch = history[i:i + 500]
+        vectors = embeddings.embed_documents([str(r["Review"]) for r in batch])
+        index.upsert([(str(r["review_id"]), v, review_metadata(r)) for r, v in zip(batch, vectors)])
+
+    with tempfile.TemporaryDirectory() as tmp:
+        cache = AnswerCache(os.path.join(tmp, "answers.db"))
+        charged = 0.0
+        lookup_ms = []
+        for round_number in range(rounds):
+            for question in rng.sample(questions, len(questions)):
+                vector = embeddings.embed_query(question)
+                matches = index.query(vector=vector, top_k=10, include_metadata=True)["matches"]
+                ids = [int(m["metadata"]["review_id"]) for m in matches]
+                start = time.perf_counter()
+                cached = cache.get(vector, ids)
+                lookup_ms.append((time.perf_counter() - start) * 1000)
+                if cached is None:
+                    charged += llm_seconds
+                    cache.put(question, vector, ids, "answer", "words", llm_seconds, matches[-1]["score"])
+            # New reviews are indexed between rounds; entries they would join are dropped
+            batch = arriving[round_number * new_reviews_per_round:(round_number + 1) * new_reviews_per_round]
+            vectors = embeddings.embed_documents([str(r["Review"]) for r in batch])
+            index.upsert([(str(r["review_id"]), v, review_metadata(r)) for r, v in zip(batch, vectors)])
+            cache.invalidate_for_reviews(vectors)
+        stats = cache.stats()
+        total = rounds * len(questions)
+        print(f"{total} manager queries ({len(questions)} questions x {rounds} rounds, "
+              f"{new_reviews_per_round} new reviews indexed per round)")
+        print(f"  hit rate {stats['hit_rate']:.1%}, {stats['invalidated']} entries invalidated by new reviews, "
+              f"{stats['stale']} stale entries caught by the review_id check, {stats['entries']} entries")
+        print(f"  LLM time {charged:.0f}s instead of {total * llm_seconds:.0f}s "
+              f"({stats['llm_seconds_saved']:.0f}s saved), lookup p50 {np.percentile(lookup_ms, 50):.2f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Manager answer cache statistics")
+    parser.add_argument("--db", default=DB_FILE)
+    parser.add_argument("--clear", action="store_true", help="drop every cached answer")
+    parser.add_argument("--benchmark", action="store_true", help="repeated manager queries against stand-ins")
+    parser.add_argument("--reviews-file", default=os.path.join(BASE_DIR, "reviews_data.xlsx"))
+    args = parser.parse_args()
+    if args.benchmark:
+        benchmark(args.reviews_file)
+        return
+    cache = AnswerCache(args.db)
+    if args.clear:
+        cache.clear()
+    print(json.dumps(cache.stats(), indent=2))
+
+
+if __name__ == "__main__":
+    main()
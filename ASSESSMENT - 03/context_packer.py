@@ -0,0 +1,228 @@
+import argparse
+import asyncio
+import os
+import re
+import time
+from llm_calls import summary_prompt, words_prompt
+
+# Prompt building for review RAG under a fixed token budget. Matched reviews are ranked by similarity
+# score, near-duplicates (word-set Jaccard >= DUPLICATE_THRESHOLD) are dropped, and reviews are packed
+# best first until BUDGET_TOKENS is reached; the lowest-ranked reviews that do not fit are left out.
+# Large result sets (more than MAP_REDUCE_CHUNKS budgets of reviews) are summarized map-reduce instead:
+# the reviews are split into budget-sized chunks, each chunk is summarized in parallel, and one final
+# call answers from those notes. The word-cloud call always gets the packed (budgeted) context.
+# Token counts are estimated at CHARS_PER_TOKEN characters per token.
+
+CHARS_PER_TOKEN = 4
+BUDGET_TOKENS = 3000
+MAX_REVIEW_TOKENS = 400
+DUPLICATE_THRESHOLD = 0.8
+MAP_REDUCE_CHUNKS = 2
+MAX_MAP_CALLS = 16
+WORD_PATTERN = re.compile(r"[a-z0-9']+")
+
+
+def estimate_tokens(text):
+    return max(1, (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN)
+
+
+def truncate(text, max_tokens):
+    text = " ".join(str(text).split())
+    limit = max_tokens * CHARS_PER_TOKEN
+    return text if len(text) <= limit else text[:limit].rsplit(" ", 1)[0] + " …"
+
+
+def map_prompt(query, reviews_text):
+    return (f"Here are some customer reviews: {reviews_text}. Note briefly what they say that is relevant to "
+            f"this manager's query: {query}. Answer in at most 5 short bullet points.")
+
+
+def reduce_prompt(query, notes, n_reviews):
+    return (f"Based on these notes summarizing {n_reviews} customer reviews, answer this manager's query: "
+            f"{query}. Here are the notes: {notes}. Provide a concise and professional summary that is elaborated.")
+
+
+class ContextPacker:
+
+    def __init__(self, budget_tokens=BUDGET_TOKENS, max_review_tokens=MAX_REVIEW_TOKENS,
+                 duplicate_threshold=DUPLICATE_THRESHOLD, map_reduce_chunks=MAP_REDUCE_CHUNKS,
+                 max_map_calls=MAX_MAP_CALLS):
+        self.budget_tokens = budget_tokens
+        self.max_review_tokens = max_review_tokens
+        self.duplicate_threshold = duplicate_threshold
+        self.map_reduce_chunks = map_reduce_chunks
+        self.max_map_calls = max_map_calls
+
+    def rank(self, reviews, scores=None):
+        # Best first, near-duplicates of a better-ranked review removed; returns (texts, n_duplicates)
+        scores = list(scores) if scores is not None else [0.0] * len(reviews)
+        order = sorted(range(len(reviews)), key=lambda i: -float(scores[i]))
+        kept, kept_words, duplicates = [], [], 0
+        for i in order:
+            text = truncate(reviews[i], self.max_review_tokens)
+            words = set(WORD_PATTERN.findall(text.lower()))
+            if not words:
+                continue
+            if any(len(words & other) >= self.duplicate_threshold * len(words | other) for other in kept_words):
+                duplicates += 1
+                continue
+            kept.append(text)
+            kept_words.append(words)
+        return kept, duplicates
+
+    def chunks(self, texts, budget_tokens):
+        # Consecutive runs of texts that fit budget_tokens each
+        chunks, current, used = [], [], 0
+        for text in texts:
+            tokens = estimate_tokens(text) + 1
+            if current and used + tokens > budget_tokens:
+                chunks.append(current)
+                current, used = [], 0
+            current.append(text)
+            used += tokens
+        if current:
+            chunks.append(current)
+        return chunks
+
+    def plan(self, reviews, scores=None):
+        texts, duplicates = self.rank(reviews, scores)
+        chunks = self.chunks(texts, self.budget_tokens)
+        context = " ".join(chunks[0]) if chunks else ""
+        map_reduce = len(chunks) > self.map_reduce_chunks
+        plan = {
+            "mode": "map_reduce" if map_reduce else "direct",
+            "context": context,
+            "chunks": [],
+            "reviews_in": len(reviews),
+            "duplicates": duplicates,
+            "reviews_used": len(chunks[0]) if chunks else 0,
+            "dropped": len(texts) - len(chunks[0]) if chunks else 0
+        }
+        if map_reduce:
+            kept = chunks[:self.max_map_calls]
+            plan["chunks"] = [" ".join(chunk) for chunk in kept]
+            plan["reviews_used"] = sum(len(chunk) for chunk in kept)
+            plan["dropped"] = sum(len(chunk) for chunk in chunks[self.max_map_calls:])
+        return plan
+
+
+async def answer_async(llm, query, plan, on_token=None):
+    # Runs on the LLMRunner's loop: words call alongside the map calls, then the streamed final summary
+    start = time.perf_counter()
+    first_token = []
+
+    def tokens(token):
+        if not first_token:
+            first_token.append(time.perf_counter() - start)
+        if on_token:
+            on_token(token)
+
+    words_prompt_text = words_prompt(query, plan["context"])
+    words_call = asyncio.ensure_future(llm.complete("words", words_prompt_text))
+    prompts = [words_prompt_text]
+    map_seconds = 0.0
+    if plan["mode"] == "map_reduce":
+        map_prompts = [map_prompt(query, chunk) for chunk in plan["chunks"]]
+        notes = await asyncio.gather(*[llm.complete("map", prompt) for prompt in map_prompts])
+        map_seconds = time.perf_counter() - start
+        final_prompt = reduce_prompt(query, "\n".join(text for text, _ in notes), plan["reviews_used"])
+        prompts += map_prompts
+    else:
+        final_prompt = summary_prompt(query, plan["context"])
+    prompts.append(final_prompt)
+    answer, _ = await llm.complete("summary", final_prompt, tokens)
+    words, _ = await words_call
+    report = {
+        "mode": plan["mode"],
+        "reviews_in": plan["reviews_in"],
+        "duplicates": plan["duplicates"],
+        "reviews_used": plan["reviews_used"],
+        "dropped": plan["dropped"],
+        "llm_calls": len(prompts),
+        "largest_prompt_tokens": max(estimate_tokens(p) for p in prompts),
+        "prompt_tokens": sum(estimate_tokens(p) for p in prompts),
+        "map_seconds": map_seconds,
+        "first_token_seconds": first_token[0] if first_token else time.perf_counter() - start,
+        "total_seconds": time.perf_counter() - start
+    }
+    return {"summary": answer, "words": words.strip(), "report": report}
+
+
+def answer(llm, query, reviews, scores=None, packer=None):
+    # Returns (tokens, done) like LLMRunner.stream: summary tokens as they arrive, and a Future of
+    # {"summary", "words", "report"}
+    plan = (packer or ContextPacker()).plan(reviews, scores)
+    return llm.start(lambda on_token: answer_async(llm, query, plan, on_token))
+
+
+def benchmark(reviews_file, top_ks=(10, 50, 200), ttft=0.8, token_delay=0.02, prefill_per_1k=0.2,
+              context_tokens=8192):
+    # Unbounded concatenation vs the packer at growing top_k, against the local chat stand-in (prompt
+    # processing time grows with prompt size; prompts over context_tokens are rejected)
+    from local_services import LocalChatServer, LocalEmbeddings, LocalIndex
+    from llm_calls import LLMRunner
+    from review_ingestion import review_metadata
+    import repo_paths
+    from data_access import read_table
+    reviews = read_table(reviews_file)
+    by_id = dict(zip(reviews["review_id"].astype(int), reviews["Review"].astype(str)))
+    embeddings, index = LocalEmbeddings(), LocalIndex()
+    records = reviews.to_dict("records")
+    for i in range(0, len(records), 1000):
+        batch = records[i:i + 1000]
+        vectors = embeddings.embed_documents([str(r["Review"]) for r in batch])
+        index.upsert([(str(r["review_id"]), v, review_metadata(r)) for r, v in zip(batch, vectors)])
+
+    server = LocalChatServer(ttft=ttft, token_delay=token_delay, prefill_per_1k=prefill_per_1k,
+                             context_tokens=context_tokens)
+    llm = LLMRunner(api_key="local", base_url=server.base_url)
+    query = "What do customers say about breakfast?"
+    vector = embeddings.embed_query(query)
+    print(f"{'top_k':>6}{'path':>12}{'calls':>7}{'largest prompt':>16}{'all prompts':>13}"
+          f"{'first token':>13}{'total':>8}  reviews used / duplicates / dropped")
+    for top_k in top_ks:
+        matches = index.query(vector=vector, top_k=top_k)["matches"]
+        texts = [by_id[int(m["id"])] for m in matches]
+        scores = [m["score"] for m in matches]
+
+        # Old path: everything concatenated, the blob sent twice
+        blob = " ".join(texts)
+        old_prompts = [summary_prompt(query, blob), words_prompt(query, blob)]
+        start = time.perf_counter()
+        tokens, done = llm.stream({"summary": old_prompts[0], "words": old_prompts[1]}, "summary")
+        first = None
+        for _ in tokens:
+            first = first or time.perf_counter() - start
+        try:
+            done.result()
+            timing = f"{first:>12.2f}s{time.perf_counter() - start:>7.2f}s"
+        except Exception as e:
+            timing = f"  fails: {type(e).__name__} (context length exceeded)"
+        print(f"{top_k:>6}{'concat':>12}{2:>7}{max(map(estimate_tokens, old_prompts)):>16}"
+              f"{sum(map(estimate_tokens, old_prompts)):>13}{timing}")
+
+        tokens, done = answer(llm, query, texts, scores)
+        for _ in tokens:
+            pass
+        r = done.result()["report"]
+        print(f"{top_k:>6}{r['mode']:>12}{r['llm_calls']:>7}{r['largest_prompt_tokens']:>16}{r['prompt_tokens']:>13}"
+              f"{r['first_token_seconds']:>12.2f}s{r['total_seconds']:>7.2f}s  "
+              f"{r['reviews_used']} / {r['duplicates']} / {r['dropped']}")
+    print(f"Budget {BUDGET_TOKENS} tokens per prompt; stand-in: TTFT {ttft:.1f}s + {prefill_per_1k:.1f}s per 1k prompt "
+          f"tokens, {token_delay * 1000:.0f} ms/token, {context_tokens} token context, "
+          f"up to {server.max_active} concurrent requests")
+    llm.close()
+    server.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the token-budgeted context packer")
+    parser.add_argument("--reviews-file", default=os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                                               "reviews_data.xlsx"))
+    parser.add_argument("--top-k", type=int, nargs="+", default=[10, 50, 200])
+    args = parser.parse_args()
+    benchmark(args.reviews_file, args.top_k)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,261 @@
+import argparse
+import fcntl
+import hashlib
+import os
+import threading
+import time
+from contextlib import contextmanager
+import numpy as np
+
+# Persistent embedding cache shared by the submission app, index rebuilds and the manager dashboard.
+# Vectors live in a memory-mapped float32 matrix (vectors.f32, capacity x dimension); keys.log maps
+# sha256(model + text) to a row. Rows are reused as a ring (oldest entry evicted first), and every
+# write appends "key row" to the log, so processes sharing the directory replay each other's writes
+# and always agree on which row holds what. Writes and lookups take an flock on the log. Compaction
+# rewrites the log under a new "# generation N" first line; a process that sees a different generation
+# (or a log shorter than what it already read) drops its map and replays the new log from the start.
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+CACHE_DIR = os.path.join(BASE_DIR, ".embedding_cache")
+CAPACITY = 50000
+DIMENSION = 768
+
+
+def cache_key(model, text):
+    return hashlib.sha256(f"{model}\0{text}".encode()).hexdigest()
+
+
+class EmbeddingCache:
+
+    def __init__(self, directory=CACHE_DIR, capacity=CAPACITY, dimension=DIMENSION):
+        self.directory = directory
+        self.capacity = capacity
+        self.dimension = dimension
+        os.makedirs(directory, exist_ok=True)
+        self.log_path = os.path.join(directory, "keys.log")
+        self.lock_path = os.path.join(directory, "lock")
+        vectors_path = os.path.join(directory, "vectors.f32")
+        shape = (capacity, dimension)
+        with self.file_lock():
+            if not os.path.exists(vectors_path) or os.path.getsize(vectors_path) != capacity * dimension * 4:
+                # New (or resized) cache: the file is sparse on disk until rows are written
+                np.memmap(vectors_path, dtype=np.float32, mode="w+", shape=shape).flush()
+                open(self.log_path, "w").close()
+        self.vectors = np.memmap(vectors_path, dtype=np.float32, mode="r+", shape=shape)
+        self.lock = threading.Lock()
+        self.rows = {}        # key -> row
+        self.row_keys = {}    # row -> key
+        self.next_row = 0
+        self.log_offset = 0
+        self.log_lines = 0
+        self.generation = 0
+
+    @contextmanager
+    def file_lock(self):
+        with open(self.lock_path, "a") as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    def sync(self):
+        # Replay log lines appended (by any process) since the last sync
+        with open(self.log_path, "rb") as f:
+            header = f.readline()
+            generation = int(header.split()[2]) if header.startswith(b"# generation ") else 0
+            size = os.fstat(f.fileno()).st_size
+            if generation != self.generation or size < self.log_offset:
+                # Compacted (or recreated) by another process: our offset points into a different file
+                self.rows.clear()
+                self.row_keys.clear()
+                self.next_row = 0
+                self.log_offset = 0
+                self.log_lines = 0
+                self.generation = generation
+            if size == self.log_offset:
+                return
+            f.seek(self.log_offset)
+            data = f.read()
+        complete = data.rfind(b"\n") + 1
+        for line in data[:complete].splitlines():
+            if line.startswith(b"#"):
+                continue
+            key, row = line.decode().split()
+            row = int(row)
+            old = self.row_keys.get(row)
+            if old is not None and self.rows.get(old) == row:
+                del self.rows[old]
+            self.rows[key] = row
+            self.row_keys[row] = key
+            self.next_row = (row + 1) % self.capacity
+            self.log_lines += 1
+        self.log_offset += complete
+
+    def get_many(self, keys):
+        # List of vectors (copies) or None per key
+        with self.lock, self.file_lock():
+            self.sync()
+            rows = [self.rows.get(key) for key in keys]
+            return [None if row is None else np.array(self.vectors[row]) for row in rows]
+
+    def put_many(self, keys, vectors):
+        with self.lock, self.file_lock():
+            self.sync()
+            lines = []
+            for key, vector in zip(keys, vectors):
+                if key in self.rows:
+                    continue
+                row = self.next_row
+                self.vectors[row] = np.asarray(vector, dtype=np.float32)
+                old = self.row_keys.get(row)
+                if old is not None and self.rows.get(old) == row:
+                    del self.rows[old]
+                self.rows[key] = row
+                self.row_keys[row] = key
+                self.next_row = (row + 1) % self.capacity
+                lines.append(f"{key} {row}\n")
+            if not lines:
+                return
+            # Vector rows reach the file before the log lines that point at them
+            self.vectors.flush()
+            with open(self.log_path, "a") as f:
+                f.write("".join(lines))
+            self.log_offset = os.path.getsize(self.log_path)
+            self.log_lines += len(lines)
+            if self.log_lines > 4 * self.capacity:
+                self.compact()
+
+    def compact(self):
+        # Rewrite the log with only the live entries, oldest first (caller holds the locks)
+        live = sorted(self.rows.items(), key=lambda item: (item[1] - self.next_row) % self.capacity)
+        tmp = f"{self.log_path}.{os.getpid()}.tmp"
+        self.generation += 1
+        with open(tmp, "w") as f:
+            f.write(f"# generation {self.generation}\n")
+            f.write("".join(f"{key} {row}\n" for key, row in live))
+        os.replace(tmp, self.log_path)
+        self.log_offset = os.path.getsize(self.log_path)
+        self.log_lines = len(live)
+
+    def __len__(self):
+        with self.lock, self.file_lock():
+            self.sync()
+            return len(self.rows)
+
+
+class CachedEmbeddings:
+    # Drop-in wrapper for TogetherEmbeddings (or the local stand-in): embed_query / embed_documents
+    # served from the cache, with only the missing texts sent to the API, deduplicated, in one call
+
+    def __init__(self, embeddings, cache=None, model=None):
+        self.embeddings = embeddings
+        self.cache = cache or get_embedding_cache()
+        self.model = model or getattr(embeddings, "model", type(embeddings).__name__)
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.network_calls = 0
+        self.calls_saved = 0
+
+    def embed_documents(self, texts):
+        texts = [str(t) for t in texts]
+        keys = [cache_key(self.model, t) for t in texts]
+        vectors = self.cache.get_many(keys)
+        missing = {}
+        for key, text, vector in zip(keys, texts, vectors):
+            if vector is None:
+                missing.setdefault(key, text)
+        if missing:
+            fetched = self.embeddings.embed_documents(list(missing.values()))
+            self.cache.put_many(list(missing), fetched)
+            fetched = dict(zip(missing, fetched))
+            vectors = [fetched[key] if vector is None else vector for key, vector in zip(keys, vectors)]
+        with self.lock:
+            self.misses += len(missing)
+            self.hits += len(texts) - len(missing)
+            self.network_calls += 1 if missing else 0
+            self.calls_saved += 0 if missing else 1
+        return [np.asarray(v, dtype=np.float32).tolist() for v in vectors]
+
+    def embed_query(self, text):
+        return self.embed_documents([text])[0]
+
+    def stats(self):
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self.cache),
+                "capacity": self.cache.capacity,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "network_calls": self.network_calls,
+                "network_calls_saved": self.calls_saved
+            }
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_embedding_cache():
+    # One cache object per process (each owns a memory map of the shared files)
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = EmbeddingCache()
+    return _cache
+
+
+def benchmark(reviews_file, batch_size=128):
+    import tempfile
+    from local_services import LocalEmbeddings
+    import repo_paths
+    from data_access import read_table
+    reviews = read_table(reviews_file)["Review"].astype(str).tolist()
+    queries = ["What do customers say about breakfast?", "Is the room clean?", "How is the staff?"] * 10
+
+    with tempfile.TemporaryDirectory() as tmp:
+        remote = LocalEmbeddings(call_latency=0.05, item_latency=0.001)
+        cached = CachedEmbeddings(remote, EmbeddingCache(tmp))
+        for run in ("first rebuild", "second rebuild"):
+            start = time.perf_counter()
+            calls = remote.calls
+            for i in range(0, len(reviews), batch_size):
+                cached.embed_documents(reviews[i:i + batch_size])
+            print(f"{run}: {len(reviews)} reviews in {time.perf_counter() - start:.1f}s, "
+                  f"{remote.calls - calls} embedding API calls")
+
+        start = time.perf_counter()
+        calls = remote.calls
+        for q in queries:
+            cached.embed_query(q)
+        print(f"{len(queries)} manager queries ({len(set(queries))} distinct): {time.perf_counter() - start:.2f}s, "
+              f"{remote.calls - calls} embedding API calls")
+
+        # A second process (e.g. the manager app) opening the same directory sees every entry
+        reopened = CachedEmbeddings(remote, EmbeddingCache(tmp))
+        start = time.perf_counter()
+        reopened.embed_documents(reviews[:batch_size])
+        print(f"Reopened cache: {batch_size} lookups in {(time.perf_counter() - start) * 1000:.1f} ms")
+        stats = cached.stats()
+        print(f"hit rate {stats['hit_rate']:.1%}, {stats['network_calls']} API calls made, "
+              f"{stats['network_calls_saved']} saved, {stats['entries']} cached vectors")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Embedding cache statistics and benchmark")
+    parser.add_argument("--benchmark", action="store_true", help="rebuild + repeated queries against a stand-in")
+    parser.add_argument("--reviews-file", default=os.path.join(BASE_DIR, "reviews_data.xlsx"))
+    args = parser.parse_args()
+    if args.benchmark:
+        benchmark(args.reviews_file)
+    else:
+        cache = get_embedding_cache()
+        print(f"{len(cache)} / {cache.capacity} cached vectors in {cache.directory}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,176 @@
+import argparse
+import asyncio
+import queue
+import threading
+import time
+from collections import defaultdict, deque
+import numpy as np
+
+# Concurrent, streamed chat completions for Manager_Review_Analysis.py. One AsyncTogether client lives on
+# an event loop in a background thread (one per app process); the summary and the word-cloud words are
+# requested at the same time, and the summary's tokens are handed to the page as they arrive. Every call
+# records its time to first token (TTFT) and total latency. TOGETHER_BASE_URL points the client at any
+# OpenAI-compatible server, e.g. local_services.LocalChatServer.
+
+CHAT_MODEL = "meta-llama/Llama-Vision-Free"
+MAX_CONCURRENCY = 8  # completions in flight per process (rate limits)
+
+
+class LLMRunner:
+
+    def __init__(self, api_key=None, base_url=None, model=CHAT_MODEL, max_concurrency=MAX_CONCURRENCY):
+        self.model = model
+        self.loop = asyncio.new_event_loop()
+        threading.Thread(target=self.loop.run_forever, daemon=True).start()
+        # The client (and its connection pool) is created on, and only used from, the loop's thread
+        self.client, self.slots = self.run(self.make_client(api_key, base_url, max_concurrency)).result()
+        self.lock = threading.Lock()
+        self.timings = defaultdict(lambda: deque(maxlen=1000))
+
+    async def make_client(self, api_key, base_url, max_concurrency):
+        from together import AsyncTogether
+        return AsyncTogether(api_key=api_key, base_url=base_url), asyncio.Semaphore(max_concurrency)
+
+    def run(self, coroutine):
+        return asyncio.run_coroutine_threadsafe(coroutine, self.loop)
+
+    async def complete(self, name, prompt, on_token=None):
+        # One streamed completion: the full text, with TTFT / total latency recorded under `name`
+        async with self.slots:
+            start = time.perf_counter()
+            first_token = None
+            parts = []
+            stream = await self.client.chat.completions.create(
+                model=self.model, messages=[{"role": "user", "content": prompt}], stream=True)
+            async for chunk in stream:
+                token = chunk.choices[0].delta.content if chunk.choices else None
+                if not token:
+                    continue
+                if first_token is None:
+                    first_token = time.perf_counter() - start
+                parts.append(token)
+                if on_token:
+                    on_token(token)
+        timing = {"call": name, "ttft": first_token if first_token is not None else time.perf_counter() - start,
+                  "total": time.perf_counter() - start, "tokens": len(parts), "prompt_chars": len(prompt)}
+        with self.lock:
+            self.timings[name].append(timing)
+        return "".join(parts), timing
+
+    async def gather(self, prompts, stream_name, on_token):
+        names = list(prompts)
+        results = await asyncio.gather(*[
+            self.complete(name, prompts[name], on_token if name == stream_name else None) for name in names])
+        return {name: result for name, result in zip(names, results)}
+
+    def stream(self, prompts, stream_name):
+        # Starts every prompt concurrently. Returns (tokens, done): `tokens` yields the tokens of
+        # prompts[stream_name] as they arrive (for st.write_stream); `done` is a Future of
+        # {name: (text, timing)} once all calls have finished.
+        return self.start(lambda on_token: self.gather(prompts, stream_name, on_token))
+
+    def start(self, make_coroutine):
+        # Runs make_coroutine(on_token) on the loop; returns (tokens, done) as for `stream`
+        tokens = queue.Queue()
+        done = self.run(make_coroutine(tokens.put))
+        done.add_done_callback(lambda _: tokens.put(None))
+
+        def iterate():
+            while True:
+                token = tokens.get()
+                if token is None:
+                    return
+                yield token
+        return iterate(), done
+
+    def stats(self):
+        with self.lock:
+            return {name: {
+                "calls": len(samples),
+                "ttft_p50": float(np.percentile([s["ttft"] for s in samples], 50)),
+                "ttft_p95": float(np.percentile([s["ttft"] for s in samples], 95)),
+                "total_p50": float(np.percentile([s["total"] for s in samples], 50)),
+                "total_p95": float(np.percentile([s["total"] for s in samples], 95))
+            } for name, samples in self.timings.items() if samples}
+
+    async def shutdown(self):
+        # Cancel calls still streaming (e.g. the other half of a failed pair), then close the client
+        tasks = [task for task in asyncio.all_tasks() if task is not asyncio.current_task()]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        await self.client.close()
+        await self.loop.shutdown_asyncgens()
+
+    def close(self):
+        self.run(self.shutdown()).result()
+        self.loop.call_soon_threadsafe(self.loop.stop)
+
+
+def summary_prompt(query, reviews_text):
+    return (f"Based on these customer reviews, answer this manager's query: {query}. Here are the relevant "
+            f"reviews: {reviews_text}. Provide a concise and professional summary that is elaborated.")
+
+
+def words_prompt(query, reviews_text):
+    return (f"Extract the most frequent and relevant words from these reviews based on the query: '{query}'. "
+            f"Here are the reviews: {reviews_text}. Return only a comma-separated list of words.")
+
+
+def benchmark(rounds=10, ttft=0.8, token_delay=0.02):
+    # Old path (two blocking completions, one after the other) vs. both streamed concurrently, against
+    # the local OpenAI-compatible stand-in
+    from together import Together
+    from local_services import LocalChatServer
+    server = LocalChatServer(ttft=ttft, token_delay=token_delay)
+    reviews_text = "The breakfast was cold and the staff were slow. Great breakfast buffet, friendly staff. " * 20
+    query = "What do customers say about breakfast?"
+
+    client = Together(api_key="local", base_url=server.base_url)
+    blocking_first, blocking_total = [], []
+    for _ in range(rounds):
+        start = time.perf_counter()
+        client.chat.completions.create(model=CHAT_MODEL, messages=[
+            {"role": "user", "content": summary_prompt(query, reviews_text)}])
+        blocking_first.append(time.perf_counter() - start)  # the summary appears once it is complete
+        client.chat.completions.create(model=CHAT_MODEL, messages=[
+            {"role": "user", "content": words_prompt(query, reviews_text)}])
+        blocking_total.append(time.perf_counter() - start)
+
+    runner = LLMRunner(api_key="local", base_url=server.base_url)
+    streamed_first, streamed_total = [], []
+    for _ in range(rounds):
+        start = time.perf_counter()
+        tokens, done = runner.stream({"summary": summary_prompt(query, reviews_text),
+                                      "words": words_prompt(query, reviews_text)}, "summary")
+        first = None
+        for _ in tokens:
+            first = first or time.perf_counter() - start
+        done.result()
+        streamed_first.append(first)
+        streamed_total.append(time.perf_counter() - start)
+    stats = runner.stats()
+    runner.close()
+    server.close()
+
+    print(f"Stand-in: TTFT {ttft:.1f}s, {token_delay * 1000:.0f} ms/token, {rounds} rounds")
+    print(f"  blocking, one after the other: summary visible after {np.median(blocking_first):.2f}s, "
+          f"both done after {np.median(blocking_total):.2f}s")
+    print(f"  concurrent + streamed:         first summary token after {np.median(streamed_first):.2f}s, "
+          f"both done after {np.median(streamed_total):.2f}s")
+    for name, s in stats.items():
+        print(f"  {name}: TTFT p50 {s['ttft_p50']:.2f}s, total p50 {s['total_p50']:.2f}s ({s['calls']} calls)")
+    print(f"  stand-in saw up to {server.max_active} concurrent requests")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark blocking vs concurrent streamed completions")
+    parser.add_argument("--rounds", type=int, default=10)
+    parser.add_argument("--ttft", type=float, default=0.8, help="stand-in delay before the first token")
+    parser.add_argument("--token-delay", type=float, default=0.02, help="stand-in delay between tokens")
+    args = parser.parse_args()
+    benchmark(args.rounds, args.ttft, args.token_delay)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,341 @@
+import hashlib
+import json
+import random
+import re
+import socket
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import numpy as np
+
+# Local stand-ins for the Together embedding and chat APIs, the Pinecone index and the SMTP server, with
+# the same call shapes (embed_query / embed_documents, upsert / query, OpenAI-style chat completions,
+# SMTP) plus configurable latency and transient failures. Used to run and benchmark the review
+# pipelines offline.
+
+DIMENSION = 768
+TOKEN_PATTERN = re.compile(r"[a-z0-9']+")
+
+
+class ServiceUnavailable(ConnectionError):
+    # Transient error raised by the stand-ins (the kind of failure callers should retry)
+    pass
+
+
+class SimulatedService:
+
+    def __init__(self, call_latency=0.0, item_latency=0.0, failure_rate=0.0, seed=0):
+        self.call_latency = call_latency
+        self.item_latency = item_latency
+        self.failure_rate = failure_rate
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.calls = 0
+        self.items = 0
+        self.failures = 0
+
+    def round_trip(self, n_items):
+        # One "network" call: fixed overhead + per-item cost, failing now and then
+        with self.lock:
+            self.calls += 1
+            failed = self.random.random() < self.failure_rate
+            if failed:
+                self.failures += 1
+            else:
+                self.items += n_items
+        time.sleep(self.call_latency + self.item_latency * n_items)
+        if failed:
+            raise ServiceUnavailable("simulated transient failure")
+
+
+class LocalEmbeddings(SimulatedService):
+    # Feature-hashed bag of words: deterministic, and reviews sharing words get similar vectors,
+    # so similarity search over them behaves like it does over real embeddings
+
+    def __init__(self, model="togethercomputer/m2-bert-80M-8k-retrieval", dimension=DIMENSION, **latency):
+        super().__init__(**latency)
+        self.model = model
+        self.dimension = dimension
+
+    def vector(self, text):
+        v = np.zeros(self.dimension, dtype=np.float32)
+        for token in TOKEN_PATTERN.findall(str(text).lower()):
+            h = int.from_bytes(hashlib.blake2b(token.encode(), digest_size=8).digest(), "little")
+            v[h % self.dimension] += 1.0 if (h >> 32) & 1 else -1.0
+        norm = np.linalg.norm(v)
+        return v / norm if norm else v
+
+    def embed_documents(self, texts):
+        self.round_trip(len(texts))
+        return [self.vector(text).tolist() for text in texts]
+
+    def embed_query(self, text):
+        self.round_trip(1)
+        return self.vector(text).tolist()
+
+
+class LocalIndex(SimulatedService):
+    # In-memory index with Pinecone's upsert / query / describe_index_stats shapes (brute-force cosine)
+
+    def __init__(self, **latency):
+        super().__init__(**latency)
+        self.vectors = {}
+
+    def upsert(self, vectors, namespace=""):
+        self.round_trip(len(vectors))
+        with self.lock:
+            for item in vectors:
+                if isinstance(item, dict):
+                    item_id, values, metadata = item["id"], item["values"], item.get("metadata", {})
+                else:
+                    item_id, values, metadata = item[0], item[1], item[2] if len(item) > 2 else {}
+                self.vectors[str(item_id)] = (np.asarray(values, dtype=np.float32), dict(metadata))
+        return {"upserted_count": len(vectors)}
+
+    def query(self, vector, top_k=10, include_metadata=False, filter=None, namespace=""):
+        self.round_trip(1)
+        with self.lock:
+            items = list(self.vectors.items())
+        if not items:
+            return {"matches": []}
+        ids = [item_id for item_id, _ in items]
+        matrix = np.stack([values for _, (values, _) in items])
+        scores = matrix @ np.asarray(vector, dtype=np.float32)
+        scores /= np.maximum(np.linalg.norm(matrix, axis=1) * np.linalg.norm(vector), 1e-12)
+        matches = []
+        for i in np.argsort(-scores):
+            metadata = items[i][1][1]
+            if filter and not matches_filter(metadata, filter):
+                continue
+            match = {"id": ids[i], "score": float(scores[i])}
+            if include_metadata:
+                match["metadata"] = metadata
+            matches.append(match)
+            if len(matches) == top_k:
+                break
+        return {"matches": matches}
+
+    def fetch(self, ids, namespace=""):
+        self.round_trip(len(ids))
+        with self.lock:
+            return {"vectors": {str(i): {"id": str(i), "values": self.vectors[str(i)][0].tolist(),
+                                         "metadata": self.vectors[str(i)][1]}
+                                for i in ids if str(i) in self.vectors}}
+
+    def describe_index_stats(self):
+        with self.lock:
+            return {"dimension": DIMENSION, "total_vector_count": len(self.vectors)}
+
+
+class LocalSMTPServer:
+    # Minimal SMTP server on localhost that accepts every message, counting connections and messages.
+    # `delay` is added to each command reply (a remote server's round trip).
+
+    def __init__(self, host="127.0.0.1", port=0, delay=0.0):
+        self.delay = delay
+        self.server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.server.bind((host, port))
+        self.server.listen(64)
+        self.host, self.port = self.server.getsockname()
+        self.lock = threading.Lock()
+        self.connections = 0
+        self.messages = 0
+        threading.Thread(target=self.accept_loop, daemon=True).start()
+
+    def accept_loop(self):
+        while True:
+            try:
+                conn, _ = self.server.accept()
+            except OSError:
+                return
+            with self.lock:
+                self.connections += 1
+            threading.Thread(target=self.handle, args=(conn,), daemon=True).start()
+
+    def reply(self, conn, line):
+        time.sleep(self.delay)
+        conn.sendall(line)
+
+    def handle(self, conn):
+        f = conn.makefile("rb")
+        self.reply(conn, b"220 local smtp ready\r\n")
+        in_data = False
+        for line in f:
+            if in_data:
+                if line in (b".\r\n", b".\n"):
+                    in_data = False
+                    with self.lock:
+                        self.messages += 1
+                    self.reply(conn, b"250 OK\r\n")
+                continue
+            command = line[:4].upper()
+            if command == b"DATA":
+                in_data = True
+                self.reply(conn, b"354 End data with <CR><LF>.<CR><LF>\r\n")
+            elif command == b"QUIT":
+                self.reply(conn, b"221 Bye\r\n")
+                break
+            else:
+                self.reply(conn, b"250 OK\r\n")
+        conn.close()
+
+    def settings(self):
+        # Connection settings for email_outbox.SMTPConnectionPool
+        return {"host": self.host, "port": self.port, "user": "", "password": "", "use_tls": False}
+
+    def close(self):
+        self.server.close()
+
+
+class LocalChatServer:
+    # OpenAI-compatible POST /v1/chat/completions on localhost (plain and stream=True server-sent events).
+    # Point the Together SDK at it with TOGETHER_BASE_URL=<base_url>. The reply is made of the prompt's
+    # most frequent words: a comma-separated list when the prompt asks for one, otherwise `answer_tokens`
+    # words. The delay before the first token is `ttft` plus `prefill_per_1k` per 1,000 prompt tokens
+    # (~4 characters each), then `token_delay` between tokens. Prompts over `context_tokens` get HTTP 400.
+
+    STOP_WORDS = {"the", "and", "a", "an", "to", "of", "in", "was", "is", "it", "for", "on", "with", "we",
+                  "were", "this", "that", "but", "very", "at", "our", "i", "my", "you", "be", "are", "had", "as"}
+
+    def __init__(self, host="127.0.0.1", port=0, ttft=0.5, token_delay=0.02, answer_tokens=120, prefill_per_1k=0.0,
+                 context_tokens=None):
+        self.ttft = ttft
+        self.prefill_per_1k = prefill_per_1k
+        self.context_tokens = context_tokens
+        self.token_delay = token_delay
+        self.answer_tokens = answer_tokens
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.prompt_chars = 0
+        self.active = 0
+        self.max_active = 0
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def do_POST(self):
+                if not self.path.rstrip("/").endswith("/chat/completions"):
+                    self.send_error(404)
+                    return
+                request = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+                server.handle(self, request)
+
+        self.httpd = ThreadingHTTPServer((host, port), Handler)
+        self.httpd.daemon_threads = True
+        self.base_url = f"http://{host}:{self.httpd.server_address[1]}/v1"
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+
+    def reply_tokens(self, prompt):
+        words = [w for w in TOKEN_PATTERN.findall(prompt.lower()) if w not in self.STOP_WORDS and len(w) > 2]
+        common = [w for w, _ in Counter(words).most_common(40)] or ["no", "reviews"]
+        if "comma-separated" in prompt:
+            return [f"{w}, " for w in common[:30]]
+        return [f"{common[i % len(common)]} " for i in range(self.answer_tokens)]
+
+    def handle(self, handler, request):
+        prompt = " ".join(str(m.get("content", "")) for m in request.get("messages", []))
+        with self.lock:
+            self.requests += 1
+            self.prompt_chars += len(prompt)
+            self.active += 1
+            self.max_active = max(self.max_active, self.active)
+        try:
+            prompt_tokens = len(prompt) // 4
+            if self.context_tokens and prompt_tokens > self.context_tokens:
+                body = json.dumps({"error": {"message": f"prompt of {prompt_tokens} tokens exceeds the context "
+                                                       f"length of {self.context_tokens}",
+                                             "type": "invalid_request_error"}}).encode()
+                handler.send_response(400)
+                handler.send_header("Content-Type", "application/json")
+                handler.send_header("Content-Length", str(len(body)))
+                handler.end_headers()
+                handler.wfile.write(body)
+                return
+            tokens = self.reply_tokens(prompt)
+            base = {"id": f"local-{self.requests}", "created": int(time.time()), "model": request.get("model", "")}
+            time.sleep(self.ttft + self.prefill_per_1k * prompt_tokens / 1000)
+            if not request.get("stream"):
+                time.sleep(self.token_delay * (len(tokens) - 1))
+                body = json.dumps(dict(base, object="chat.completion", choices=[{
+                    "index": 0, "finish_reason": "stop",
+                    "message": {"role": "assistant", "content": "".join(tokens)}}],
+                    usage={"prompt_tokens": prompt_tokens, "completion_tokens": len(tokens),
+                           "total_tokens": prompt_tokens + len(tokens)})).encode()
+                handler.send_response(200)
+                handler.send_header("Content-Type", "application/json")
+                handler.send_header("Content-Length", str(len(body)))
+                handler.end_headers()
+                handler.wfile.write(body)
+                return
+            handler.send_response(200)
+            handler.send_header("Content-Type", "text/event-stream")
+            handler.send_header("Transfer-Encoding", "chunked")
+            handler.end_headers()
+
+            def event(payload):
+                data = f"data: {payload}\n\n".encode()
+                handler.wfile.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+                handler.wfile.flush()
+
+            for i, token in enumerate(tokens):
+                if i:
+                    time.sleep(self.token_delay)
+                event(json.dumps(dict(base, object="chat.completion.chunk", choices=[{
+                    "index": 0, "finish_reason": None, "delta": {"role": "assistant", "content": token}}])))
+            event(json.dumps(dict(base, object="chat.completion.chunk", choices=[{
+                "index": 0, "finish_reason": "stop", "delta": {}}])))
+            event("[DONE]")
+            handler.wfile.write(b"0\r\n\r\n")
+        finally:
+            with self.lock:
+                self.active -= 1
+
+    def close(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+FILTER_OPERATORS = {"$eq", "$ne", "$gt", "$gte", "$lt", "$lte", "$in"}
+
+
+def check_filter(conditions):
+    # An operator we do not implement must fail loudly, not match every row
+    for condition in conditions.values():
+        if isinstance(condition, dict):
+            unsupported = set(condition) - FILTER_OPERATORS
+            if unsupported:
+                raise ValueError(f"unsupported filter operator(s) {sorted(unsupported)}; "
+                                 f"supported: {sorted(FILTER_OPERATORS)}")
+
+
+def matches_filter(metadata, conditions):
+    # Subset of Pinecone's metadata filter language: {"field": {"$lte": x, "$gte": y, ...}} or {"field": value}
+    check_filter(conditions)
+    for field, condition in conditions.items():
+        value = metadata.get(field)
+        if not isinstance(condition, dict):
+            condition = {"$eq": condition}
+        for op, target in condition.items():
+            if value is None:
+                return False
+            if op == "$eq" and not value == target:
+                return False
+            if op == "$ne" and not value != target:
+                return False
+            if op == "$gt" and not value > target:
+                return False
+            if op == "$gte" and not value >= target:
+                return False
+            if op == "$lt" and not value < target:
+                return False
+            if op == "$lte" and not value <= target:
+                return False
+            if op == "$in" and value not in target:
+                return False
+    return True
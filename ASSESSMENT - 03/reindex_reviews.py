@@ -0,0 +1,218 @@
+import argparse
+import json
+import os
+import resource
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, Future
+from datetime import datetime
+from review_store import ReviewStore
+from review_ingestion import call_with_retry, review_metadata, UPSERT_BATCH_SIZE
+from embedding_cache import CachedEmbeddings
+
+# Bulk (re-)indexing of the review log into the vector index, replacing the manual notebook run.
+# Reviews are read in chunks in log order; embedding batches run concurrently (at most `rate` API calls
+# per second) and each batch is upserted as soon as it is embedded. The checkpoint records the log
+# position up to which every review is indexed, so a rerun continues from there. At most 2 x workers
+# batches are in flight, so memory does not grow with the corpus.
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+CHECKPOINT_FILE = os.path.join(BASE_DIR, ".reindex_checkpoint.json")
+
+
+class RateLimiter:
+    # Token bucket: at most `rate` acquisitions per second on average, bursts of up to `burst`
+
+    def __init__(self, rate, burst=1):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+def load_checkpoint(path, mode):
+    if path and os.path.exists(path):
+        with open(path) as f:
+            state = json.load(f)
+        if state.get("mode") == mode and not state.get("finished"):
+            return state
+    return {"mode": mode, "last_seq": 0, "indexed": 0, "skipped": 0, "started_at": datetime.now().isoformat()}
+
+
+def save_checkpoint(path, state):
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "w") as f:
+        json.dump(state, f)
+    os.replace(tmp, path)
+
+
+def missing_from_index(index, chunk):
+    # Reviews whose review_id has no vector yet (fetch takes up to 1000 ids per call)
+    ids = chunk["review_id"].astype(str).tolist()
+    present = set()
+    for i in range(0, len(ids), 1000):
+        present.update(call_with_retry(index.fetch, ids=ids[i:i + 1000])["vectors"])
+    return chunk[~chunk["review_id"].astype(str).isin(present)]
+
+
+def index_batch(batch, embeddings, index, limiter, upsert_batch_size=UPSERT_BATCH_SIZE):
+    reviews = batch.to_dict("records")
+    limiter.acquire()
+    vectors = call_with_retry(embeddings.embed_documents, texts=[str(r["Review"]) for r in reviews])
+    for i in range(0, len(reviews), upsert_batch_size):
+        call_with_retry(index.upsert, vectors=[(str(r["review_id"]), v, review_metadata(r)) for r, v in
+                                               zip(reviews[i:i + upsert_batch_size], vectors[i:i + upsert_batch_size])])
+    return len(reviews)
+
+
+def index_backlog(store, embeddings, index, batch_size=128, workers=4, rate=10.0, log=print):
+    # Reviews recorded as unindexed by the submission app (queue full, or given up on after retries);
+    # each batch is cleared from the backlog once upserted, so a rerun continues with the rest
+    start = time.perf_counter()
+    backlog = store.read_unindexed()
+    limiter = RateLimiter(rate, burst=workers)
+    batches = [backlog.iloc[i:i + batch_size] for i in range(0, len(backlog), batch_size)]
+    indexed_now = 0
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(index_batch, batch, embeddings, index, limiter) for batch in batches]
+        for batch, future in zip(batches, futures):
+            indexed_now += future.result()
+            store.clear_unindexed(batch["seq"].tolist())
+            log(f"{indexed_now} of {len(backlog)} backlog reviews indexed")
+    return {
+        "mode": "backlog",
+        "indexed_this_run": indexed_now,
+        "finished": True,
+        "seconds": time.perf_counter() - start
+    }
+
+
+def reindex(store, embeddings, index, mode="full", checkpoint_path=CHECKPOINT_FILE, chunk_size=1000,
+            batch_size=128, workers=4, rate=10.0, stop_after=None, restart=False, log=print):
+    state = load_checkpoint(None if restart else checkpoint_path, mode)
+    resumed_from = state["last_seq"]
+    limiter = RateLimiter(rate, burst=workers)
+    in_flight = deque()   # (last seq covered, future) in log order
+    submitted = 0
+    start = time.perf_counter()
+    indexed_now = 0
+
+    def complete(block):
+        # Advance the checkpoint over the finished prefix of the in-flight batches
+        nonlocal indexed_now
+        while in_flight and (block or in_flight[0][1].done()):
+            end_seq, future = in_flight.popleft()
+            count = future.result()  # a batch that failed after its retries stops the run here
+            block = False
+            state["last_seq"] = end_seq
+            state["indexed"] += count
+            indexed_now += count
+            save_checkpoint(checkpoint_path, state)
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        for chunk in store.iter_chunks(chunk_size, state["last_seq"]):
+            chunk_end = int(chunk["seq"].iloc[-1])
+            todo = missing_from_index(index, chunk) if mode == "incremental" else chunk
+            state["skipped"] += len(chunk) - len(todo)
+            batches = [todo.iloc[i:i + batch_size] for i in range(0, len(todo), batch_size)]
+            if not batches:
+                done = Future()
+                done.set_result(0)
+                in_flight.append((chunk_end, done))
+            for i, batch in enumerate(batches):
+                if stop_after is not None and submitted >= stop_after:
+                    break
+                while len(in_flight) >= 2 * workers:
+                    complete(block=True)
+                end_seq = chunk_end if i == len(batches) - 1 else int(batch["seq"].iloc[-1])
+                in_flight.append((end_seq, pool.submit(index_batch, batch, embeddings, index, limiter)))
+                submitted += 1
+                complete(block=False)
+            if stop_after is not None and submitted >= stop_after:
+                break
+            elapsed = time.perf_counter() - start
+            log(f"read up to {chunk_end}, checkpoint at {state['last_seq']}: {state['indexed']} indexed, "
+                f"{state['skipped']} already present, {indexed_now / elapsed:.0f} reviews/s")
+        while in_flight:
+            complete(block=True)
+
+    finished = stop_after is None or submitted < stop_after
+    state["finished"] = finished
+    save_checkpoint(checkpoint_path, state)
+    if finished:
+        # Every review up to last_seq is in the index now, including recorded backlog entries
+        store.clear_unindexed(up_to_seq=state["last_seq"])
+    return {
+        "mode": mode,
+        "resumed_from_seq": resumed_from,
+        "last_seq": state["last_seq"],
+        "indexed_this_run": indexed_now,
+        "indexed_total": state["indexed"],
+        "already_present": state["skipped"],
+        "finished": finished,
+        "seconds": time.perf_counter() - start,
+        "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Resumable bulk (re-)indexing of the review log")
+    parser.add_argument("--mode", choices=["full", "incremental", "backlog"], default="full",
+                        help="incremental only indexes reviews whose review_id is missing from the index; "
+                             "backlog only the reviews the submission app could not index (recorded in reviews.db)")
+    parser.add_argument("--restart", action="store_true", help="ignore the checkpoint and start from the beginning")
+    parser.add_argument("--chunk-size", type=int, default=1000, help="reviews read from the log at a time")
+    parser.add_argument("--batch-size", type=int, default=128, help="reviews per embedding call")
+    parser.add_argument("--workers", type=int, default=4, help="embedding batches in flight")
+    parser.add_argument("--rate", type=float, default=10.0, help="max embedding calls per second")
+    parser.add_argument("--stop-after", type=int, help="stop after this many batches (simulates an interrupted run)")
+    parser.add_argument("--local", action="store_true",
+                        help="local stand-in embeddings and the local vector index instead of Together / Pinecone")
+    parser.add_argument("--index-dir", help="local vector index directory (with --local)")
+    parser.add_argument("--checkpoint", help="checkpoint file (default: next to the index)")
+    parser.add_argument("--no-cache", action="store_true", help="bypass the embedding cache")
+    args = parser.parse_args()
+
+    if args.local:
+        from local_services import LocalEmbeddings
+        from vector_index import VectorIndex, INDEX_DIR
+        index_dir = args.index_dir or INDEX_DIR
+        embeddings = LocalEmbeddings(call_latency=0.05, item_latency=0.001)
+        index = VectorIndex(index_dir)
+        checkpoint = args.checkpoint or os.path.join(index_dir, "reindex_checkpoint.json")
+    else:
+        from langchain_together import TogetherEmbeddings
+        from vector_index import open_index
+        embeddings = TogetherEmbeddings(model="togethercomputer/m2-bert-80M-8k-retrieval")
+        index = open_index(host=os.getenv("PINECONE_HOST"), api_key=os.getenv("PINECONE_API_KEY"))
+        checkpoint = args.checkpoint or CHECKPOINT_FILE
+    if not args.no_cache:
+        # Stand-in vectors are cached under their own model name, never under the real model's
+        embeddings = CachedEmbeddings(embeddings, model="local-stand-in" if args.local else None)
+
+    if args.mode == "backlog":
+        summary = index_backlog(ReviewStore(), embeddings, index, args.batch_size, args.workers, args.rate)
+    else:
+        summary = reindex(ReviewStore(), embeddings, index, args.mode, checkpoint, args.chunk_size, args.batch_size,
+                          args.workers, args.rate, args.stop_after, args.restart)
+    print(json.dumps(summary, indent=2))
+    if hasattr(embeddings, "stats"):
+        print(f"Embedding cache: {json.dumps(embeddings.stats())}")
+
+
+if __name__ == "__main__":
+    main()
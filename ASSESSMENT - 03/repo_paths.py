@@ -0,0 +1,11 @@
+import os
+import sys
+
+# Path setup for this folder's modules and notebooks: the repository root (shared data_access.py) and the ASSESSMENT - 02 modules reused here (email_outbox).
+# Import it before importing from those places.
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SHARED_DIRS = [ROOT_DIR, os.path.join(ROOT_DIR, "ASSESSMENT - 02")]
+
+for path in SHARED_DIRS:
+    if path not in sys.path:
+        sys.path.append(path)
@@ -0,0 +1,335 @@
+import argparse
+import bisect
+import json
+import os
+import random
+import tempfile
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+import numpy as np
+from review_store import ReviewStore
+from review_ingestion import call_with_retry
+from sentiment_scores import score_texts, save_store_scores, sentiment_label
+
+# The pooled SMTP sender of the booking emails lives in ASSESSMENT - 02
+import repo_paths
+from email_outbox import SMTPConnectionPool, SMTP_SETTINGS, build_message
+
+# Negative-review monitor: replaces the synchronous Gmail send in the submission app. It tails the
+# review log (polling on the `seq` watermark), scores new submissions, and collects negative reviews
+# from guests with a room number into one digest per room. A digest is sent `window` seconds after its
+# first review (or earlier once it holds max_digest reviews) through a pool of logged-in SMTP
+# connections. Submit-to-delivery latency goes into a histogram exported in Prometheus text format.
+# The watermark only moves past reviews whose alert was delivered, so a restart re-sends rather than
+# drops (at-least-once).
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+WATERMARK_FILE = os.path.join(BASE_DIR, ".alert_watermark.json")
+SLA_SECONDS = 300
+WINDOW_SECONDS = 60
+POLL_SECONDS = 1.0
+MAX_DIGEST = 20
+LATENCY_BUCKETS = [1, 2, 5, 10, 30, 60, 120, 300, 600]
+
+
+class LatencyHistogram:
+    # Fixed buckets (upper bounds in seconds) as in a Prometheus histogram, plus recent samples for percentiles
+
+    def __init__(self, buckets=LATENCY_BUCKETS, name="review_alert_delivery_seconds"):
+        self.buckets = list(buckets)
+        self.name = name
+        self.lock = threading.Lock()
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.total = 0.0
+        self.samples = []
+
+    def observe(self, seconds):
+        with self.lock:
+            self.counts[bisect.bisect_left(self.buckets, seconds)] += 1
+            self.total += seconds
+            self.samples.append(seconds)
+            if len(self.samples) > 10000:
+                del self.samples[:5000]
+
+    def percentile(self, q):
+        with self.lock:
+            return float(np.percentile(self.samples, q)) if self.samples else 0.0
+
+    def exposition(self):
+        # Prometheus text format: cumulative bucket counts, sum and count
+        with self.lock:
+            lines = [f"# TYPE {self.name} histogram"]
+            cumulative = 0
+            for bound, count in zip(self.buckets + ["+Inf"], self.counts):
+                cumulative += count
+                lines.append(f'{self.name}_bucket{{le="{bound}"}} {cumulative}')
+            lines.append(f"{self.name}_sum {self.total:.3f}")
+            lines.append(f"{self.name}_count {cumulative}")
+        return "\n".join(lines) + "\n"
+
+
+class ReviewAlertMonitor:
+
+    def __init__(self, store, pool=None, recipient=None, sender=None, window=WINDOW_SECONDS,
+                 poll_interval=POLL_SECONDS, max_digest=MAX_DIGEST, threads=2, sla=SLA_SECONDS,
+                 watermark_path=WATERMARK_FILE):
+        self.store = store
+        self.pool = pool or SMTPConnectionPool(size=threads)
+        self.sender = sender or SMTP_SETTINGS["user"]
+        self.recipient = recipient or self.sender
+        self.window = window
+        self.poll_interval = poll_interval
+        self.max_digest = max_digest
+        self.sla = sla
+        self.watermark_path = watermark_path
+        self.senders = ThreadPoolExecutor(max_workers=threads)
+        self.histogram = LatencyHistogram()
+        self.stop_event = threading.Event()
+        self.lock = threading.Lock()
+        # Serializes watermark writes between the sender threads and the poll loop
+        self.watermark_lock = threading.Lock()
+        self.worker = None
+        self.digests = defaultdict(list)   # room -> alerts waiting for their window
+        self.opened = {}                    # room -> when its digest started
+        self.undelivered = set()            # seqs of alerts not delivered yet
+        self.seen_seq = self.load_watermark()
+        self.committed_seq = self.seen_seq
+        self.reviews = 0
+        self.alerts = 0
+        self.digests_sent = 0
+        self.send_failures = 0
+        self.sla_breaches = 0
+
+    def load_watermark(self):
+        if self.watermark_path and os.path.exists(self.watermark_path):
+            with open(self.watermark_path) as f:
+                return json.load(f)["seq"]
+        # First run: only reviews submitted from now on
+        return self.store.last_seq()
+
+    def commit_watermark(self):
+        # Everything up to the oldest undelivered alert is done; the watermark only moves forward
+        with self.watermark_lock:
+            with self.lock:
+                seq = min(self.undelivered) - 1 if self.undelivered else self.seen_seq
+                if seq <= self.committed_seq:
+                    return
+            if self.watermark_path:
+                fd, tmp = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(self.watermark_path)),
+                                           suffix=".tmp")
+                try:
+                    with os.fdopen(fd, "w") as f:
+                        json.dump({"seq": seq, "updated_at": datetime.now().isoformat()}, f)
+                    os.replace(tmp, self.watermark_path)
+                except Exception:
+                    if os.path.exists(tmp):
+                        os.remove(tmp)
+                    raise
+            with self.lock:
+                self.committed_seq = seq
+
+    def poll(self):
+        # Read and score the submissions after the watermark; returns how many were read
+        reviews = self.store.read_submissions(self.seen_seq)
+        if not reviews:
+            return 0
+        scores = score_texts([review["Review"] for review in reviews])
+        save_store_scores(self.store, [r["seq"] for r in reviews], [r["Review"] for r in reviews], scores)
+        now = time.monotonic()
+        with self.lock:
+            for review, score in zip(reviews, scores):
+                if sentiment_label(score) != "Negative" or not review["room_number"]:
+                    continue
+                room = str(review["room_number"])
+                self.digests[room].append(dict(review, sentiment_score=score))
+                self.opened.setdefault(room, now)
+                self.undelivered.add(review["seq"])
+                self.alerts += 1
+            self.reviews += len(reviews)
+            self.seen_seq = reviews[-1]["seq"]
+        return len(reviews)
+
+    def flush_due(self, force=False):
+        now = time.monotonic()
+        with self.lock:
+            due = [room for room, alerts in self.digests.items()
+                   if force or len(alerts) >= self.max_digest or now - self.opened[room] >= self.window]
+            batches = [(room, self.digests.pop(room)) for room in due]
+            for room in due:
+                del self.opened[room]
+        for room, alerts in batches:
+            self.senders.submit(self.deliver, room, alerts)
+
+    def digest_message(self, room, alerts):
+        subject = (f"Negative Review Alert 🚨 Room {room}" if len(alerts) == 1 else
+                   f"Negative Review Alert 🚨 Room {room} ({len(alerts)} reviews)")
+        body = "\n\n".join(
+            f"Room Number: {room}\nReview ID: {a['review_id']}\nSubmitted: {a['review_date']}\n"
+            f"Rating: {a['Rating']:g}\nReview: {a['Review']}\nSentiment Score: {a['sentiment_score']:.3f}"
+            for a in alerts)
+        return build_message({"sender": self.sender, "to": self.recipient, "subject": subject, "body": body})
+
+    def deliver(self, room, alerts):
+        try:
+            call_with_retry(self.pool.send, sender=self.sender, to=self.recipient,
+                            message=self.digest_message(room, alerts))
+        except Exception:
+            # Keep the alerts: they go out with the room's next digest
+            with self.lock:
+                self.send_failures += 1
+                self.digests[room] = alerts + self.digests[room]
+                self.opened.setdefault(room, time.monotonic())
+            return
+        delivered = time.time()
+        for alert in alerts:
+            latency = delivered - alert["submitted_at"]
+            self.histogram.observe(latency)
+            if latency > self.sla:
+                with self.lock:
+                    self.sla_breaches += 1
+        with self.lock:
+            self.digests_sent += 1
+            self.undelivered.difference_update(alert["seq"] for alert in alerts)
+        self.commit_watermark()
+
+    def run(self):
+        while not self.stop_event.is_set():
+            try:
+                read = self.poll()
+            except Exception:
+                read = 0  # e.g. the database is locked for longer than the timeout; try again next poll
+            try:
+                self.flush_due()
+                self.commit_watermark()
+            except Exception:
+                pass  # e.g. the watermark file could not be written; retried after the next poll
+            if not read:
+                self.stop_event.wait(self.poll_interval)
+
+    def start(self):
+        self.worker = threading.Thread(target=self.run, daemon=True)
+        self.worker.start()
+        return self
+
+    def stop(self, flush=True):
+        self.stop_event.set()
+        if self.worker:
+            self.worker.join()
+        if flush:
+            self.poll()
+            self.flush_due(force=True)
+        self.senders.shutdown(wait=True)
+        self.commit_watermark()
+        self.pool.close()
+
+    def stats(self):
+        with self.lock:
+            stats = {
+                "watermark": self.committed_seq,
+                "reviews": self.reviews,
+                "alerts": self.alerts,
+                "waiting": sum(len(alerts) for alerts in self.digests.values()),
+                "digests_sent": self.digests_sent,
+                "send_failures": self.send_failures,
+                "sla_breaches": self.sla_breaches
+            }
+        stats.update({f"latency_p{q}": self.histogram.percentile(q) for q in (50, 95, 99)})
+        return stats
+
+    def metrics(self):
+        stats = self.stats()
+        lines = [self.histogram.exposition()]
+        for name in ("reviews", "alerts", "digests_sent", "send_failures", "sla_breaches"):
+            lines.append(f"# TYPE review_alert_{name}_total counter\nreview_alert_{name}_total {stats[name]}\n")
+        lines.append(f"# TYPE review_alert_waiting gauge\nreview_alert_waiting {stats['waiting']}\n")
+        return "".join(lines)
+
+
+def write_metrics(path, text):
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "w") as f:
+        f.write(text)
+    os.replace(tmp, path)
+
+
+def benchmark(reviews_file, n_reviews=3000, rate=100.0, rooms=40, window=5.0, smtp_delay=0.05, threads=2):
+    from local_services import LocalSMTPServer
+    from data_access import read_table
+    import smtplib
+    texts = read_table(reviews_file)["Review"].astype(str).tolist()
+    rng = random.Random(0)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        store = ReviewStore(os.path.join(tmp, "reviews.db"), seed_file=None)
+        smtp = LocalSMTPServer(delay=smtp_delay)
+        settings = smtp.settings()
+
+        # Old path: one SMTP session (connect, EHLO, send, quit) per alert, inside the submit handler
+        old = []
+        for _ in range(20):
+            start = time.perf_counter()
+            with smtplib.SMTP(settings["host"], settings["port"]) as server:
+                server.sendmail("alerts@hotel", "manager@hotel", "Subject: alert\n\nreview")
+            old.append(time.perf_counter() - start)
+        print(f"Old path: {np.mean(old) * 1000:.0f} ms of SMTP per negative review, added to the guest's submit")
+        smtp.connections = smtp.messages = 0
+
+        monitor = ReviewAlertMonitor(store, SMTPConnectionPool(settings, size=threads), "manager@hotel",
+                                     "alerts@hotel", window=window, poll_interval=0.2, threads=threads,
+                                     watermark_path=os.path.join(tmp, "watermark.json")).start()
+        start = time.perf_counter()
+        for i in range(n_reviews):
+            wait = start + i / rate - time.perf_counter()
+            if wait > 0:
+                time.sleep(wait)
+            room = str(rng.randint(101, 100 + rooms)) if rng.random() < 0.6 else None
+            store.append(rng.randint(1000, 9999), rng.choice(texts), rng.randint(1, 10), room_number=room)
+        monitor.stop()
+        stats = monitor.stats()
+        print(f"Monitor: {n_reviews} reviews at {rate:.0f}/s, {rooms} rooms, {window:.0f}s digest window")
+        print(f"  {stats['alerts']} negative reviews with a room -> {stats['digests_sent']} digests, "
+              f"{smtp.messages} emails over {smtp.connections} SMTP connections (old path: "
+              f"{stats['alerts']} emails, {stats['alerts']} connections)")
+        print(f"  submit-to-delivery p50 {stats['latency_p50']:.1f}s, p95 {stats['latency_p95']:.1f}s, "
+              f"p99 {stats['latency_p99']:.1f}s, SLA ({SLA_SECONDS}s) breaches {stats['sla_breaches']}")
+        print(monitor.histogram.exposition(), end="")
+        smtp.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Negative-review alert monitor")
+    parser.add_argument("--recipient", default=os.environ.get("ALERT_RECIPIENT"), help="manager email address")
+    parser.add_argument("--window", type=float, default=WINDOW_SECONDS, help="seconds to collect a room's digest")
+    parser.add_argument("--poll-interval", type=float, default=POLL_SECONDS)
+    parser.add_argument("--threads", type=int, default=2, help="SMTP connections / sender threads")
+    parser.add_argument("--metrics-file", default=os.path.join(BASE_DIR, "review_alert_metrics.prom"),
+                        help="Prometheus text file (e.g. for the node_exporter textfile collector)")
+    parser.add_argument("--local-smtp", action="store_true", help="send to a local SMTP stand-in instead")
+    parser.add_argument("--benchmark", action="store_true", help="burst of reviews against local stand-ins")
+    parser.add_argument("--reviews-file", default=os.path.join(BASE_DIR, "reviews_data.xlsx"))
+    args = parser.parse_args()
+
+    if args.benchmark:
+        benchmark(args.reviews_file)
+        return
+    pool = None
+    if args.local_smtp:
+        from local_services import LocalSMTPServer
+        pool = SMTPConnectionPool(LocalSMTPServer().settings(), size=args.threads)
+    monitor = ReviewAlertMonitor(ReviewStore(), pool, args.recipient, window=args.window,
+                                 poll_interval=args.poll_interval, threads=args.threads).start()
+    try:
+        while True:
+            time.sleep(10)
+            write_metrics(args.metrics_file, monitor.metrics())
+            print(monitor.stats())
+    except KeyboardInterrupt:
+        monitor.stop()
+        write_metrics(args.metrics_file, monitor.metrics())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,285 @@
+import argparse
+import os
+import queue
+import random
+import threading
+import time
+from collections import deque
+import numpy as np
+from local_services import LocalEmbeddings, LocalIndex
+
+import repo_paths
+from data_access import read_table
+
+# Background indexing of submitted reviews. `submit` only enqueues, so the guest never waits on the
+# embedding API or the vector index. One thread embeds reviews in batches (up to EMBED_BATCH_SIZE, or
+# whatever arrived within MAX_WAIT seconds), another upserts the vectors in chunks of UPSERT_BATCH_SIZE,
+# so embedding the next batch overlaps with upserting the previous one.
+
+EMBED_BATCH_SIZE = 128
+UPSERT_BATCH_SIZE = 100
+MAX_WAIT = 0.5
+MAX_QUEUE = 1000
+MAX_ATTEMPTS = 5
+BACKOFF_SECONDS = 0.2
+
+
+def review_metadata(review):
+    # Same metadata as vector_db_creation_RAG.ipynb, so its Rating / review_date filters keep working
+    return {
+        "customer_id": int(review["customer_id"]),
+        "review_date": int(review["review_date_numeric"]),
+        "Rating": int(review["Rating"]),
+        "review_id": int(review["review_id"])
+    }
+
+
+def call_with_retry(fn, max_attempts=MAX_ATTEMPTS, backoff_seconds=BACKOFF_SECONDS, on_retry=None, **kwargs):
+    # Exponential backoff with jitter; the last error is raised after max_attempts
+    for attempt in range(1, max_attempts + 1):
+        try:
+            return fn(**kwargs)
+        except Exception:
+            if attempt == max_attempts:
+                raise
+            if on_retry:
+                on_retry()
+            time.sleep(backoff_seconds * (2 ** (attempt - 1)) * (0.5 + random.random()))
+
+
+class IngestionPipeline:
+
+    def __init__(self, embeddings, index, embed_batch_size=EMBED_BATCH_SIZE, upsert_batch_size=UPSERT_BATCH_SIZE,
+                 max_wait=MAX_WAIT, max_queue=MAX_QUEUE, submit_timeout=1.0, max_attempts=MAX_ATTEMPTS,
+                 backoff_seconds=BACKOFF_SECONDS, on_indexed=None, on_failed=None):
+        self.embeddings = embeddings
+        self.index = index
+        # Called with the vectors of every upserted chunk (e.g. AnswerCache.invalidate_for_reviews)
+        self.on_indexed = on_indexed
+        # Called with the reviews given up on after their retries (e.g. ReviewStore.mark_unindexed)
+        self.on_failed = on_failed
+        self.embed_batch_size = embed_batch_size
+        self.upsert_batch_size = upsert_batch_size
+        self.max_wait = max_wait
+        self.submit_timeout = submit_timeout
+        self.max_attempts = max_attempts
+        self.backoff_seconds = backoff_seconds
+        # Both queues are bounded: a slow index backs up into the embedder, and a full review
+        # queue makes `submit` wait (then refuse) instead of growing memory without limit
+        self.pending = queue.Queue(maxsize=max_queue)
+        self.embedded = queue.Queue(maxsize=4)
+        self.stop_event = threading.Event()
+        self.lock = threading.Lock()
+        self.workers = []
+        self.lags = deque(maxlen=1000)
+        self.batch_sizes = deque(maxlen=1000)
+        self.failed_ids = deque(maxlen=1000)
+        self.submitted = 0
+        self.rejected = 0
+        self.indexed = 0
+        self.failed = 0
+        self.retries = 0
+
+    def submit(self, review):
+        # Returns as soon as the review is queued; raises queue.Full if the queue stays full for submit_timeout
+        try:
+            self.pending.put((review, time.monotonic()), timeout=self.submit_timeout)
+        except queue.Full:
+            with self.lock:
+                self.rejected += 1
+            raise
+        with self.lock:
+            self.submitted += 1
+
+    def collect(self):
+        # Wait briefly for the first review, then take whatever else arrives inside the window
+        try:
+            batch = [self.pending.get(timeout=0.1)]
+        except queue.Empty:
+            return []
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.embed_batch_size:
+            timeout = deadline - time.monotonic()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(self.pending.get(timeout=timeout))
+            except queue.Empty:
+                break
+        return batch
+
+    def count_retry(self):
+        with self.lock:
+            self.retries += 1
+
+    def call_with_retry(self, fn, **kwargs):
+        return call_with_retry(fn, self.max_attempts, self.backoff_seconds, self.count_retry, **kwargs)
+
+    def give_up(self, batch):
+        with self.lock:
+            self.failed += len(batch)
+            self.failed_ids.extend(int(review["review_id"]) for review, _ in batch)
+        if self.on_failed:
+            try:
+                self.on_failed([review for review, _ in batch])
+            except Exception:
+                pass  # never stalls indexing
+
+    def embed_loop(self):
+        while not (self.stop_event.is_set() and self.pending.empty()):
+            batch = self.collect()
+            if not batch:
+                continue
+            try:
+                vectors = self.call_with_retry(self.embeddings.embed_documents,
+                                               texts=[str(review["Review"]) for review, _ in batch])
+            except Exception:
+                self.give_up(batch)
+                continue
+            self.batch_sizes.append(len(batch))
+            self.embedded.put(list(zip(batch, vectors)))
+        self.embedded.put(None)  # tells the upserter the embedder is done
+
+    def upsert_loop(self):
+        while True:
+            items = self.embedded.get()
+            if items is None:
+                return
+            for start in range(0, len(items), self.upsert_batch_size):
+                chunk = items[start:start + self.upsert_batch_size]
+                vectors = [(str(review["review_id"]), vector, review_metadata(review))
+                           for (review, _), vector in chunk]
+                try:
+                    self.call_with_retry(self.index.upsert, vectors=vectors)
+                except Exception:
+                    self.give_up([entry for entry, _ in chunk])
+                    continue
+                done = time.monotonic()
+                with self.lock:
+                    self.indexed += len(chunk)
+                    self.lags.extend(done - queued_at for (_, queued_at), _ in chunk)
+                if self.on_indexed:
+                    try:
+                        self.on_indexed([vector for _, vector in chunk])
+                    except Exception:
+                        pass  # never stalls indexing
+
+    def start(self):
+        for target in (self.embed_loop, self.upsert_loop):
+            worker = threading.Thread(target=target, daemon=True)
+            worker.start()
+            self.workers.append(worker)
+        return self
+
+    def flush(self, timeout=None):
+        # Wait until every submitted review is indexed or given up on; False on timeout
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            with self.lock:
+                if self.indexed + self.failed >= self.submitted:
+                    return True
+            if deadline is not None and time.monotonic() > deadline:
+                return False
+            time.sleep(0.01)
+
+    def stop(self, timeout=30):
+        self.flush(timeout)
+        self.stop_event.set()
+        for worker in self.workers:
+            worker.join()
+
+    def stats(self):
+        lags = np.array(self.lags)
+        with self.lock:
+            return {
+                "queue_depth": self.pending.qsize(),
+                "submitted": self.submitted,
+                "indexed": self.indexed,
+                "failed": self.failed,
+                "rejected": self.rejected,
+                "retries": self.retries,
+                "avg_batch_size": float(np.mean(self.batch_sizes)) if self.batch_sizes else 0.0,
+                "lag_p50": float(np.percentile(lags, 50)) if len(lags) else 0.0,
+                "lag_p95": float(np.percentile(lags, 95)) if len(lags) else 0.0,
+                "lag_max": float(lags.max()) if len(lags) else 0.0
+            }
+
+
+def local_services(embed_latency=0.05, embed_item_latency=0.001, upsert_latency=0.02, upsert_item_latency=0.0002,
+                   failure_rate=0.05):
+    # Stand-ins with round-trip costs in the range of the hosted services
+    embeddings = LocalEmbeddings(call_latency=embed_latency, item_latency=embed_item_latency,
+                                 failure_rate=failure_rate, seed=1)
+    index = LocalIndex(call_latency=upsert_latency, item_latency=upsert_item_latency,
+                       failure_rate=failure_rate, seed=2)
+    return embeddings, index
+
+
+def synchronous_submit(reviews, embeddings, index):
+    # The current request path: one embed_query + one single-vector upsert per review, while the guest waits
+    timings = []
+    for review in reviews:
+        start = time.perf_counter()
+        for attempt in range(MAX_ATTEMPTS):
+            try:
+                vector = embeddings.embed_query(str(review["Review"]))
+                index.upsert(vectors=[(str(review["review_id"]), vector, review_metadata(review))])
+                break
+            except Exception:
+                time.sleep(BACKOFF_SECONDS * (2 ** attempt))
+        timings.append(time.perf_counter() - start)
+    return np.array(timings)
+
+
+def benchmark(reviews_file, n_sync=100, n_async=3000, rate=500.0, max_queue=MAX_QUEUE):
+    reviews = read_table(reviews_file).head(max(n_sync, n_async)).to_dict("records")
+
+    embeddings, index = local_services()
+    start = time.perf_counter()
+    timings = synchronous_submit(reviews[:n_sync], embeddings, index)
+    sync_seconds = time.perf_counter() - start
+    print(f"Synchronous ({n_sync} reviews): submit p50 {np.percentile(timings, 50) * 1000:.1f} ms, "
+          f"p95 {np.percentile(timings, 95) * 1000:.1f} ms, {n_sync / sync_seconds:.0f} reviews/s, "
+          f"{embeddings.calls + index.calls} service calls")
+
+    # Open-loop arrivals at `rate` reviews/s
+    embeddings, index = local_services()
+    pipeline = IngestionPipeline(embeddings, index, max_queue=max_queue).start()
+    submit_timings = []
+    start = time.perf_counter()
+    for i, review in enumerate(reviews[:n_async]):
+        wait = start + i / rate - time.perf_counter()
+        if wait > 0:
+            time.sleep(wait)
+        t0 = time.perf_counter()
+        try:
+            pipeline.submit(review)
+        except queue.Full:
+            pass
+        submit_timings.append(time.perf_counter() - t0)
+    pipeline.stop()
+    async_seconds = time.perf_counter() - start
+    stats = pipeline.stats()
+    print(f"Pipeline ({n_async} reviews at {rate:.0f}/s): submit p50 {np.percentile(submit_timings, 50) * 1e6:.0f} us, "
+          f"p99 {np.percentile(submit_timings, 99) * 1e6:.0f} us, max {max(submit_timings) * 1000:.0f} ms, {stats['indexed'] / async_seconds:.0f} reviews/s, "
+          f"{embeddings.calls + index.calls} service calls")
+    print(f"  indexed {stats['indexed']}, failed {stats['failed']}, rejected {stats['rejected']}, "
+          f"retries {stats['retries']}, avg embed batch {stats['avg_batch_size']:.0f}")
+    print(f"  indexing lag p50 {stats['lag_p50']:.2f}s, p95 {stats['lag_p95']:.2f}s, max {stats['lag_max']:.2f}s")
+    print(f"  index holds {index.describe_index_stats()['total_vector_count']} vectors")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark review ingestion against local service stand-ins")
+    parser.add_argument("--reviews-file", default=os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                                               "reviews_data.xlsx"))
+    parser.add_argument("--sync-reviews", type=int, default=100)
+    parser.add_argument("--reviews", type=int, default=3000)
+    parser.add_argument("--rate", type=float, default=500.0, help="review arrivals per second for the pipeline")
+    parser.add_argument("--max-queue", type=int, default=MAX_QUEUE)
+    args = parser.parse_args()
+    benchmark(args.reviews_file, args.sync_reviews, args.reviews, args.rate, args.max_queue)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,283 @@
+import argparse
+import os
+import sqlite3
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import closing
+from datetime import datetime
+import numpy as np
+import pandas as pd
+
+import repo_paths
+from data_access import read_table, write_columnar, source_stamp
+
+# Append-only review log in SQLite (WAL mode). A submission is one small INSERT, so its cost does not
+# grow with the number of reviews, and review IDs are assigned inside the write transaction, so
+# concurrent sessions never lose or duplicate each other's reviews. reviews_data.xlsx is no longer
+# written per review: it is an export produced on demand by `export_excel` (compaction).
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+DB_FILE = os.path.join(BASE_DIR, "reviews.db")
+XLSX_FILE = os.path.join(BASE_DIR, "reviews_data.xlsx")
+REVIEW_COLUMNS = ["review_id", "customer_id", "review_date", "Review", "Rating", "review_date_numeric"]
+# Not in the xlsx: set for reviews submitted through the app (used by the negative-review monitor)
+SUBMISSION_COLUMNS = {"room_number": "TEXT", "submitted_at": "REAL"}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS reviews (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    review_id INTEGER NOT NULL,
+    customer_id INTEGER,
+    review_date TEXT,
+    Review TEXT,
+    Rating REAL,
+    review_date_numeric INTEGER,
+    room_number TEXT,
+    submitted_at REAL
+);
+CREATE INDEX IF NOT EXISTS reviews_review_id ON reviews (review_id);
+CREATE TABLE IF NOT EXISTS review_sentiment (
+    seq INTEGER PRIMARY KEY REFERENCES reviews (seq),
+    text_hash TEXT NOT NULL,
+    scorer TEXT NOT NULL,
+    sentiment_score REAL NOT NULL,
+    sentiment_label TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS unindexed_reviews (
+    seq INTEGER PRIMARY KEY REFERENCES reviews (seq),
+    reason TEXT NOT NULL,
+    recorded_at REAL NOT NULL
+);
+"""
+
+
+def restore_types(df):
+    # Rating is a REAL column, so integer ratings (the app's 1-10 slider) come back as floats; return them as
+    # integers when every rating is whole, so an export keeps the xlsx's column type
+    if "Rating" in df and len(df) and df["Rating"].notna().all() and (df["Rating"] % 1 == 0).all():
+        df["Rating"] = df["Rating"].astype("int64")
+    return df
+
+
+def rating_value(rating):
+    rating = float(rating)
+    return int(rating) if rating.is_integer() else rating
+
+
+class ReviewStore:
+    # `seq` is the log position (strictly increasing, never reused); `review_id` is the public ID.
+    # The imported history keeps its original IDs (a few are duplicated); new reviews get max + 1.
+
+    def __init__(self, db_path=DB_FILE, seed_file=XLSX_FILE):
+        self.db_path = db_path
+        self.seed_file = seed_file
+        self.initialize()
+
+    def connect(self):
+        # One short-lived connection per operation: safe across Streamlit's session threads and processes
+        conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    def initialize(self):
+        with closing(self.connect()) as conn:
+            conn.executescript(SCHEMA)
+            # Logs created before the submission columns existed
+            existing = {row[1] for row in conn.execute("PRAGMA table_info(reviews)")}
+            for column, column_type in SUBMISSION_COLUMNS.items():
+                if column not in existing:
+                    try:
+                        conn.execute(f"ALTER TABLE reviews ADD COLUMN {column} {column_type}")
+                    except sqlite3.OperationalError:
+                        pass  # added by another process in the meantime
+            if conn.execute("SELECT EXISTS (SELECT 1 FROM reviews)").fetchone()[0]:
+                return
+            if not (self.seed_file and os.path.exists(self.seed_file)):
+                return
+            history = read_table(self.seed_file)
+            conn.execute("BEGIN IMMEDIATE")
+            # Another process may have imported while we were reading the xlsx
+            if conn.execute("SELECT EXISTS (SELECT 1 FROM reviews)").fetchone()[0]:
+                conn.execute("ROLLBACK")
+                return
+            conn.executemany(
+                f"INSERT INTO reviews ({', '.join(REVIEW_COLUMNS)}) VALUES (?, ?, ?, ?, ?, ?)",
+                history[REVIEW_COLUMNS].astype(object).itertuples(index=False, name=None))
+            conn.execute("COMMIT")
+
+    def append(self, customer_id, review, rating, review_date=None, review_date_numeric=None, room_number=None):
+        # Atomic: the ID is taken and the row written under SQLite's write lock
+        submitted_at = time.time()
+        now = datetime.fromtimestamp(submitted_at)
+        review_date = review_date or now.strftime("%Y-%m-%d %H:%M:%S")
+        review_date_numeric = review_date_numeric or int(now.timestamp())
+        with closing(self.connect()) as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                review_id = conn.execute("SELECT COALESCE(MAX(review_id), 0) + 1 FROM reviews").fetchone()[0]
+                cursor = conn.execute(
+                    f"INSERT INTO reviews ({', '.join(REVIEW_COLUMNS + list(SUBMISSION_COLUMNS))}) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                    (review_id, int(customer_id), review_date, review, rating_value(rating), review_date_numeric,
+                     room_number or None, submitted_at))
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+        return {"seq": cursor.lastrowid, "review_id": review_id, "customer_id": int(customer_id),
+                "review_date": review_date, "Review": review, "Rating": rating_value(rating),
+                "review_date_numeric": review_date_numeric, "room_number": room_number or None,
+                "submitted_at": submitted_at}
+
+    def count(self):
+        with closing(self.connect()) as conn:
+            return conn.execute("SELECT COUNT(*) FROM reviews").fetchone()[0]
+
+    def last_seq(self):
+        with closing(self.connect()) as conn:
+            return conn.execute("SELECT COALESCE(MAX(seq), 0) FROM reviews").fetchone()[0]
+
+    def read_frame(self, since_seq=0, include_seq=False, with_sentiment=False):
+        # Reviews in log order; `since_seq` returns only those appended after that position.
+        # `with_sentiment` adds the stored sentiment_score / sentiment_label (empty until scored)
+        columns = [f"r.{c}" for c in (["seq"] if include_seq else []) + REVIEW_COLUMNS]
+        join = ""
+        if with_sentiment:
+            columns += ["s.sentiment_score", "s.sentiment_label"]
+            join = "LEFT JOIN review_sentiment s ON s.seq = r.seq"
+        with closing(self.connect()) as conn:
+            df = pd.read_sql_query(f"SELECT {', '.join(columns)} FROM reviews r {join} WHERE r.seq > ? ORDER BY r.seq",
+                                   conn, params=(since_seq,))
+        return restore_types(df)
+
+    def iter_chunks(self, chunk_size=1000, since_seq=0):
+        # Reviews in log order, chunk_size at a time (keyset pagination: memory stays flat for any log size)
+        columns = ", ".join(["seq"] + REVIEW_COLUMNS)
+        while True:
+            with closing(self.connect()) as conn:
+                chunk = pd.read_sql_query(f"SELECT {columns} FROM reviews WHERE seq > ? ORDER BY seq LIMIT ?",
+                                          conn, params=(since_seq, chunk_size))
+            if chunk.empty:
+                return
+            yield restore_types(chunk)
+            since_seq = int(chunk["seq"].iloc[-1])
+
+    def read_submissions(self, since_seq=0, limit=1000):
+        # Tail of the log for the monitor: reviews submitted through the app after `since_seq`, as dicts
+        columns = ["seq"] + REVIEW_COLUMNS + list(SUBMISSION_COLUMNS)
+        with closing(self.connect()) as conn:
+            rows = conn.execute(f"SELECT {', '.join(columns)} FROM reviews "
+                                "WHERE seq > ? AND submitted_at IS NOT NULL ORDER BY seq LIMIT ?",
+                                (since_seq, limit)).fetchall()
+        return [dict(zip(columns, row)) for row in rows]
+
+    def mark_unindexed(self, seqs, reason):
+        # Reviews the background indexer could not take (queue full) or gave up on; indexed later by
+        # `reindex_reviews.py --mode backlog`
+        with closing(self.connect()) as conn:
+            conn.executemany("INSERT OR REPLACE INTO unindexed_reviews (seq, reason, recorded_at) VALUES (?, ?, ?)",
+                             [(int(seq), reason, time.time()) for seq in seqs])
+
+    def read_unindexed(self):
+        columns = ", ".join(f"r.{c}" for c in ["seq"] + REVIEW_COLUMNS)
+        with closing(self.connect()) as conn:
+            df = pd.read_sql_query(f"SELECT {columns} FROM unindexed_reviews u JOIN reviews r ON r.seq = u.seq "
+                                   "ORDER BY r.seq", conn)
+        return restore_types(df)
+
+    def clear_unindexed(self, seqs=None, up_to_seq=None):
+        with closing(self.connect()) as conn:
+            if up_to_seq is not None:
+                conn.execute("DELETE FROM unindexed_reviews WHERE seq <= ?", (int(up_to_seq),))
+            if seqs:
+                conn.executemany("DELETE FROM unindexed_reviews WHERE seq = ?", [(int(seq),) for seq in seqs])
+
+    def export_excel(self, path=None):
+        # Compaction: fold the WAL into the database and write the whole log as the staff-facing xlsx.
+        # The xlsx is replaced atomically and its columnar copy refreshed, so readers never see a partial file.
+        path = path or self.seed_file
+        df = self.read_frame(with_sentiment=True)
+        with closing(self.connect()) as conn:
+            conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        tmp = f"{os.path.splitext(path)[0]}.{os.getpid()}.tmp.xlsx"
+        df.to_excel(tmp, index=False)
+        os.replace(tmp, path)
+        try:
+            write_columnar(df, path, source_stamp(path))
+        except OSError:
+            pass
+        return len(df)
+
+
+def _append_many(db_path, n):
+    store = ReviewStore(db_path, seed_file=None)
+    return [store.append(np.random.randint(1000, 9999), "concurrent review", 5)["review_id"] for _ in range(n)]
+
+
+def benchmark(seed_file=XLSX_FILE, sizes=(0, 20000, 100000), appends=200, writers=4):
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, "reviews.db")
+        start = time.perf_counter()
+        store = ReviewStore(db_path, seed_file)
+        print(f"Imported {store.count()} reviews from {os.path.basename(seed_file)} in {time.perf_counter() - start:.2f}s")
+
+        # Old path: concat + rewrite the whole workbook for one review
+        df = read_table(seed_file)
+        start = time.perf_counter()
+        df = pd.concat([df, df.tail(1)], ignore_index=True)
+        df.to_excel(os.path.join(tmp, "rewrite.xlsx"), index=False)
+        rewrite_ms = (time.perf_counter() - start) * 1000
+        print(f"Whole-file rewrite at {len(df)} reviews: {rewrite_ms:.0f} ms per review")
+
+        print(f"{'reviews in log':>15}{'append p50':>12}{'append p99':>12}")
+        grown = 0
+        for extra in sizes:
+            if extra > grown:
+                # Grow the log in bulk to the target size
+                filler = [(900000 + i, 1, "2025-01-01", "filler review", 5.0, 20250101) for i in range(grown, extra)]
+                with closing(store.connect()) as conn:
+                    conn.execute("BEGIN")
+                    conn.executemany(f"INSERT INTO reviews ({', '.join(REVIEW_COLUMNS)}) VALUES (?, ?, ?, ?, ?, ?)",
+                                     filler)
+                    conn.execute("COMMIT")
+                grown = extra
+            timings = []
+            for _ in range(appends):
+                start = time.perf_counter()
+                store.append(1234, "benchmark review", 7)
+                timings.append((time.perf_counter() - start) * 1000)
+            print(f"{store.count():>15}{np.percentile(timings, 50):>10.2f}ms{np.percentile(timings, 99):>10.2f}ms")
+
+        # Concurrency: several processes appending at once lose nothing and never share an ID
+        before = store.count()
+        with ProcessPoolExecutor(max_workers=writers) as pool:
+            ids = [i for batch in pool.map(_append_many, [db_path] * writers, [100] * writers) for i in batch]
+        print(f"{writers} concurrent writers x 100 appends: {store.count() - before} rows added, "
+              f"{len(set(ids))} distinct IDs")
+
+        start = time.perf_counter()
+        rows = store.export_excel(os.path.join(tmp, "export.xlsx"))
+        print(f"Excel export (compaction) of {rows} reviews: {time.perf_counter() - start:.1f}s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Append-only review store")
+    parser.add_argument("--db", default=DB_FILE)
+    parser.add_argument("--export", nargs="?", const=XLSX_FILE, help="write the review log to an xlsx file")
+    parser.add_argument("--benchmark", action="store_true", help="append latency vs log size, concurrency check")
+    args = parser.parse_args()
+
+    if args.benchmark:
+        benchmark()
+        return
+    store = ReviewStore(args.db)
+    if args.export:
+        print(f"Exported {store.export_excel(args.export)} reviews to {args.export}")
+    else:
+        print(f"{store.count()} reviews in {args.db} (last log position {store.last_seq()})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,176 @@
+import argparse
+import hashlib
+import os
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import closing
+from importlib.metadata import version
+from review_store import ReviewStore
+
+# Batch sentiment scoring for the whole review corpus. TextBlob polarity is computed in a process pool
+# (chunk_size reviews per task) and stored next to each review: in the review_sentiment table of the
+# review log (exported to reviews_data.xlsx with the reviews) and as sentiment_score / sentiment_label
+# fields in the reviews_data Mongo collection read by the dashboards. Each stored score records a hash
+# of the text and the scorer version, so later runs only score new or changed reviews.
+
+SCORER = f"textblob-{version('textblob')}"
+CHUNK_SIZE = 2000
+POSITIVE_THRESHOLD = 0.1
+LABELS = ["Positive", "Neutral", "Negative"]
+
+_analyzer = None
+
+
+def sentiment_label(score):
+    # Negative is the same rule as the manager email alert (polarity below 0)
+    if score < 0:
+        return "Negative"
+    return "Positive" if score >= POSITIVE_THRESHOLD else "Neutral"
+
+
+def text_hash(text):
+    return hashlib.sha1(str(text).encode()).hexdigest()
+
+
+def score_texts(texts):
+    # Runs in the worker processes; the analyzer (and its lexicon) is loaded once per process
+    global _analyzer
+    if _analyzer is None:
+        from textblob.en.sentiments import PatternAnalyzer
+        _analyzer = PatternAnalyzer()
+    return [float(_analyzer.analyze(str(text)).polarity) for text in texts]
+
+
+def score_chunks(chunks, workers=None):
+    # (keys, texts) chunks in -> (keys, texts, scores) out, in order, with at most 2 x workers chunks in flight
+    workers = workers or os.cpu_count() or 1
+    in_flight = deque()
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        for keys, texts in chunks:
+            if len(in_flight) >= 2 * workers:
+                done_keys, done_texts, future = in_flight.popleft()
+                yield done_keys, done_texts, future.result()
+            in_flight.append((keys, texts, pool.submit(score_texts, texts)))
+        while in_flight:
+            done_keys, done_texts, future = in_flight.popleft()
+            yield done_keys, done_texts, future.result()
+
+
+def pending_store_chunks(store, chunk_size=CHUNK_SIZE, rescore=False):
+    # Reviews in the log without a current score: never scored, scored by another scorer, or text changed
+    since_seq = 0
+    while True:
+        with closing(store.connect()) as conn:
+            conn.create_function("text_hash", 1, text_hash, deterministic=True)
+            rows = conn.execute(
+                "SELECT r.seq, r.Review FROM reviews r LEFT JOIN review_sentiment s ON s.seq = r.seq "
+                "WHERE r.seq > ? AND (? OR s.seq IS NULL OR s.scorer != ? OR s.text_hash != text_hash(r.Review)) "
+                "ORDER BY r.seq LIMIT ?", (since_seq, int(rescore), SCORER, chunk_size)).fetchall()
+        if not rows:
+            return
+        yield [seq for seq, _ in rows], [text for _, text in rows]
+        since_seq = rows[-1][0]
+
+
+def save_store_scores(store, seqs, texts, scores):
+    with closing(store.connect()) as conn:
+        conn.execute("BEGIN IMMEDIATE")
+        conn.executemany(
+            "INSERT OR REPLACE INTO review_sentiment (seq, text_hash, scorer, sentiment_score, sentiment_label) "
+            "VALUES (?, ?, ?, ?, ?)",
+            [(seq, text_hash(text), SCORER, score, sentiment_label(score)) for seq, text, score in zip(seqs, texts, scores)])
+        conn.execute("COMMIT")
+
+
+def record_sentiment(store, review, score):
+    # Score computed at submission time (Customer_Review_submission.py): store it so batch runs skip the review
+    save_store_scores(store, [review["seq"]], [review["Review"]], [score])
+
+
+def pending_mongo_chunks(collection, chunk_size=CHUNK_SIZE, rescore=False):
+    # Same rule for the Mongo collection: the stored hash / scorer is compared per document
+    ids, texts = [], []
+    for doc in collection.find({}, {"Review": 1, "sentiment_hash": 1, "sentiment_scorer": 1}):
+        text = str(doc.get("Review", ""))
+        if rescore or doc.get("sentiment_scorer") != SCORER or doc.get("sentiment_hash") != text_hash(text):
+            ids.append(doc["_id"])
+            texts.append(text)
+            if len(ids) == chunk_size:
+                yield ids, texts
+                ids, texts = [], []
+    if ids:
+        yield ids, texts
+
+
+def save_mongo_scores(collection, ids, texts, scores):
+    from pymongo import UpdateOne
+    collection.bulk_write([
+        UpdateOne({"_id": doc_id}, {"$set": {
+            "sentiment_score": score,
+            "sentiment_label": sentiment_label(score),
+            "sentiment_hash": text_hash(text),
+            "sentiment_scorer": SCORER
+        }}) for doc_id, text, score in zip(ids, texts, scores)], ordered=False)
+
+
+def run(chunks, save, workers=None, log=print):
+    workers = workers or os.cpu_count() or 1
+    start = time.perf_counter()
+    scored = 0
+    counts = dict.fromkeys(LABELS, 0)
+    for keys, texts, scores in score_chunks(chunks, workers):
+        save(keys, texts, scores)
+        scored += len(scores)
+        for score in scores:
+            counts[sentiment_label(score)] += 1
+        log(f"{scored} reviews scored")
+    seconds = time.perf_counter() - start
+    rate = scored / seconds if seconds and scored else 0.0
+    return {
+        "scored": scored,
+        "labels": counts,
+        "seconds": seconds,
+        "workers": workers,
+        "reviews_per_second": rate,
+        "reviews_per_second_per_core": rate / workers
+    }
+
+
+def score_store(store, workers=None, chunk_size=CHUNK_SIZE, rescore=False, log=print):
+    return run(pending_store_chunks(store, chunk_size, rescore),
+               lambda seqs, texts, scores: save_store_scores(store, seqs, texts, scores), workers, log)
+
+
+def score_mongo(collection, workers=None, chunk_size=CHUNK_SIZE, rescore=False, log=print):
+    collection.create_index("sentiment_label")
+    return run(pending_mongo_chunks(collection, chunk_size, rescore),
+               lambda ids, texts, scores: save_mongo_scores(collection, ids, texts, scores), workers, log)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Score review sentiment in bulk (only new or changed reviews)")
+    parser.add_argument("--target", choices=["store", "mongo", "both"], default="both",
+                        help="the review log (reviews.db / xlsx export) and/or the reviews_data Mongo collection")
+    parser.add_argument("--mongo-uri", default="mongodb://localhost:27017/")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE)
+    parser.add_argument("--rescore", action="store_true", help="score every review again")
+    parser.add_argument("--export", action="store_true", help="write reviews_data.xlsx with the scores afterwards")
+    args = parser.parse_args()
+
+    if args.target in ("store", "both"):
+        store = ReviewStore()
+        summary = score_store(store, args.workers, args.chunk_size, args.rescore)
+        print(f"Review log: {summary}")
+        if args.export:
+            print(f"Exported {store.export_excel()} reviews to {store.seed_file}")
+    if args.target in ("mongo", "both"):
+        from pymongo import MongoClient
+        collection = MongoClient(args.mongo_uri)["reviews_data"]["reviews_data"]
+        summary = score_mongo(collection, args.workers, args.chunk_size, args.rescore)
+        print(f"Mongo reviews_data: {summary}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,507 @@
+import argparse
+import fcntl
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+import numpy as np
+from local_services import check_filter, matches_filter
+
+# In-process vector index with Pinecone's upsert / query / fetch / delete / describe_index_stats calls,
+# so the apps and the notebook can run on it instead of the remote index (VECTOR_BACKEND=local).
+#   .vector_index/vectors.f32     memory-mapped float32 rows (normalized, cosine), grown by doubling
+#   .vector_index/records.jsonl   append-only {"id", "row", "metadata"} / {"id", "deleted"} log
+#   .vector_index/ivf.npz         IVF centroids and row -> list assignments (built once the index is large)
+# Queries are exact below EXACT_THRESHOLD vectors and IVF (nprobe nearest lists) above it. Several
+# processes can share the directory: writes take an flock, and every call first applies the records
+# other processes appended since it last looked.
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+INDEX_DIR = os.path.join(BASE_DIR, ".vector_index")
+DIMENSION = 768
+EXACT_THRESHOLD = 20000
+NPROBE = 8
+
+OPERATORS = {
+    "$eq": np.equal, "$ne": np.not_equal, "$gt": np.greater, "$gte": np.greater_equal,
+    "$lt": np.less, "$lte": np.less_equal
+}
+
+
+def normalize(vectors):
+    vectors = np.atleast_2d(np.asarray(vectors, dtype=np.float32))
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
+
+
+def spherical_kmeans(vectors, n_lists, iterations=10, seed=0):
+    rng = np.random.default_rng(seed)
+    centroids = vectors[rng.choice(len(vectors), n_lists, replace=False)].copy()
+    for _ in range(iterations):
+        assign = np.argmax(vectors @ centroids.T, axis=1)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assign, vectors)
+        empty = ~sums.any(axis=1)
+        # Empty lists restart from random points
+        sums[empty] = vectors[rng.choice(len(vectors), int(empty.sum()), replace=False)]
+        centroids = normalize(sums)
+    return centroids
+
+
+class VectorIndex:
+
+    def __init__(self, directory=INDEX_DIR, dimension=DIMENSION, exact_threshold=EXACT_THRESHOLD, nprobe=NPROBE):
+        self.directory = directory
+        self.dimension = dimension
+        self.exact_threshold = exact_threshold
+        self.nprobe = nprobe
+        self.lock = threading.RLock()
+        os.makedirs(directory, exist_ok=True)
+        self.vectors_path = os.path.join(directory, "vectors.f32")
+        self.records_path = os.path.join(directory, "records.jsonl")
+        self.ivf_path = os.path.join(directory, "ivf.npz")
+        self.lock_path = os.path.join(directory, "lock")
+
+        self.ids = []           # row -> id (None once deleted)
+        self.rows = {}          # id -> row
+        self.metadata = []      # row -> dict
+        self.columns = {}       # numeric metadata field -> float64 array over rows (NaN = absent)
+        self.live = np.zeros(0, dtype=bool)
+        self.log_lines = 0
+        self.records_offset = 0
+        capacity = os.path.getsize(self.vectors_path) // (4 * dimension) if os.path.exists(self.vectors_path) else 0
+        self.vectors = None
+        self.map_vectors(max(capacity, 1024))
+        touched = self.replay()
+
+        self.centroids = None
+        self.assign = np.full(len(self.ids), -1, dtype=np.int32)
+        self.lists = None
+        self.ivf_mtime = None
+        self.load_ivf(touched)
+
+    @contextmanager
+    def file_lock(self):
+        with open(self.lock_path, "a") as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    def load_ivf(self, touched=()):
+        if not os.path.exists(self.ivf_path):
+            return
+        self.ivf_mtime = os.path.getmtime(self.ivf_path)
+        with np.load(self.ivf_path) as ivf:
+            self.centroids = ivf["centroids"]
+            saved = ivf["assign"][:len(self.ids)]
+            snapshot_lines = int(ivf["log_lines"])
+        self.assign = np.full(len(self.ids), -1, dtype=np.int32)
+        self.assign[:len(saved)] = saved
+        # Rows written after the IVF snapshot, or never assigned, are (re)assigned now
+        stale = {row for line, row in touched if line >= snapshot_lines}
+        stale.update(row for row in self.rows.values() if self.assign[row] < 0)
+        if stale:
+            self.assign_rows(np.array(sorted(stale)))
+        self.lists = None
+
+    def map_vectors(self, capacity):
+        # (Re)map the vector file with room for `capacity` rows; extending the file keeps existing rows
+        if self.vectors is not None:
+            self.vectors.flush()
+            del self.vectors
+        size = capacity * self.dimension * 4
+        with open(self.vectors_path, "ab") as f:
+            if f.tell() < size:
+                f.truncate(size)
+        self.vectors = np.memmap(self.vectors_path, dtype=np.float32, mode="r+", shape=(capacity, self.dimension))
+        for field, values in self.columns.items():
+            if len(values) < capacity:
+                self.columns[field] = np.concatenate([values, np.full(capacity - len(values), np.nan)])
+        if len(self.live) < capacity:
+            self.live = np.concatenate([self.live, np.zeros(capacity - len(self.live), dtype=bool)])
+
+    def read_records(self):
+        # Complete records appended to the log since records_offset (a torn final line is left for later)
+        if not os.path.exists(self.records_path):
+            return []
+        with open(self.records_path, "rb") as f:
+            f.seek(self.records_offset)
+            data = f.read()
+        complete = data.rfind(b"\n") + 1
+        self.records_offset += complete
+        return [json.loads(line) for line in data[:complete].splitlines()]
+
+    def sync(self):
+        # Apply records written by other processes; cheap (one stat) when nothing changed
+        if os.path.exists(self.records_path) and os.path.getsize(self.records_path) > self.records_offset:
+            touched = []
+            for record in self.read_records():
+                self.log_lines += 1
+                if record.get("deleted"):
+                    self.remove(record["id"])
+                    continue
+                if record["row"] >= len(self.vectors):
+                    self.map_vectors(os.path.getsize(self.vectors_path) // (4 * self.dimension))
+                self.place(record["id"], record["row"], record["metadata"])
+                touched.append(record["row"])
+            if len(self.assign) < len(self.ids):
+                self.assign = np.concatenate([self.assign, np.full(len(self.ids) - len(self.assign), -1, np.int32)])
+            if self.centroids is not None and touched:
+                self.assign_rows(np.unique(touched))
+        if os.path.exists(self.ivf_path) and os.path.getmtime(self.ivf_path) != self.ivf_mtime:
+            self.load_ivf()
+
+    def replay(self):
+        # Rebuild ids / metadata from the record log (last record per id wins); returns (line, row) per upsert
+        touched = []
+        if not os.path.exists(self.records_path):
+            return touched
+        latest = {}
+        for line_no, record in enumerate(self.read_records()):
+            latest.pop(record["id"], None)  # re-insert so dict order follows the latest write
+            latest[record["id"]] = record
+            if not record.get("deleted"):
+                touched.append((line_no, record["row"]))
+            self.log_lines += 1
+        n_rows = max((row for _, row in touched), default=-1) + 1
+        self.ids = [None] * n_rows
+        self.metadata = [{} for _ in range(n_rows)]
+        values = {}
+        for item_id, record in latest.items():
+            if record.get("deleted"):
+                continue
+            row = record["row"]
+            if self.ids[row] is not None:
+                self.rows.pop(self.ids[row], None)
+            self.ids[row] = item_id
+            self.rows[item_id] = row
+            self.metadata[row] = record["metadata"]
+            for field, value in record["metadata"].items():
+                if isinstance(value, (int, float)) and not isinstance(value, bool):
+                    values.setdefault(field, ([], []))
+                    values[field][0].append(row)
+                    values[field][1].append(value)
+        live_rows = np.fromiter(self.rows.values(), dtype=np.int64, count=len(self.rows))
+        self.live[live_rows] = True
+        for field, (rows, field_values) in values.items():
+            column = np.full(len(self.vectors), np.nan)
+            column[rows] = field_values
+            self.columns[field] = column
+        return touched
+
+    def place(self, item_id, row, metadata):
+        while row >= len(self.ids):
+            self.ids.append(None)
+            self.metadata.append({})
+        self.ids[row] = item_id
+        self.rows[item_id] = row
+        self.metadata[row] = metadata
+        self.live[row] = True
+        for field, column in self.columns.items():
+            column[row] = np.nan
+        for field, value in metadata.items():
+            if isinstance(value, (int, float)) and not isinstance(value, bool):
+                if field not in self.columns:
+                    self.columns[field] = np.full(len(self.vectors), np.nan)
+                self.columns[field][row] = value
+
+    def remove(self, item_id):
+        row = self.rows.pop(item_id, None)
+        if row is not None:
+            self.ids[row] = None
+            self.metadata[row] = {}
+            self.live[row] = False
+            for column in self.columns.values():
+                column[row] = np.nan
+
+    def upsert(self, vectors, namespace=""):
+        with self.lock, self.file_lock():
+            self.sync()
+            items = []
+            for item in vectors:
+                if isinstance(item, dict):
+                    items.append((str(item["id"]), item["values"], item.get("metadata") or {}))
+                else:
+                    items.append((str(item[0]), item[1], item[2] if len(item) > 2 else {}))
+            upserted = len(items)
+            # An id repeated within the batch gets one row: the last write wins (as in Pinecone), kept at the
+            # position of its first occurrence
+            latest = {}
+            for item in items:
+                latest[item[0]] = item
+            items = list(latest.values())
+            values = normalize([values for _, values, _ in items])
+            rows = []
+            for item_id, _, _ in items:
+                row = self.rows.get(item_id)
+                if row is None:
+                    row = len(self.ids)
+                    self.ids.append(None)
+                    self.metadata.append({})
+                rows.append(row)
+            if len(self.ids) > len(self.vectors):
+                self.map_vectors(max(len(self.ids), 2 * len(self.vectors)))
+            self.vectors[rows] = values
+            # Vectors reach the file before the log records that point at them
+            self.vectors.flush()
+            lines = []
+            for (item_id, _, metadata), row in zip(items, rows):
+                metadata = {k: v.item() if isinstance(v, np.generic) else v for k, v in metadata.items()}
+                self.place(item_id, row, metadata)
+                lines.append(json.dumps({"id": item_id, "row": row, "metadata": metadata}) + "\n")
+            with open(self.records_path, "a") as f:
+                f.write("".join(lines))
+            self.records_offset = os.path.getsize(self.records_path)
+            self.log_lines += len(lines)
+            if len(self.assign) < len(self.ids):
+                self.assign = np.concatenate([self.assign, np.full(len(self.ids) - len(self.assign), -1, np.int32)])
+            if self.centroids is not None:
+                self.assign_rows(np.array(rows))
+            elif self.count() >= self.exact_threshold:
+                self.train_ivf()
+            return {"upserted_count": upserted}
+
+    def delete(self, ids, namespace=""):
+        with self.lock, self.file_lock():
+            self.sync()
+            lines = []
+            for item_id in ids:
+                if str(item_id) in self.rows:
+                    self.remove(str(item_id))
+                    lines.append(json.dumps({"id": str(item_id), "deleted": True}) + "\n")
+            with open(self.records_path, "a") as f:
+                f.write("".join(lines))
+            self.records_offset = os.path.getsize(self.records_path)
+            self.log_lines += len(lines)
+            return {}
+
+    def fetch(self, ids, namespace=""):
+        with self.lock:
+            self.sync()
+            found = {}
+            for item_id in ids:
+                row = self.rows.get(str(item_id))
+                if row is not None:
+                    found[str(item_id)] = {"id": str(item_id), "values": self.vectors[row].tolist(),
+                                           "metadata": self.metadata[row]}
+            return {"vectors": found}
+
+    def count(self):
+        return len(self.rows)
+
+    def describe_index_stats(self):
+        with self.lock:
+            self.sync()
+            return {"dimension": self.dimension, "total_vector_count": self.count(),
+                    "ivf_lists": 0 if self.centroids is None else len(self.centroids)}
+
+    def build_ivf(self, n_lists=None, iterations=10, sample=50000):
+        # k-means over (a sample of) the live vectors, then every row is assigned to its nearest centroid
+        with self.lock, self.file_lock():
+            self.sync()
+            self.train_ivf(n_lists, iterations, sample)
+
+    def train_ivf(self, n_lists=None, iterations=10, sample=50000):
+        # Caller holds both locks
+        live = np.array(sorted(self.rows.values()))
+        n_lists = n_lists or max(1, int(np.sqrt(len(live))))
+        rng = np.random.default_rng(0)
+        train = live if len(live) <= sample else rng.choice(live, sample, replace=False)
+        self.centroids = spherical_kmeans(np.asarray(self.vectors[np.sort(train)]), n_lists, iterations)
+        self.assign[:] = -1
+        self.assign_rows(live)
+        self.save_ivf()
+
+    def assign_rows(self, rows):
+        for start in range(0, len(rows), 8192):
+            chunk = rows[start:start + 8192]
+            self.assign[chunk] = np.argmax(np.asarray(self.vectors[chunk]) @ self.centroids.T, axis=1)
+        self.lists = None
+
+    def save_ivf(self):
+        tmp = f"{self.ivf_path}.{os.getpid()}.tmp.npz"
+        np.savez(tmp, centroids=self.centroids, assign=self.assign, log_lines=self.log_lines)
+        os.replace(tmp, self.ivf_path)
+        self.ivf_mtime = os.path.getmtime(self.ivf_path)
+
+    def ivf_lists(self):
+        # Rows grouped by list (one stable argsort), rebuilt only after assignments change
+        if self.lists is None:
+            order = np.argsort(self.assign, kind="stable")
+            bounds = np.searchsorted(self.assign[order], np.arange(len(self.centroids) + 1))
+            self.lists = (order, bounds)
+        return self.lists
+
+    def filter_mask(self, rows, conditions):
+        # Vectorized for numeric $eq/$ne/$gt/$gte/$lt/$lte/$in; anything else falls back to per-row checks
+        check_filter(conditions)
+        mask = np.ones(len(rows), dtype=bool)
+        for field, condition in conditions.items():
+            if not isinstance(condition, dict):
+                condition = {"$eq": condition}
+            column = self.columns.get(field)
+            numeric = column is not None and all(
+                (op in OPERATORS and isinstance(v, (int, float))) or
+                (op == "$in" and all(isinstance(x, (int, float)) for x in v)) for op, v in condition.items())
+            if not numeric:
+                mask &= np.array([matches_filter(self.metadata[row], {field: condition}) for row in rows], dtype=bool)
+                continue
+            values = column[rows]
+            mask &= ~np.isnan(values)
+            for op, target in condition.items():
+                mask &= np.isin(values, target) if op == "$in" else OPERATORS[op](values, target)
+        return mask
+
+    def candidates(self, query, mode, nprobe):
+        # None = every row (exact search); otherwise the rows in the nprobe lists nearest to the query
+        if mode == "exact" or self.centroids is None:
+            return None
+        order, bounds = self.ivf_lists()
+        probe = np.argsort(-(self.centroids @ query))[:nprobe]
+        return np.unique(np.concatenate([order[bounds[p]:bounds[p + 1]] for p in probe]))
+
+    def search_rows(self, query, rows, top_k, allowed):
+        # rows: candidate rows or None for all; allowed: boolean mask over rows (live and passing the filter)
+        n_rows = len(self.ids)
+        if rows is None:
+            rows = np.nonzero(allowed)[0]
+            # Unselective: one pass over the whole (contiguous) matrix beats gathering most of its rows
+            full_scan = len(rows) > n_rows // 4
+        else:
+            rows = rows[allowed[rows]]
+            full_scan = False
+        if not len(rows):
+            return rows, np.zeros(0, dtype=np.float32)
+        if full_scan:
+            scores = np.asarray(self.vectors[:n_rows] @ query)[rows]
+        else:
+            scores = np.asarray(self.vectors[rows] @ query)
+        k = min(top_k, len(rows))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return rows[top], scores[top]
+
+    def query(self, vector, top_k=10, include_metadata=False, filter=None, namespace="", include_values=False,
+              mode="auto", nprobe=None):
+        # mode: "exact", "ivf", or "auto" (IVF once the index has one, i.e. past EXACT_THRESHOLD vectors)
+        with self.lock:
+            self.sync()
+            query = normalize(vector)[0]
+            n_rows = len(self.ids)
+            allowed = self.live[:n_rows].copy()
+            if filter:
+                allowed &= self.filter_mask(np.arange(n_rows), filter)
+            if mode == "auto":
+                mode = "ivf" if self.centroids is not None else "exact"
+            nprobe = nprobe or self.nprobe
+            if mode == "ivf" and filter and allowed.sum() <= nprobe * n_rows / len(self.centroids):
+                # The filter is more selective than the probe: scan only the matching rows, exactly
+                mode = "exact"
+            rows, scores = self.search_rows(query, self.candidates(query, mode, nprobe), top_k, allowed)
+            if mode == "ivf" and len(rows) < top_k:
+                # Too few candidates passed the filter in the probed lists: search all matching rows exactly
+                rows, scores = self.search_rows(query, None, top_k, allowed)
+            matches = []
+            for row, score in zip(rows, scores):
+                match = {"id": self.ids[row], "score": float(score)}
+                if include_metadata:
+                    match["metadata"] = self.metadata[row]
+                if include_values:
+                    match["values"] = self.vectors[row].tolist()
+                matches.append(match)
+            return {"matches": matches, "namespace": namespace}
+
+    def flush(self):
+        with self.lock:
+            self.vectors.flush()
+            if self.centroids is not None:
+                self.save_ivf()
+
+
+def open_index(host=None, api_key=None):
+    # VECTOR_BACKEND=local serves from the in-process index; otherwise the Pinecone index at `host`
+    if os.getenv("VECTOR_BACKEND", "pinecone") == "local":
+        return VectorIndex(os.getenv("VECTOR_INDEX_DIR", INDEX_DIR))
+    from pinecone import Pinecone
+    return Pinecone(api_key=api_key).Index(host=host)
+
+
+def clustered_vectors(n, dimension, n_clusters=200, spread=1.0, seed=0):
+    # Embedding-like data: points scattered around topic centres
+    rng = np.random.default_rng(seed)
+    centres = normalize(rng.standard_normal((n_clusters, dimension), dtype=np.float32))
+    labels = rng.integers(0, n_clusters, n)
+    noise = rng.standard_normal((n, dimension), dtype=np.float32) * (spread / np.sqrt(dimension))
+    return normalize(centres[labels] + noise)
+
+
+def benchmark(n=100000, n_queries=200, top_k=10, dimension=DIMENSION):
+    import tempfile
+    rng = np.random.default_rng(1)
+    vectors = clustered_vectors(n + n_queries, dimension)
+    queries, vectors = vectors[:n_queries], vectors[n_queries:]
+    ratings = rng.integers(1, 11, n)
+    dates = 20230000 + rng.integers(0, 2, n) * 10000 + rng.integers(1, 13, n) * 100 + rng.integers(1, 29, n)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        index = VectorIndex(tmp, dimension, exact_threshold=n + 1)
+        start = time.perf_counter()
+        for i in range(0, n, 1000):
+            index.upsert([(str(j), vectors[j], {"Rating": int(ratings[j]), "review_date": int(dates[j]),
+                                                "review_id": j}) for j in range(i, min(i + 1000, n))])
+        upsert_seconds = time.perf_counter() - start
+        start = time.perf_counter()
+        index.build_ivf()
+        build_seconds = time.perf_counter() - start
+        print(f"{n} vectors x {dimension}: upsert {n / upsert_seconds:.0f} vectors/s, "
+              f"IVF build ({len(index.centroids)} lists) {build_seconds:.1f}s")
+
+        filters = {"none": None, "Rating<=9 & one week": {"Rating": {"$lte": 9},
+                                                          "review_date": {"$gte": 20240101, "$lte": 20240108}},
+                   "Rating>=8": {"Rating": {"$gte": 8}}}
+        print(f"{'filter':<22}{'mode':<12}{'recall@' + str(top_k):>10}{'QPS':>10}{'p50 ms':>9}")
+        for name, conditions in filters.items():
+            exact = []
+            timings = []
+            for q in queries:
+                start = time.perf_counter()
+                exact.append({m["id"] for m in index.query(q, top_k, filter=conditions, mode="exact")["matches"]})
+                timings.append(time.perf_counter() - start)
+            print(f"{name:<22}{'exact':<12}{1.0:>10.3f}{len(queries) / sum(timings):>10.0f}"
+                  f"{np.median(timings) * 1000:>9.2f}")
+            for nprobe in (1, 4, 8, 16, 32):
+                timings, hits = [], 0
+                for q, truth in zip(queries, exact):
+                    start = time.perf_counter()
+                    found = {m["id"] for m in index.query(q, top_k, filter=conditions, mode="ivf",
+                                                          nprobe=nprobe)["matches"]}
+                    timings.append(time.perf_counter() - start)
+                    hits += len(found & truth)
+                recall = hits / max(1, sum(len(t) for t in exact))
+                print(f"{name:<22}{'ivf/' + str(nprobe):<12}{recall:>10.3f}{len(queries) / sum(timings):>10.0f}"
+                      f"{np.median(timings) * 1000:>9.2f}")
+
+        start = time.perf_counter()
+        reopened = VectorIndex(tmp, dimension)
+        print(f"Reopen from disk: {time.perf_counter() - start:.2f}s, {reopened.count()} vectors")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local vector index: stats or recall / QPS benchmark")
+    parser.add_argument("--benchmark", action="store_true")
+    parser.add_argument("--vectors", type=int, default=100000)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--top-k", type=int, default=10)
+    parser.add_argument("--dir", default=INDEX_DIR)
+    args = parser.parse_args()
+    if args.benchmark:
+        benchmark(args.vectors, args.queries, args.top_k)
+    else:
+        print(VectorIndex(args.dir).describe_index_stats())
+
+
+if __name__ == "__main__":
+    main()
@@ -22,13 +22,11 @@ df['review_date'] = pd.to_datetime(df['review_date'], errors='coerce')
 # Step 3: Build Dashboard
 app = dash.Dash(__name__)
 
-# Pie chart for sentiment analysis (Placeholder data)
-sentiment_data = {
-    "Sentiment": ["Positive", "Neutral", "Negative"],
-    "Count": [50, 30, 20]
-}
-
-sentiment_df = pd.DataFrame(sentiment_data)
+# Sentiment counts from the stored scores (ASSESSMENT - 03/sentiment_scores.py); reviews not scored yet are counted separately
+sentiment_labels = df["sentiment_label"] if "sentiment_label" in df else pd.Series("", index=df.index)
+sentiment_df = sentiment_labels.replace("", "Not scored").value_counts().reindex(
+    ["Positive", "Neutral", "Negative", "Not scored"], fill_value=0).rename_axis("Sentiment").reset_index(name="Count")
+sentiment_df = sentiment_df[(sentiment_df["Sentiment"] != "Not scored") | (sentiment_df["Count"] > 0)]
 
 # Histogram for rating distribution with different colors per range
 fig_hist = px.histogram(df, x="Rating", nbins=10, title="Rating Distribution", color=df['Rating'].apply(lambda x: 'Low' if x < 4 else 'Medium' if x < 7 else 'High'), color_discrete_map={"Low": "red", "Medium": "yellow", "High": "green"})
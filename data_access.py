@@ -0,0 +1,157 @@
+import argparse
+import json
+import os
+import threading
+import time
+import pandas as pd
+import pyarrow as pa
+import pyarrow.feather as feather
+
+# Shared data access for the xlsx datasets. Excel stays the import/export format for staff;
+# the first read converts each workbook to an Arrow IPC file next to it (.columnar/<name>.arrow)
+# and later reads memory-map that copy. The copy is rebuilt whenever the xlsx changes on disk.
+
+CACHE_DIR_NAME = ".columnar"
+ROOT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Datasets used across the project (for the load-time benchmark)
+DATASETS = {
+    "dining_info": os.path.join(ROOT_DIR, "ASSESSMENT - 01", "dining_info.xlsx"),
+    "reviews_data": os.path.join(ROOT_DIR, "ASSESSMENT - 03", "reviews_data.xlsx"),
+    "features": os.path.join(ROOT_DIR, "ASSESSMENT - 02", "features.xlsx"),
+    "age_features": os.path.join(ROOT_DIR, "ASSESSMENT - 02", "age_features.xlsx"),
+    "cuisine_features": os.path.join(ROOT_DIR, "ASSESSMENT - 02", "cuisine_features.xlsx"),
+    "customer_features": os.path.join(ROOT_DIR, "ASSESSMENT - 02", "customer_features.xlsx"),
+    "customer_behaviour_features": os.path.join(ROOT_DIR, "ASSESSMENT - 02", "customer_behaviour_features.xlsx"),
+    "customer_recency_features": os.path.join(ROOT_DIR, "ASSESSMENT - 02", "customer_recency_features.xlsx"),
+    "loyalty_features": os.path.join(ROOT_DIR, "ASSESSMENT - 02", "loyalty_features.xlsx"),
+    "stayed_features": os.path.join(ROOT_DIR, "ASSESSMENT - 02", "stayed_features.xlsx")
+}
+
+_lock = threading.Lock()
+
+
+def columnar_path(path):
+    directory, file_name = os.path.split(os.path.abspath(path))
+    return os.path.join(directory, CACHE_DIR_NAME, os.path.splitext(file_name)[0] + ".arrow")
+
+
+def source_stamp(path):
+    stat = os.stat(path)
+    return {"mtime": stat.st_mtime, "size": stat.st_size}
+
+
+def write_columnar(df, path, stamp):
+    # Arrow needs string column names; the originals (e.g. the int 0 in features.xlsx) go in the metadata
+    table = pa.Table.from_pandas(df.set_axis([str(c) for c in df.columns], axis=1), preserve_index=False)
+    metadata = dict(table.schema.metadata or {})
+    metadata[b"source_stamp"] = json.dumps(stamp).encode()
+    metadata[b"column_names"] = json.dumps(list(df.columns)).encode()
+    table = table.replace_schema_metadata(metadata)
+
+    target = columnar_path(path)
+    os.makedirs(os.path.dirname(target), exist_ok=True)
+    tmp = f"{target}.{os.getpid()}.tmp"
+    # Uncompressed so the file can be memory-mapped; replaced atomically so readers never see a partial file
+    feather.write_feather(table, tmp, compression="uncompressed")
+    os.replace(tmp, target)
+
+
+def read_columnar(path, stamp):
+    # Returns None when there is no columnar copy or it was built from a different version of the xlsx
+    target = columnar_path(path)
+    if not os.path.exists(target):
+        return None
+    try:
+        table = feather.read_table(target, memory_map=True)
+    except (OSError, pa.ArrowInvalid):
+        return None
+    metadata = table.schema.metadata or {}
+    if json.loads(metadata.get(b"source_stamp", b"null")) != stamp:
+        return None
+    df = table.to_pandas()
+    df.columns = json.loads(metadata[b"column_names"])
+    return df
+
+
+def read_table(path):
+    # Drop-in replacement for pd.read_excel(path) on the first sheet
+    stamp = source_stamp(path)
+    df = read_columnar(path, stamp)
+    if df is not None:
+        return df
+    with _lock:
+        df = read_columnar(path, stamp)
+        if df is not None:
+            return df
+        df = pd.read_excel(path)
+        try:
+            write_columnar(df, path, stamp)
+        except (OSError, pa.ArrowInvalid, pa.ArrowTypeError):
+            # Mixed-type columns or a read-only directory: serve the Excel data without a cache
+            pass
+        return df
+
+
+def write_table(df, path):
+    # Export for staff as xlsx, and refresh the columnar copy so the next read skips Excel parsing
+    with _lock:
+        df.to_excel(path, index=False)
+        try:
+            write_columnar(df.reset_index(drop=True), path, source_stamp(path))
+        except (OSError, pa.ArrowInvalid, pa.ArrowTypeError):
+            pass
+
+
+def benchmark(name, path, repeats=5):
+    start = time.perf_counter()
+    excel_df = pd.read_excel(path)
+    excel_seconds = time.perf_counter() - start
+
+    target = columnar_path(path)
+    if os.path.exists(target):
+        os.remove(target)
+    start = time.perf_counter()
+    read_table(path)
+    first_seconds = time.perf_counter() - start
+
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        df = read_table(path)
+        timings.append(time.perf_counter() - start)
+    columnar_seconds = sorted(timings)[len(timings) // 2]
+
+    return {
+        "dataset": name,
+        "rows": len(df),
+        "identical": bool(df.equals(excel_df)),
+        "excel_ms": excel_seconds * 1000,
+        "first_read_ms": first_seconds * 1000,
+        "columnar_ms": columnar_seconds * 1000,
+        "speedup": excel_seconds / columnar_seconds,
+        "xlsx_kb": os.path.getsize(path) / 1024,
+        "arrow_kb": os.path.getsize(target) / 1024
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load-time benchmark: pd.read_excel vs the memory-mapped Arrow copy")
+    parser.add_argument("datasets", nargs="*", default=list(DATASETS), help="dataset names or xlsx paths")
+    parser.add_argument("--repeats", type=int, default=5)
+    args = parser.parse_args()
+
+    print(f"{'dataset':<30}{'rows':>7}{'xlsx ms':>10}{'first ms':>10}{'arrow ms':>10}{'speedup':>9}"
+          f"{'xlsx KB':>9}{'arrow KB':>10}  same")
+    for name in args.datasets:
+        path = DATASETS.get(name, name)
+        if not os.path.exists(path):
+            print(f"{name:<30}  (missing: {path})")
+            continue
+        r = benchmark(name, path, args.repeats)
+        print(f"{r['dataset']:<30}{r['rows']:>7}{r['excel_ms']:>10.1f}{r['first_read_ms']:>10.1f}"
+              f"{r['columnar_ms']:>10.2f}{r['speedup']:>8.0f}x{r['xlsx_kb']:>9.0f}{r['arrow_kb']:>10.0f}  {r['identical']}")
+
+
+if __name__ == "__main__":
+    main()